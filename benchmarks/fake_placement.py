@@ -0,0 +1,324 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""An in-process fake of the placement API serving a synthetic topology
+
+The FakePlacement object has the same get(url) contract as the clients
+accepted by osc_placement_tree.tree, e.g. ClientAdapter, so it can be passed
+to make_rp_tree(s) and extend_rp_graph_with_consumers directly.
+
+The generated topology:
+
+* compute root providers with VCPU and MEMORY_MB inventories, some CPU
+  traits and an aggregate per rack
+* NUMA children of the computes with PCPU inventories
+* PF children of the NUMA nodes with bandwidth inventories
+* VF children of the PFs with SRIOV_NET_VF inventories
+* shared storage root providers with DISK_GB inventories, each shared with
+  the racks via their aggregates
+* consumers allocating from a compute and, if there is shared storage, from
+  the storage of the rack of the compute
+"""
+import collections
+import threading
+import time
+import uuid
+
+from six.moves.urllib import parse
+
+_INVENTORY_DEFAULTS = {
+    "allocation_ratio": 1.0,
+    "min_unit": 1,
+    "reserved": 0,
+    "step_size": 1,
+}
+
+_COMPUTE_TRAITS = [
+    "HW_CPU_X86_AVX",
+    "HW_CPU_X86_AVX2",
+    "HW_CPU_X86_SSE42",
+    "COMPUTE_NET_ATTACH_INTERFACE",
+    "COMPUTE_VOLUME_EXTEND",
+]
+
+
+def _inventory(total):
+    inventory = dict(_INVENTORY_DEFAULTS)
+    inventory["total"] = total
+    inventory["max_unit"] = total
+    return inventory
+
+
+class FakePlacement(object):
+    """A placement client serving a generated topology from memory"""
+
+    def __init__(
+        self,
+        computes=1000,
+        numa_nodes=2,
+        pfs=1,
+        vfs=0,
+        shared_storage=10,
+        consumers=10000,
+        computes_per_rack=40,
+        latency=0.0,
+    ):
+        """Generates the topology
+
+        :param computes: the number of compute root providers
+        :param numa_nodes: the number of NUMA children of each compute
+        :param pfs: the number of PF children of each NUMA node
+        :param vfs: the number of VF children of each PF
+        :param shared_storage: the number of shared storage providers. The
+                               racks are distributed evenly between them.
+        :param consumers: the number of consumers, distributed evenly between
+                          the computes
+        :param computes_per_rack: the number of computes in an aggregate
+        :param latency: the number of seconds every request takes
+        """
+        self.latency = latency
+        self.request_count = 0
+        self._lock = threading.Lock()
+        # uuid -> RP dict as in the /resource_providers response
+        self._rps = collections.OrderedDict()
+        # uuid -> per RP data
+        self._inventories = {}
+        self._traits = {}
+        self._aggregates = {}
+        # RP uuid -> consumer uuid -> resources
+        self._allocations = {}
+        # consumer uuid -> RP uuid -> resources
+        self._consumers = collections.OrderedDict()
+
+        racks = [
+            str(uuid.uuid4())
+            for _ in range(max(1, -(-computes // computes_per_rack)))
+        ]
+        storages = []
+        for i in range(shared_storage):
+            storage = self._add_rp(
+                "shared-storage-%d" % i,
+                inventories={"DISK_GB": _inventory(100000)},
+                traits=["MISC_SHARES_VIA_AGGREGATE"],
+                aggregates=racks[i::shared_storage],
+            )
+            storages.append(storage)
+
+        computes_uuids = []
+        for i in range(computes):
+            rack = i // computes_per_rack
+            compute = self._add_rp(
+                "compute-%d" % i,
+                inventories={
+                    "VCPU": _inventory(64),
+                    "MEMORY_MB": _inventory(262144),
+                },
+                traits=list(_COMPUTE_TRAITS),
+                aggregates=[racks[rack]],
+            )
+            computes_uuids.append(
+                (compute, storages[rack % len(storages)] if storages else None)
+            )
+            for n in range(numa_nodes):
+                numa = self._add_rp(
+                    "compute-%d_NUMA%d" % (i, n),
+                    parent=compute,
+                    inventories={"PCPU": _inventory(16)},
+                    traits=["HW_NUMA_ROOT"],
+                )
+                for p in range(pfs):
+                    pf = self._add_rp(
+                        "compute-%d_NUMA%d_PF%d" % (i, n, p),
+                        parent=numa,
+                        inventories={
+                            "NET_BW_EGR_KILOBIT_PER_SEC": _inventory(10000000)
+                        },
+                        traits=["CUSTOM_PHYSNET_PHYSNET0"],
+                    )
+                    for v in range(vfs):
+                        self._add_rp(
+                            "compute-%d_NUMA%d_PF%d_VF%d" % (i, n, p, v),
+                            parent=pf,
+                            inventories={"SRIOV_NET_VF": _inventory(1)},
+                            traits=["CUSTOM_PHYSNET_PHYSNET0"],
+                        )
+
+        for i in range(consumers):
+            compute, storage = computes_uuids[i % len(computes_uuids)]
+            allocations = {compute: {"VCPU": 1, "MEMORY_MB": 2048}}
+            if storage:
+                allocations[storage] = {"DISK_GB": 20}
+            self._add_consumer(str(uuid.uuid4()), allocations)
+
+    def _add_rp(
+        self, name, parent=None, inventories=None, traits=None, aggregates=None
+    ):
+        rp_uuid = str(uuid.uuid4())
+        self._rps[rp_uuid] = {
+            "uuid": rp_uuid,
+            "name": name,
+            "generation": 1,
+            "parent_provider_uuid": parent,
+            "root_provider_uuid": (
+                self._rps[parent]["root_provider_uuid"] if parent else rp_uuid
+            ),
+            "links": [],
+        }
+        self._inventories[rp_uuid] = inventories or {}
+        self._traits[rp_uuid] = traits or []
+        self._aggregates[rp_uuid] = aggregates or []
+        self._allocations[rp_uuid] = collections.OrderedDict()
+        return rp_uuid
+
+    def _add_consumer(self, consumer_uuid, allocations):
+        self._consumers[consumer_uuid] = allocations
+        for rp_uuid, resources in allocations.items():
+            self._allocations[rp_uuid][consumer_uuid] = resources
+
+    @property
+    def rp_count(self):
+        return len(self._rps)
+
+    @property
+    def consumer_count(self):
+        return len(self._consumers)
+
+    def get(self, url):
+        with self._lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        parsed = parse.urlparse(url)
+        path = parsed.path.strip("/").split("/")
+        query = dict(parse.parse_qsl(parsed.query))
+
+        if path == ["resource_providers"]:
+            return self._get_rps(query)
+        if len(path) == 3 and path[0] == "resource_providers":
+            return getattr(self, "_get_" + path[2])(path[1])
+        if path == ["traits"]:
+            return {
+                "traits": sorted(
+                    set(
+                        trait
+                        for traits in self._traits.values()
+                        for trait in traits
+                    )
+                )
+            }
+        if len(path) == 2 and path[0] == "allocations":
+            return self._get_consumer(path[1])
+        raise ValueError("Unsupported url %s" % url)
+
+    def _get_rps(self, query):
+        rps = list(self._rps.values())
+        if "in_tree" in query:
+            # like placement an unknown RP has an empty tree
+            in_tree = self._rps.get(query["in_tree"])
+            root = in_tree["root_provider_uuid"] if in_tree else None
+            rps = [rp for rp in rps if rp["root_provider_uuid"] == root]
+        if "name" in query:
+            rps = [rp for rp in rps if rp["name"] == query["name"]]
+        if "required" in query:
+            required = set(query["required"].split(","))
+            rps = [
+                rp for rp in rps if required <= set(self._traits[rp["uuid"]])
+            ]
+        if "member_of" in query:
+            member_of = query["member_of"]
+            if member_of.startswith("in:"):
+                member_of = member_of[3:]
+            aggregates = set(member_of.split(","))
+            rps = [
+                rp
+                for rp in rps
+                if aggregates & set(self._aggregates[rp["uuid"]])
+            ]
+        if "resources" in query:
+            resources = [
+                (rc, int(amount))
+                for rc, amount in (
+                    rc_amount.split(":")
+                    for rc_amount in query["resources"].split(",")
+                )
+            ]
+            rps = [
+                rp
+                for rp in rps
+                if all(
+                    self._can_fit(rp["uuid"], rc, amount)
+                    for rc, amount in resources
+                )
+            ]
+        return {"resource_providers": [dict(rp) for rp in rps]}
+
+    def _can_fit(self, rp_uuid, rc, amount):
+        inventory = self._inventories[rp_uuid].get(rc)
+        if not inventory or amount > inventory["max_unit"]:
+            return False
+        capacity = (inventory["total"] - inventory["reserved"]) * inventory[
+            "allocation_ratio"
+        ]
+        used = self._get_usages(rp_uuid)["usages"][rc]
+        return capacity - used >= amount
+
+    def _get_inventories(self, rp_uuid):
+        return {
+            "inventories": {
+                rc: dict(inventory)
+                for rc, inventory in self._inventories[rp_uuid].items()
+            },
+            "resource_provider_generation": 1,
+        }
+
+    def _get_traits(self, rp_uuid):
+        return {
+            "traits": list(self._traits[rp_uuid]),
+            "resource_provider_generation": 1,
+        }
+
+    def _get_aggregates(self, rp_uuid):
+        return {
+            "aggregates": list(self._aggregates[rp_uuid]),
+            "resource_provider_generation": 1,
+        }
+
+    def _get_usages(self, rp_uuid):
+        usages = dict.fromkeys(self._inventories[rp_uuid], 0)
+        for resources in self._allocations[rp_uuid].values():
+            for rc, amount in resources.items():
+                usages[rc] += amount
+        return {"usages": usages, "resource_provider_generation": 1}
+
+    def _get_allocations(self, rp_uuid):
+        return {
+            "allocations": {
+                consumer_uuid: {"resources": dict(resources)}
+                for consumer_uuid, resources in self._allocations[
+                    rp_uuid
+                ].items()
+            },
+            "resource_provider_generation": 1,
+        }
+
+    def _get_consumer(self, consumer_uuid):
+        return {
+            "allocations": {
+                rp_uuid: {"resources": dict(resources), "generation": 1}
+                for rp_uuid, resources in self._consumers[
+                    consumer_uuid
+                ].items()
+            },
+            "consumer_generation": 1,
+            "project_id": "benchmark-project",
+            "user_id": "benchmark-user",
+        }
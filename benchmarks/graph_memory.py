@@ -0,0 +1,129 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Memory benchmark of the node and edge objects of a consumer heavy graph
+
+Compares the memory retained by osc_placement_tree.graph with the __dict__
+based implementation that kept the whole consumer document.
+
+Usage, from the root of the repository with the package installed:
+
+    python benchmarks/graph_memory.py --rps 10000 --consumers 100000
+"""
+from __future__ import print_function
+
+import argparse
+import gc
+import tracemalloc
+import uuid
+
+from osc_placement_tree import graph
+
+
+class _LegacyNode(object):
+    def __init__(self, data):
+        self.data = data
+
+
+class _LegacyRpNode(_LegacyNode):
+    def id(self):
+        return self.data["uuid"]
+
+
+class _LegacyConsumerNode(_LegacyNode):
+    def id(self):
+        return self.data["consumer_uuid"]
+
+
+class _LegacyEdge(object):
+    def __init__(self, node1, node2):
+        self.node1 = node1
+        self.node2 = node2
+
+
+def _make_rp(index):
+    return {
+        "uuid": str(uuid.uuid4()),
+        "name": "compute-%d" % index,
+        "generation": 1,
+        "inventories": {
+            "VCPU": {"total": 64, "used": 0, "reserved": 0},
+            "MEMORY_MB": {"total": 262144, "used": 0, "reserved": 0},
+        },
+        "traits": [],
+        "aggregates": [],
+    }
+
+
+def _make_consumer(rp_uuids):
+    """Returns a consumer as the tree module builds it"""
+    return {
+        "consumer_uuid": str(uuid.uuid4()),
+        "consumer_generation": 1,
+        "project_id": str(uuid.uuid4()),
+        "user_id": str(uuid.uuid4()),
+        "allocations": {
+            rp_uuid: {
+                "generation": 1,
+                "resources": {"VCPU": 1, "MEMORY_MB": 2048},
+            }
+            for rp_uuid in rp_uuids
+        },
+    }
+
+
+def _build(rp_count, consumer_count, rp_cls, consumer_cls, edge_cls):
+    rps = [rp_cls(_make_rp(i)) for i in range(rp_count)]
+    consumers = []
+    edges = []
+    for i in range(consumer_count):
+        rp = rps[i % rp_count]
+        consumer = consumer_cls(_make_consumer([rp.id()]))
+        consumers.append(consumer)
+        edges.append(edge_cls(consumer, rp))
+    return rps, consumers, edges
+
+
+def _measure(rp_count, consumer_count, rp_cls, consumer_cls, edge_cls):
+    gc.collect()
+    tracemalloc.start()
+    result = _build(rp_count, consumer_count, rp_cls, consumer_cls, edge_cls)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rps", type=int, default=10000)
+    parser.add_argument("--consumers", type=int, default=100000)
+    args = parser.parse_args()
+
+    results = {}
+    for name, classes in [
+        ("legacy", (_LegacyRpNode, _LegacyConsumerNode, _LegacyEdge)),
+        ("current", (graph.RpNode, graph.ConsumerNode, graph.AllocationEdge)),
+    ]:
+        results[name] = _measure(args.rps, args.consumers, *classes)
+        print(
+            "%-8s %8.1f MiB for %d RPs and %d consumers"
+            % (name, results[name] / 2.0**20, args.rps, args.consumers)
+        )
+    print(
+        "saving   %8.1f%%"
+        % (100.0 - 100.0 * results["current"] / results["legacy"])
+    )
+
+
+if __name__ == "__main__":
+    main()
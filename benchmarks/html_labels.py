@@ -0,0 +1,143 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Microbenchmark of the html label rendering of resource provider nodes
+
+Compares osc_placement_tree.html with the string concatenation based
+implementation it replaced.
+
+Usage, from the root of the repository with the package installed:
+
+    python benchmarks/html_labels.py --nodes 10000 --repeat 5
+"""
+from __future__ import print_function
+
+import argparse
+import operator
+import timeit
+import uuid
+
+from osc_placement_tree import html
+from osc_placement_tree.resources import provider_tree
+
+
+def _legacy_get_attr_html(data_dict, field_filter):
+    return "<" + _legacy_get_html_dict(data_dict, field_filter) + ">"
+
+
+def _legacy_get_html_dict(a_dict, field_filter, header=None):
+    if not a_dict:
+        return "{}"
+
+    attrs = (
+        '<TABLE BORDER="0" CELLBORDER="1" '
+        'CELLSPACING="0" CELLPADDING="4">\n'
+    )
+    if header:
+        attrs += (
+            '<TR BORDER="0" CELLBORDER="0">'
+            '<TD ALIGN="LEFT" BALIGN="LEFT" BORDER="0">'
+            "{header}"
+            "</TD></TR>\n"
+        ).format(header=header)
+    for key, value in sorted(a_dict.items(), key=operator.itemgetter(0)):
+        if field_filter(key):
+            attrs += _legacy_get_html_key_value(key, value, field_filter)
+    attrs += "</TABLE>\n"
+    return attrs
+
+
+def _legacy_get_html_value(value, field_filter):
+    if isinstance(value, list):
+        if not value:
+            return html._get_html_scalar("[]")
+        return html._get_html_scalar("<BR/>".join(value))
+    elif isinstance(value, dict):
+        return html._get_html_scalar(
+            _legacy_get_html_dict(value, field_filter)
+        )
+    else:
+        return html._get_html_scalar(value)
+
+
+def _legacy_get_html_key_value(key, value, field_filter):
+    return (
+        "<TR>"
+        + html._get_html_scalar(key)
+        + _legacy_get_html_value(value, field_filter)
+        + "</TR>\n"
+    )
+
+
+def make_rp_data(index):
+    """Returns the data of an RP node as it is after tree building"""
+    inventory = {
+        "allocation_ratio": 1.0,
+        "max_unit": 64,
+        "min_unit": 1,
+        "reserved": 0,
+        "step_size": 1,
+        "total": 64,
+        "used": index % 64,
+    }
+    return {
+        "uuid": str(uuid.uuid4()),
+        "name": "compute-%d" % index,
+        "generation": index,
+        "resource_provider_generation": index,
+        "inventories": {
+            rc: dict(inventory) for rc in ("VCPU", "MEMORY_MB", "DISK_GB")
+        },
+        "traits": [
+            "HW_CPU_X86_AVX",
+            "HW_CPU_X86_AVX2",
+            "HW_CPU_X86_SSE42",
+            "COMPUTE_NET_ATTACH_INTERFACE",
+            "COMPUTE_VOLUME_EXTEND",
+        ],
+        "aggregates": [str(uuid.uuid4())],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    nodes = [make_rp_data(i) for i in range(args.nodes)]
+
+    def field_filter(name):
+        return name not in provider_tree.DEFAULT_HIDDEN_FIELDS
+
+    for node in nodes:
+        assert html._get_attr_html(
+            node, field_filter
+        ) == _legacy_get_attr_html(node, field_filter)
+
+    results = {}
+    for name, func in [
+        ("legacy", _legacy_get_attr_html),
+        ("current", html._get_attr_html),
+    ]:
+        results[name] = min(
+            timeit.repeat(
+                lambda: [func(node, field_filter) for node in nodes],
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        print("%-8s %8.3f s for %d nodes" % (name, results[name], args.nodes))
+    print("speedup  %8.2fx" % (results["legacy"] / results["current"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Benchmark of building and rendering the graph of a large topology
+
+Serves a synthetic topology from fake_placement.FakePlacement and reports
+the wall time, the number of placement requests and the peak memory of
+building the provider trees, adding the consumers and rendering the DOT
+output.
+
+Usage, from the root of the repository with the package installed:
+
+    python benchmarks/tree_build.py --computes 1000 --consumers 10000 \\
+        --latency 0.001 --parallel 10 --show_consumers
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+import tracemalloc
+
+import fake_placement
+
+from osc_placement_tree import dot
+from osc_placement_tree import html
+from osc_placement_tree.resources import provider_tree
+from osc_placement_tree import tree
+
+
+class _NullStream(object):
+    """Counts the written characters instead of storing them"""
+
+    def __init__(self):
+        self.size = 0
+        # the time the first node is written, i.e. not just the header
+        self.first_node = None
+
+    def write(self, data):
+        if self.first_node is None and "label" in data:
+            self.first_node = time.time()
+        self.size += len(data)
+
+
+class _Stage(object):
+    def __init__(self, name, client, trace_memory):
+        self.name = name
+        self._client = client
+        self._trace_memory = trace_memory
+
+    def __enter__(self):
+        if self._trace_memory:
+            tracemalloc.start()
+        self._requests = self._client.request_count
+        self._start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.time() - self._start
+        requests = self._client.request_count - self._requests
+        peak = "n/a"
+        if self._trace_memory:
+            peak = "%.1f" % (tracemalloc.get_traced_memory()[1] / 2.0**20)
+            tracemalloc.stop()
+        print("%-16s %10.3f %10d %14s" % (self.name, seconds, requests, peak))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--computes", type=int, default=1000)
+    parser.add_argument("--numa_nodes", type=int, default=2)
+    parser.add_argument("--pfs", type=int, default=1)
+    parser.add_argument("--vfs", type=int, default=0)
+    parser.add_argument("--shared_storage", type=int, default=10)
+    parser.add_argument("--consumers", type=int, default=10000)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="The number of seconds every placement request takes",
+    )
+    parser.add_argument("--parallel", type=int, default=1)
+    parser.add_argument("--bulk", action="store_true")
+    parser.add_argument("--show_consumers", action="store_true")
+    parser.add_argument("--hide_consumer_details", action="store_true")
+    parser.add_argument("--render_processes", type=int, default=1)
+    parser.add_argument(
+        "--stream",
+        help="Build and render the trees one by one",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--no_memory",
+        help="Do not trace the memory allocations. Tracing slows down the "
+        "measured code considerably.",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    client = fake_placement.FakePlacement(
+        computes=args.computes,
+        numa_nodes=args.numa_nodes,
+        pfs=args.pfs,
+        vfs=args.vfs,
+        shared_storage=args.shared_storage,
+        consumers=args.consumers,
+        latency=args.latency,
+    )
+    print(
+        "%d resource providers, %d consumers"
+        % (client.rp_count, client.consumer_count)
+    )
+    print(
+        "%-16s %10s %10s %14s" % ("stage", "seconds", "requests", "peak MiB")
+    )
+    trace_memory = not args.no_memory
+
+    field_filter = html.FieldFilter(
+        exclude=provider_tree.DEFAULT_HIDDEN_FIELDS
+    )
+    out = _NullStream()
+    start = time.time()
+
+    if args.stream:
+        with _Stage("stream trees", client, trace_memory):
+            trees = tree.iter_rp_trees(
+                client,
+                drop_fields=provider_tree.DROP_DATA_FIELDS,
+                parallel=args.parallel,
+                bulk=args.bulk,
+            )
+            if args.show_consumers:
+                trees = _extend_trees_with_consumers(client, trees, args)
+            dot.write_dot_trees(trees, out, field_filter=field_filter)
+    else:
+        _build_and_render(client, args, trace_memory, field_filter, out)
+
+    print("%d characters of DOT output" % out.size)
+    print("first node written after %.3f seconds" % (out.first_node - start))
+
+
+def _extend_trees_with_consumers(client, trees, args):
+    for root_uuid, graph in trees:
+        tree.extend_rp_graph_with_consumers(
+            client,
+            graph,
+            parallel=args.parallel,
+            consumer_details=not args.hide_consumer_details,
+        )
+        yield root_uuid, graph
+
+
+def _build_and_render(client, args, trace_memory, field_filter, out):
+    with _Stage("build trees", client, trace_memory):
+        graph = tree.make_rp_trees(
+            client,
+            drop_fields=provider_tree.DROP_DATA_FIELDS,
+            parallel=args.parallel,
+            bulk=args.bulk,
+        )
+
+    if args.show_consumers:
+        with _Stage("add consumers", client, trace_memory):
+            tree.extend_rp_graph_with_consumers(
+                client,
+                graph,
+                parallel=args.parallel,
+                consumer_details=not args.hide_consumer_details,
+            )
+
+    with _Stage("render dot", client, trace_memory):
+        dot.write_dot(
+            graph,
+            out,
+            field_filter=field_filter,
+            processes=args.render_processes,
+        )
+
+
+if __name__ == "__main__":
+    main()
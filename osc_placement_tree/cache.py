@@ -0,0 +1,231 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+import copy
+import errno
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import six
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300
+
+# Entries older than this are dropped from the cache file regardless of their
+# generation to keep the file size bounded
+_MAX_AGE = 24 * 60 * 60
+
+# /resource_providers/{uuid}/{endpoint}
+_RP_DATA_URL = re.compile(r"^/resource_providers/([^/?]+)/([^/?]+)$")
+
+# Placement increments the generation of the provider when its inventories,
+# traits or aggregates change so these can be reused as long as the generation
+# is unchanged. The generation is only incremented for the providers of the
+# new allocations of a consumer but not for the ones the allocations removed
+# from so usages and allocations can only be reused within the TTL.
+_GENERATION_CHECKED_ENDPOINTS = ("inventories", "traits", "aggregates")
+
+
+def get_cache_dir():
+    """Returns the directory to store the cached data of this plugin"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "osc-placement-tree")
+
+
+def get_cache_path(name, *keys):
+    """Returns a cache file path unique to the given keys
+
+    :param name: the prefix of the file name
+    :param keys: strings identifying the cached content, e.g. the placement
+                 endpoint and the microversion
+    """
+    digest = hashlib.sha1("\n".join(keys).encode("utf-8")).hexdigest()
+    return os.path.join(get_cache_dir(), "%s-%s.json" % (name, digest))
+
+
+def load_json(path, default):
+    """Loads a json file or returns the default if it is missing or broken"""
+    try:
+        with io.open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return default
+
+
+def ensure_dir(directory):
+    """Creates the directory unless it exists, e.g. created concurrently"""
+    try:
+        os.makedirs(directory)
+    except OSError as e:
+        if e.errno != errno.EEXIST or not os.path.isdir(directory):
+            raise
+
+
+def save_json(path, data):
+    """Saves the data to a json file atomically
+
+    :raises: IOError or OSError if the file cannot be written. The temporary
+             file is removed in this case.
+    """
+    ensure_dir(os.path.dirname(path))
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    try:
+        with io.open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(six.text_type(json.dumps(data)))
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class CachingClient(object):
+    """A placement client that caches the responses in a local file
+
+    * The inventories, traits and aggregates of a provider are reused as long
+      as the generation of the provider is the same as in the latest
+      provider listing.
+    * Every other response, e.g. provider listings, usages and allocations,
+      is reused within the TTL.
+    """
+
+    def __init__(self, client, path, ttl=DEFAULT_TTL):
+        """Create a CachingClient
+
+        :param client: a placement client providing a get(url) call that
+                       returns the REST response body as a python object
+        :param path: the file to store the cached responses in
+        :param ttl: the number of seconds a response is reused for
+        """
+        self.client = client
+        self.path = path
+        self.ttl = ttl
+        # url -> {"time": fetched at, "generation": generation of the RP or
+        # None, "body": response body}
+        self._entries = load_json(path, {})
+        # RP uuid -> generation from the latest provider listing
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def _get_generation(self, url, body):
+        match = _RP_DATA_URL.match(url)
+        if not match or match.group(2) not in _GENERATION_CHECKED_ENDPOINTS:
+            return None
+        generation = body.get("resource_provider_generation")
+        if generation is None:
+            generation = self._generations.get(match.group(1))
+        return generation
+
+    def _is_valid(self, url, entry, now):
+        if entry["generation"] is not None:
+            match = _RP_DATA_URL.match(url)
+            current = self._generations.get(match.group(1))
+            if current is not None:
+                return current == entry["generation"]
+        return now - entry["time"] < self.ttl
+
+    def _learn_generations(self, body):
+        if isinstance(body, dict):
+            for rp in body.get("resource_providers", []):
+                if "generation" in rp:
+                    self._generations[rp["uuid"]] = rp["generation"]
+
+    def get(self, url):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry and self._is_valid(url, entry, now):
+                self._learn_generations(entry["body"])
+                return copy.deepcopy(entry["body"])
+
+        body = self.client.get(url)
+
+        with self._lock:
+            self._learn_generations(body)
+            self._entries[url] = {
+                "time": now,
+                "generation": self._get_generation(url, body),
+                "body": copy.deepcopy(body),
+            }
+        return body
+
+    def save(self):
+        """Stores the cached responses in the cache file"""
+        now = time.time()
+        with self._lock:
+            entries = {
+                url: entry
+                for url, entry in self._entries.items()
+                if now - entry["time"] < _MAX_AGE
+            }
+        save_json(self.path, entries)
+
+
+class NameIndex(object):
+    """A persistent resource provider name -> uuid index
+
+    The provider names rarely change so a name resolved once is reused in
+    later invocations without asking placement. The user of the index needs
+    to invalidate a name if the uuid turns out to be stale, e.g. the provider
+    is deleted or renamed.
+    """
+
+    def __init__(self, path):
+        """Create a NameIndex
+
+        :param path: the file to store the index in
+        """
+        self.path = path
+        self._uuids = load_json(path, {})
+        self._changed = False
+
+    def get(self, name):
+        """Returns the uuid of the named provider or None if not known"""
+        return self._uuids.get(name)
+
+    def set(self, name, rp_uuid):
+        if self._uuids.get(name) != rp_uuid:
+            self._uuids[name] = rp_uuid
+            self._changed = True
+
+    def invalidate(self, name):
+        if self._uuids.pop(name, None) is not None:
+            self._changed = True
+
+    def save(self):
+        """Stores the index in its file if it is changed
+
+        The index is only an optimization so a failure to store it is logged
+        but not raised.
+        """
+        if not self._changed:
+            return
+        try:
+            save_json(self.path, self._uuids)
+        except (IOError, OSError) as e:
+            LOG.warning(
+                "Could not store the resource provider name index in %s: %s",
+                self.path,
+                e,
+            )
+            return
+        self._changed = False
@@ -0,0 +1,92 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+import contextlib
+from multiprocessing.pool import ThreadPool
+
+
+class _DeferredResult(object):
+    """The result of a task that is only executed when its result is needed"""
+
+    def __init__(self, func, args):
+        self._func = func
+        self._args = args
+        self._done = False
+        self._value = None
+
+    def get(self):
+        if not self._done:
+            self._value = self._func(*self._args)
+            self._done = True
+        return self._value
+
+
+class _SerialPool(object):
+    """A pool like object that runs every task in the calling thread
+
+    Used when no parallelism is requested so that the call order is the same
+    as with a simple for loop.
+    """
+
+    size = 1
+
+    def map(self, func, iterable):
+        return [func(item) for item in iterable]
+
+    def apply_async(self, func, *args):
+        return _DeferredResult(func, args)
+
+
+class _ThreadPool(object):
+    """A bounded pool of worker threads
+
+    The result ordering follows the ordering of the input regardless of the
+    order the tasks are finished. If any of the tasks raises then the first
+    such exception (in input order) is re-raised in the calling thread.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._pool = ThreadPool(size)
+
+    def map(self, func, iterable):
+        # the tasks are expected to be I/O bound so do not batch them together
+        return self._pool.map(func, iterable, chunksize=1)
+
+    def apply_async(self, func, *args):
+        """Schedules func(*args) and returns an object with a get() call
+
+        The tasks are started in the order they are scheduled.
+        """
+        return self._pool.apply_async(func, args)
+
+    def close(self):
+        # drop the not yet started tasks, e.g. when one of the tasks failed
+        self._pool.terminate()
+        self._pool.join()
+
+
+@contextlib.contextmanager
+def get_pool(size):
+    """Returns a pool running at most size tasks at the same time
+
+    :param size: the maximum number of concurrent tasks. 1 or less means the
+                 tasks are run serially in the calling thread.
+    """
+    if not size or size <= 1:
+        yield _SerialPool()
+        return
+
+    pool = _ThreadPool(size)
+    try:
+        yield pool
+    finally:
+        pool.close()
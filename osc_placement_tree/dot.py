@@ -9,7 +9,33 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 # under the License.
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+
 import graphviz
+import six
+
+from osc_placement_tree import cache
+from osc_placement_tree import profiling
+
+LOG = logging.getLogger(__name__)
+
+# The name of the file describing the files written by write_dot_files()
+INDEX_FILE = "index.json"
+
+# The formats render() can lay out the dot source to
+RENDER_FORMATS = ("svg", "png", "pdf")
+
+# The number of rendered outputs kept by render()
+_RENDER_CACHE_SIZE = 32
+
+
+def _make_digraph():
+    return graphviz.Digraph(node_attr={"shape": "plaintext"})
 
 
 def graph_to_dot(graph, field_filter=lambda _: True):
@@ -20,6 +46,289 @@ def graph_to_dot(graph, field_filter=lambda _: True):
                          fields that need to be kept in the dot output
     :return: a dot formatted string
     """
-    dot = graphviz.Digraph(node_attr={"shape": "plaintext"})
+    dot = _make_digraph()
     graph.add_to_dot(dot, field_filter)
     return dot.source
+
+
+def write_dot(graph, out, field_filter=lambda _: True, processes=1):
+    """Write the graph in graphviz dot format to a file
+
+    The output is the same as the return value of graph_to_dot() but every
+    node and edge is written to the file as soon as it is formatted so the
+    whole dot source is never kept in memory.
+
+    If more than one process is requested then the node labels of large
+    graphs are formatted in chunks in a process pool while the edges are
+    formatted by the calling process. The output is the same.
+
+    :param graph: a graph with nodes and edges
+    :param out: a file like object opened in text mode
+    :param field_filter: field name -> bool function that returns True for
+                         fields that need to be kept in the dot output. It
+                         needs to be picklable if processes is more than 1,
+                         e.g. an html.FieldFilter.
+    :param processes: the number of processes formatting the nodes
+    """
+    stream = _DotStream(_make_digraph(), out)
+    stream.start()
+    if processes > 1:
+        _add_to_dot_in_processes(stream, graph, field_filter, processes)
+    else:
+        graph.add_to_dot(stream, field_filter)
+    stream.end()
+
+
+def render(source, format, cache_dir=None):
+    """Lays out the dot source with graphviz and renders it
+
+    The layout is done by the graphviz dot executable started in a separate
+    process so it needs to be installed.
+
+    :param source: the dot source, e.g. the result of graph_to_dot()
+    :param format: one of RENDER_FORMATS
+    :param cache_dir: if not None then the rendered output is stored in this
+                      directory keyed by the hash of the source and reused if
+                      the same source is rendered again so the layout is
+                      skipped for an unchanged graph
+    :return: the rendered output as bytes. A failure to store it in the
+             cache_dir is logged but not raised.
+    """
+    if cache_dir is None:
+        return graphviz.Source(source).pipe(format=format)
+
+    digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    path = os.path.join(cache_dir, "%s.%s" % (digest, format))
+    try:
+        with io.open(path, "rb") as f:
+            output = f.read()
+        # keep the recently used outputs when the cache is pruned
+        os.utime(path, None)
+        return output
+    except (IOError, OSError):
+        pass
+
+    output = graphviz.Source(source).pipe(format=format)
+
+    try:
+        _store_render(cache_dir, path, output)
+    except (IOError, OSError) as e:
+        LOG.warning(
+            "Could not store the rendered output in %s: %s", cache_dir, e
+        )
+    return output
+
+
+def _store_render(cache_dir, path, output):
+    cache.ensure_dir(cache_dir)
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    try:
+        with io.open(tmp_path, "wb") as f:
+            f.write(output)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _prune_render_cache(cache_dir)
+
+
+def _prune_render_cache(cache_dir):
+    # the temporary files of the concurrent runs are left alone
+    outputs = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".tmp"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            outputs.append((os.path.getmtime(path), path))
+        except OSError:
+            # already removed by a concurrent run
+            pass
+    outputs.sort(reverse=True)
+    for _, path in outputs[_RENDER_CACHE_SIZE:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def write_dot_trees(trees, out, field_filter=lambda _: True):
+    """Write the RP trees in graphviz dot format to a file one by one
+
+    Every tree is written out as a subgraph as soon as the trees iterable
+    produces it so only a single tree needs to be kept in memory.
+
+    :param trees: an iterable of (root RP uuid, Graph) pairs, e.g. the result
+                  of tree.iter_rp_trees()
+    :param out: a file like object opened in text mode
+    :param field_filter: field name -> bool function that returns True for
+                         fields that need to be kept in the dot output
+    """
+    stream = _DotStream(_make_digraph(), out)
+    stream.start()
+    for root_uuid, graph in trees:
+        with profiling.phase("render"):
+            subgraph = graphviz.Digraph(name="tree_%s" % root_uuid)
+            graph.add_to_dot(subgraph, field_filter)
+            stream.subgraph(subgraph)
+    stream.end()
+
+
+def write_dot_files(trees, out_dir, field_filter=lambda _: True):
+    """Write every RP tree to a separate dot file
+
+    Every tree is written to <root RP uuid>.dot in out_dir as soon as the
+    trees iterable produces it. At the end an index file is written listing
+    the trees.
+
+    :param trees: an iterable of (root RP uuid, Graph) pairs, e.g. the result
+                  of tree.iter_rp_trees()
+    :param out_dir: the directory to write the files to. It is created if
+                    missing.
+    :param field_filter: field name -> bool function that returns True for
+                         fields that need to be kept in the dot output
+    :return: the list of the index entries
+    """
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    index = []
+    for root_uuid, graph in trees:
+        file_name = "%s.dot" % root_uuid
+        with profiling.phase("render"):
+            with io.open(
+                os.path.join(out_dir, file_name), "w", encoding="utf-8"
+            ) as f:
+                write_dot(graph, f, field_filter)
+        index.append(
+            {
+                "root_provider_uuid": root_uuid,
+                "name": graph.get_node_by_id(root_uuid).data.get("name"),
+                "file": file_name,
+                "resource_providers": len(graph.rp_nodes),
+                "consumers": len(graph.consumer_nodes),
+            }
+        )
+
+    with io.open(
+        os.path.join(out_dir, INDEX_FILE), "w", encoding="utf-8"
+    ) as f:
+        f.write(six.text_type(json.dumps({"trees": index}, indent=2)))
+    return index
+
+
+# The nodes to format and the field filter in a worker process
+_worker_state = None
+
+# Formatting fewer nodes than this in a separate process costs more in inter
+# process communication than what is saved
+_MIN_NODES_PER_CHUNK = 256
+
+
+def _init_worker(nodes, field_filter):
+    # with the fork start method the arguments are inherited by the worker
+    # instead of being pickled so only the formatted statements are sent
+    # between the processes
+    global _worker_state
+    _worker_state = (nodes, field_filter)
+
+
+def _format_nodes(chunk):
+    nodes, field_filter = _worker_state
+    start, stop = chunk
+    dot = _make_digraph()
+    for node in nodes[start:stop]:
+        node.add_to_dot(dot, field_filter)
+    return dot.body
+
+
+def _add_to_dot_in_processes(stream, graph, field_filter, processes):
+    # The node labels are independent of each other so the nodes are split
+    # to fixed size chunks regardless of how the trees are connected, e.g.
+    # via a shared storage provider
+    nodes = graph.nodes
+    chunk_size = max(_MIN_NODES_PER_CHUNK, -(-len(nodes) // (processes * 4)))
+    chunks = [
+        (start, min(start + chunk_size, len(nodes)))
+        for start in range(0, len(nodes), chunk_size)
+    ]
+    if len(chunks) <= 1:
+        graph.add_to_dot(stream, field_filter)
+        return
+
+    pool = multiprocessing.Pool(
+        processes, initializer=_init_worker, initargs=(nodes, field_filter)
+    )
+    try:
+        # imap keeps the order of the chunks regardless of which worker
+        # finishes first
+        for lines in pool.imap(_format_nodes, chunks):
+            stream.write_lines(lines)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    for edge in graph.edges:
+        edge.add_to_dot(stream)
+
+
+class _DotStream(object):
+    """Writes the statements added to a graphviz.Digraph to a file
+
+    It uses the graphviz library to format the statements so the output is
+    the same as the source of the Digraph would be. But instead of collecting
+    the statements in the body of the Digraph every statement is written out
+    immediately.
+    """
+
+    def __init__(self, dot, out):
+        self._dot = dot
+        self._out = out
+        self._tail = None
+        self._needs_separator = False
+
+    def _write(self, line):
+        # older graphviz versions generate the lines without line ending and
+        # join them with new lines to get the source
+        ended = line.endswith("\n")
+        if self._needs_separator:
+            line = "\n" + line
+        self._out.write(six.text_type(line))
+        self._needs_separator = not ended
+
+    def _flush(self):
+        for line in self._dot.body:
+            self._write(line)
+        del self._dot.body[:]
+
+    def start(self):
+        # the Digraph yields its header, its body and then its tail. As the
+        # body is empty here everything but the last line is the header.
+        lines = list(self._dot)
+        self._tail = lines.pop()
+        for line in lines:
+            self._write(line)
+
+    def write_lines(self, lines):
+        """Writes statements formatted by another Digraph"""
+        for line in lines:
+            self._write(line)
+
+    def node(self, *args, **kwargs):
+        self._dot.node(*args, **kwargs)
+        self._flush()
+
+    def subgraph(self, graph):
+        self._dot.subgraph(graph)
+        self._flush()
+
+    def edge(self, *args, **kwargs):
+        self._dot.edge(*args, **kwargs)
+        self._flush()
+
+    def end(self):
+        self._write(self._tail)
@@ -0,0 +1,81 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Exports the graph as json records instead of dot
+
+Every node and edge is a separate record:
+
+* {"type": "resource_provider", "id": <uuid>, "data": {...}}
+* {"type": "consumer", "id": <uuid>, "data": {...}}
+* {"type": "parent", "parent": <RP uuid>, "child": <RP uuid>}
+* {"type": "allocation", "consumer": <uuid>, "resource_provider": <uuid>,
+  "resources": {<resource class>: <amount>}}
+"""
+import json
+
+import six
+
+FORMATS = ("json", "ndjson")
+
+
+def _dumps(record):
+    return six.text_type(json.dumps(record, sort_keys=True))
+
+
+def _write_list(out, records):
+    for i, record in enumerate(records):
+        if i:
+            out.write(six.text_type(", "))
+        out.write(_dumps(record))
+
+
+def iter_records(graph, field_filter=lambda _: True):
+    """Generates the records of the nodes and then the edges of the graph
+
+    :param graph: a graph with nodes and edges
+    :param field_filter: field name -> bool function that returns True for
+                         fields that need to be kept in the RP records
+    """
+    for node in graph.nodes:
+        yield node.to_record(field_filter)
+    for edge in graph.edges:
+        yield edge.to_record()
+
+
+def write_json(graph, out, field_filter=lambda _: True):
+    """Write the graph as a single json document to a file
+
+    The document is {"nodes": [<node records>], "edges": [<edge records>]}.
+    Every record is written to the file as soon as it is formatted so the
+    whole document is never kept in memory.
+
+    :param graph: a graph with nodes and edges
+    :param out: a file like object opened in text mode
+    :param field_filter: field name -> bool function that returns True for
+                         fields that need to be kept in the RP records
+    """
+    out.write(six.text_type('{"nodes": ['))
+    _write_list(out, (node.to_record(field_filter) for node in graph.nodes))
+    out.write(six.text_type('], "edges": ['))
+    _write_list(out, (edge.to_record() for edge in graph.edges))
+    out.write(six.text_type("]}"))
+
+
+def write_ndjson(graph, out, field_filter=lambda _: True):
+    """Write the graph to a file as newline delimited json records
+
+    :param graph: a graph with nodes and edges
+    :param out: a file like object opened in text mode
+    :param field_filter: field name -> bool function that returns True for
+                         fields that need to be kept in the RP records
+    """
+    for record in iter_records(graph, field_filter):
+        out.write(_dumps(record) + six.text_type("\n"))
@@ -9,12 +9,39 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 # under the License.
+import collections
+
 from osc_placement_tree import html
 
 
+def _show_every_field(name):
+    # a single function object instead of a new lambda per render so that
+    # html can memoize the sorted keys per filter
+    return True
+
+
+def _filter_fields(data, field_filter):
+    """Returns the data without the fields dropped by the filter
+
+    The filter is applied on every level of nested dicts the same way as the
+    html labels apply it.
+    """
+    if isinstance(data, dict):
+        return {
+            key: _filter_fields(value, field_filter)
+            for key, value in data.items()
+            if field_filter(key)
+        }
+    return data
+
+
 class Node(object):
     """The wrapper for a node"""
 
+    # A graph can have hundreds of thousands of nodes and edges so these
+    # classes use slots instead of a per instance __dict__
+    __slots__ = ("data",)
+
     def __init__(self, data):
         """Create a Node
 
@@ -25,37 +52,68 @@ class Node(object):
     def add_to_dot(self, dot, field_filter):
         raise NotImplemented()
 
+    def to_record(self, field_filter):
+        """Returns the node as a json serializable dict"""
+        raise NotImplementedError()
+
     def id(self):
         raise NotImplemented()
 
 
 class RpNode(Node):
+    __slots__ = ()
+
     def add_to_dot(self, dot, field_filter):
         dot.node(self.id(), html._get_attr_html(self.data, field_filter))
 
+    def to_record(self, field_filter):
+        return {
+            "type": "resource_provider",
+            "id": self.id(),
+            "data": _filter_fields(self.data, field_filter),
+        }
+
     def id(self):
         return self.data["uuid"]
 
 
 class ConsumerNode(Node):
-    def _get_node_data(self):
-        import copy
+    __slots__ = ("allocations",)
 
-        data = copy.deepcopy(self.data)
-        data.pop("allocations")
-        return data
+    def __init__(self, data):
+        """Create a ConsumerNode
+
+        :param data: the consumer in the format of the /allocations/{uuid}
+                     response extended with its consumer_uuid. The
+                     allocations are kept separately from the rest of the
+                     data as only their resources are shown, on the
+                     AllocationEdges. The data itself is not modified.
+        """
+        data = dict(data)
+        allocations = data.pop("allocations")
+        super(ConsumerNode, self).__init__(data)
+        # RP uuid -> the resources allocated from the RP
+        self.allocations = {
+            rp_uuid: allocation.get("resources", {})
+            for rp_uuid, allocation in allocations.items()
+        }
 
     def add_to_dot(self, dot, field_filter):
-        dot.node(
-            self.id(),
-            html._get_attr_html(self._get_node_data(), lambda _: True),
-        )
+        # the allocations are kept out of the data at construction so the
+        # data can be rendered as is
+        dot.node(self.id(), html._get_attr_html(self.data, _show_every_field))
+
+    def to_record(self, field_filter):
+        # like in the dot output the filter only applies to the RPs
+        return {"type": "consumer", "id": self.id(), "data": self.data}
 
     def id(self):
         return self.data["consumer_uuid"]
 
 
 class Edge(object):
+    __slots__ = ("node1", "node2")
+
     def __init__(self, node1, node2):
         self.node1 = node1
         self.node2 = node2
@@ -63,6 +121,10 @@ class Edge(object):
     def add_to_dot(self, dot):
         raise NotImplemented()
 
+    def to_record(self):
+        """Returns the edge as a json serializable dict"""
+        raise NotImplementedError()
+
     def __eq__(self, other):
         if other and isinstance(other, Edge):
             return self.node1 == other.node1 and self.node2 == other.node2
@@ -77,11 +139,20 @@ class ParentEdge(Edge):
     node2 should be the parent
     """
 
+    __slots__ = ()
+
     def add_to_dot(self, dot):
         # To layout the graph in the dot from parent on top to child below it
         # we need to add a parent -> child edge with reversed arrow
         dot.edge(self.node2.id(), self.node1.id(), dir="back", label="parent")
 
+    def to_record(self):
+        return {
+            "type": "parent",
+            "parent": self.node2.id(),
+            "child": self.node1.id(),
+        }
+
 
 class AllocationEdge(Edge):
     """A consumer -> rp edge representing an allocation
@@ -90,10 +161,10 @@ class AllocationEdge(Edge):
     node2 should be the RpNode
     """
 
+    __slots__ = ()
+
     def add_to_dot(self, dot):
-        resources = self.node1.data["allocations"][self.node2.id()][
-            "resources"
-        ]
+        resources = self.node1.allocations[self.node2.id()]
         # To layout the graph in the dot from RPs on the top and consumers
         # below we need to add the edge reversed
         dot.edge(
@@ -102,7 +173,7 @@ class AllocationEdge(Edge):
             dir="back",
             label="<{html}>".format(
                 html=html._get_html_dict(
-                    resources, lambda _: True, header="consumes"
+                    resources, _show_every_field, header="consumes"
                 )
             ),
             decorate="true",  # connect the label to the edge
@@ -110,6 +181,14 @@ class AllocationEdge(Edge):
             style="dashed",
         )
 
+    def to_record(self):
+        return {
+            "type": "allocation",
+            "consumer": self.node1.id(),
+            "resource_provider": self.node2.id(),
+            "resources": self.node1.allocations[self.node2.id()],
+        }
+
 
 class Graph(object):
     def __init__(self, nodes, edges):
@@ -119,8 +198,13 @@ class Graph(object):
         :param edges: A list of two tuples of objects (dicts?) representing a
                       relationship between two nodes
         """
-        self.nodes = nodes
+        self._nodes = []
+        # index of the nodes by their id to avoid linear lookups
+        self._nodes_by_id = {}
+        self._rp_nodes = []
+        self._consumer_nodes = []
         self.edges = edges
+        self.add_nodes(nodes)
 
     def add_to_dot(self, dot, node_field_filter):
         for node in self.nodes:
@@ -128,14 +212,65 @@ class Graph(object):
         for edge in self.edges:
             edge.add_to_dot(dot)
 
+    def add_nodes(self, nodes):
+        """Extends the graph with new nodes
+
+        :param nodes: an iterable of Node objects
+        """
+        for node in nodes:
+            self._nodes.append(node)
+            self._nodes_by_id[node.id()] = node
+            if isinstance(node, RpNode):
+                self._rp_nodes.append(node)
+            elif isinstance(node, ConsumerNode):
+                self._consumer_nodes.append(node)
+
+    @property
+    def nodes(self):
+        """Every node of the graph in insertion order
+
+        Do not modify the returned list directly, use add_nodes() instead to
+        keep the internal indexes up to date.
+        """
+        return self._nodes
+
     @property
     def rp_nodes(self):
-        # isintance is ugly, alternatively we could store RpNodes in a separate
-        # list internally.
-        return [node for node in self.nodes if isinstance(node, RpNode)]
+        return self._rp_nodes
+
+    @property
+    def consumer_nodes(self):
+        return self._consumer_nodes
+
+    def has_node(self, id):
+        return id in self._nodes_by_id
 
     def get_node_by_id(self, id):
-        for node in self.nodes:
-            if node.id() == id:
-                return node
-        raise ValueError("Node with id %s not found in the graph" % id)
+        try:
+            return self._nodes_by_id[id]
+        except KeyError:
+            raise ValueError("Node with id %s not found in the graph" % id)
+
+    def get_rp_trees(self):
+        """Returns the structure of the RP trees of the graph
+
+        :returns: a (children, order, root_of) tuple where children is a dict
+                  of RP uuid -> the list of the child RpNodes, order is the
+                  list of every RpNode in breadth first order, so the roots
+                  come first and every parent is before its children, and
+                  root_of is a dict of RP uuid -> the uuid of its root
+        """
+        children = collections.defaultdict(list)
+        has_parent = set()
+        for edge in self.edges:
+            if isinstance(edge, ParentEdge):
+                children[edge.node2.id()].append(edge.node1)
+                has_parent.add(edge.node1.id())
+
+        order = [node for node in self.rp_nodes if node.id() not in has_parent]
+        root_of = {node.id(): node.id() for node in order}
+        for node in order:
+            for child in children[node.id()]:
+                root_of[child.id()] = root_of[node.id()]
+                order.append(child)
+        return children, order, root_of
@@ -0,0 +1,237 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Colors the resource providers of the graph by their utilization
+
+The utilization of a resource class is the used amount divided by the
+capacity placement allocates from, (total - reserved) * allocation_ratio. The
+utilization of a provider is the highest utilization of its resource classes
+and the utilization of a tree is calculated the same way from the summed up
+usages and capacities of the providers of the tree.
+
+The subtrees without any usage are collapsed into a single node.
+"""
+import collections
+
+from osc_placement_tree import graph as graph_module
+from osc_placement_tree import html
+
+# The color of the providers without usage
+IDLE_COLOR = "#7fff7f"
+
+
+def get_capacity(inventory):
+    """Returns the amount of the resource class that can be allocated"""
+    return (inventory["total"] - inventory.get("reserved", 0)) * inventory.get(
+        "allocation_ratio", 1.0
+    )
+
+
+def _get_ratio(used, capacity):
+    if capacity <= 0:
+        # a fully reserved inventory can only be used by overallocation
+        return 1.0 if used else 0.0
+    return float(used) / capacity
+
+
+def get_utilization(inventories):
+    """Returns the utilization of an RP
+
+    :param inventories: the inventories of the RP extended with the used
+                        amounts
+    :returns: the highest utilization of the resource classes or None if the
+              RP has no inventories
+    """
+    if not inventories:
+        return None
+    return max(
+        _get_ratio(inventory.get("used", 0), get_capacity(inventory))
+        for inventory in inventories.values()
+    )
+
+
+def get_color(utilization):
+    """Returns a green - yellow - red color of the utilization"""
+    utilization = min(max(utilization, 0.0), 1.0)
+    red = int(255 * min(1.0, 2 * utilization))
+    green = int(255 * min(1.0, 2 * (1.0 - utilization)))
+    # lighten the color so the label stays readable
+    return "#%02x%02x7f" % ((red + 255) // 2, (green + 255) // 2)
+
+
+def _is_idle(rp_node):
+    return not any(
+        inventory.get("used", 0)
+        for inventory in rp_node.data.get("inventories", {}).values()
+    )
+
+
+class HeatmapRpNode(graph_module.RpNode):
+    """An RP filled with the color of its utilization"""
+
+    __slots__ = ("utilization", "tree_utilization")
+
+    def __init__(self, data, utilization, tree_utilization=None):
+        """Create a HeatmapRpNode
+
+        :param data: the RP as in the RpNode
+        :param utilization: the utilization of the RP or None if it has no
+                            inventories
+        :param tree_utilization: the utilization of the tree if this is the
+                                 root of the tree, None otherwise
+        """
+        super(HeatmapRpNode, self).__init__(data)
+        self.utilization = utilization
+        self.tree_utilization = tree_utilization
+
+    def add_to_dot(self, dot, field_filter):
+        header = []
+        if self.tree_utilization is not None:
+            header.append(
+                "tree utilization %d%%" % (100 * self.tree_utilization)
+            )
+        if self.utilization is None:
+            attrs = {}
+        else:
+            header.append("utilization %d%%" % (100 * self.utilization))
+            attrs = {
+                "style": "filled",
+                "fillcolor": get_color(self.utilization),
+            }
+        dot.node(
+            self.id(),
+            "<%s>"
+            % html._get_html_dict(
+                self.data, field_filter, header="<BR/>".join(header)
+            ),
+            **attrs
+        )
+
+    def to_record(self, field_filter):
+        record = super(HeatmapRpNode, self).to_record(field_filter)
+        record["utilization"] = self.utilization
+        if self.tree_utilization is not None:
+            record["tree_utilization"] = self.tree_utilization
+        return record
+
+
+class IdleSubtreeNode(graph_module.RpNode):
+    """Stands for a subtree of RPs without any usage
+
+    The node has the uuid of the root of the subtree so the edge to the
+    parent of the subtree is kept.
+    """
+
+    __slots__ = ()
+
+    def add_to_dot(self, dot, field_filter):
+        dot.node(
+            self.id(),
+            html._get_attr_html(self.data, field_filter),
+            style="filled",
+            fillcolor=IDLE_COLOR,
+        )
+
+    def to_record(self, field_filter):
+        record = super(IdleSubtreeNode, self).to_record(field_filter)
+        record["type"] = "idle_subtree"
+        return record
+
+
+def _get_idle_subtree_data(root, rps):
+    capacities = collections.defaultdict(int)
+    for rp in rps:
+        for rc, inventory in rp.data.get("inventories", {}).items():
+            capacities[rc] += get_capacity(inventory)
+    return {
+        "uuid": root.id(),
+        "name": root.data.get("name"),
+        "idle providers": len(rps),
+        "capacity": dict(capacities),
+    }
+
+
+def make_heatmap_graph(graph):
+    """Returns a copy of the graph with the RPs colored by utilization
+
+    The utilizations are calculated once here so rendering the graph only
+    formats them. Every subtree of more than one RP without any usage is
+    replaced by a single IdleSubtreeNode.
+
+    :param graph: a graph of RP trees and consumers. The RPs need to have
+                  their inventories extended with the used amounts.
+    :returns: a new Graph object. The consumer nodes are shared with the
+              input graph.
+    """
+    children, order, root_of = graph.get_rp_trees()
+
+    # the RPs of the subtree of an RP if the subtree is idle
+    idle_subtrees = {}
+    for node in reversed(order):
+        subtrees = [
+            idle_subtrees.get(child.id()) for child in children[node.id()]
+        ]
+        if _is_idle(node) and all(subtree is not None for subtree in subtrees):
+            idle_subtrees[node.id()] = [node] + [
+                rp for subtree in subtrees for rp in subtree
+            ]
+
+    # root uuid -> resource class -> [used, capacity]
+    tree_totals = collections.defaultdict(
+        lambda: collections.defaultdict(lambda: [0, 0])
+    )
+    for node in order:
+        totals = tree_totals[root_of[node.id()]]
+        for rc, inventory in node.data.get("inventories", {}).items():
+            totals[rc][0] += inventory.get("used", 0)
+            totals[rc][1] += get_capacity(inventory)
+
+    new_nodes = {}
+    collapsed = set()
+    for node in order:
+        if node.id() in collapsed:
+            continue
+        subtree = idle_subtrees.get(node.id())
+        if subtree is not None and len(subtree) > 1:
+            new_nodes[node.id()] = IdleSubtreeNode(
+                _get_idle_subtree_data(node, subtree)
+            )
+            collapsed.update(rp.id() for rp in subtree[1:])
+            continue
+
+        tree_utilization = None
+        if node.id() in tree_totals and tree_totals[node.id()]:
+            tree_utilization = max(
+                _get_ratio(used, capacity)
+                for used, capacity in tree_totals[node.id()].values()
+            )
+        new_nodes[node.id()] = HeatmapRpNode(
+            node.data,
+            get_utilization(node.data.get("inventories")),
+            tree_utilization,
+        )
+
+    nodes = [
+        new_nodes.get(node.id(), node)
+        for node in graph.nodes
+        if node.id() not in collapsed
+    ]
+    edges = []
+    for edge in graph.edges:
+        if edge.node1.id() in collapsed or edge.node2.id() in collapsed:
+            continue
+        edges.append(
+            type(edge)(
+                new_nodes.get(edge.node1.id(), edge.node1),
+                new_nodes.get(edge.node2.id(), edge.node2),
+            )
+        )
+    return graph_module.Graph(nodes, edges)
@@ -9,7 +9,67 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 # under the License.
-import operator
+
+# The constant parts of the generated html labels
+_TABLE_START = (
+    '<TABLE BORDER="0" CELLBORDER="1" CELLSPACING="0" CELLPADDING="4">\n'
+)
+_TABLE_END = "</TABLE>\n"
+_HEADER = (
+    '<TR BORDER="0" CELLBORDER="0">'
+    '<TD ALIGN="LEFT" BALIGN="LEFT" BORDER="0">'
+    "%s"
+    "</TD></TR>\n"
+)
+_SCALAR = '<TD  ALIGN="LEFT" BALIGN="LEFT">%s</TD>'
+_EMPTY_LIST = _SCALAR % "[]"
+# a key - value row where the value is already formatted
+_ROW = "<TR>" + _SCALAR + "%s</TR>\n"
+# a key - value row where the value is a scalar
+_SCALAR_ROW = "<TR>" + _SCALAR + _SCALAR + "</TR>\n"
+
+# (field_filter, keys of a dict) -> the sorted list of keys kept by the
+# filter. The nodes of a graph mostly have the same set of fields so this
+# saves sorting and filtering the same keys again and again.
+_SORTED_KEYS_CACHE = {}
+_SORTED_KEYS_CACHE_SIZE = 1024
+# header -> formatted header row
+_HEADER_CACHE = {}
+
+
+class FieldFilter(object):
+    """A field name -> bool filter that can be sent to other processes
+
+    Two filters with the same fields are equal so the memoization above works
+    across filter objects, e.g. after unpickling the filter in a worker.
+    """
+
+    def __init__(self, include=None, exclude=()):
+        """Create a FieldFilter
+
+        :param include: if not None then only these fields are kept
+        :param exclude: the fields to drop if include is None
+        """
+        self.include = frozenset(include) if include is not None else None
+        self.exclude = frozenset(exclude)
+
+    def __call__(self, name):
+        if self.include is not None:
+            return name in self.include
+        return name not in self.exclude
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, FieldFilter)
+            and self.include == other.include
+            and self.exclude == other.exclude
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.include, self.exclude))
 
 
 def _get_attr_html(data_dict, field_filter):
@@ -18,35 +78,40 @@ def _get_attr_html(data_dict, field_filter):
 
 
 def _get_html_scalar(scalar):
-    return '<TD  ALIGN="LEFT" BALIGN="LEFT">%s</TD>' % scalar
+    return _SCALAR % scalar
+
+
+def _get_sorted_keys(a_dict, field_filter):
+    cache_key = (field_filter, tuple(a_dict))
+    keys = _SORTED_KEYS_CACHE.get(cache_key)
+    if keys is None:
+        if len(_SORTED_KEYS_CACHE) >= _SORTED_KEYS_CACHE_SIZE:
+            _SORTED_KEYS_CACHE.clear()
+        keys = [key for key in sorted(a_dict) if field_filter(key)]
+        _SORTED_KEYS_CACHE[cache_key] = keys
+    return keys
 
 
 def _get_html_dict(a_dict, field_filter, header=None):
     if not a_dict:
         return "{}"
 
-    attrs = (
-        '<TABLE BORDER="0" CELLBORDER="1" '
-        'CELLSPACING="0" CELLPADDING="4">\n'
-    )
+    parts = [_TABLE_START]
     if header:
-        attrs += (
-            '<TR BORDER="0" CELLBORDER="0">'
-            '<TD ALIGN="LEFT" BALIGN="LEFT" BORDER="0">'
-            "{header}"
-            "</TD></TR>\n"
-        ).format(header=header)
-    for key, value in sorted(a_dict.items(), key=operator.itemgetter(0)):
-        if field_filter(key):
-            attrs += _get_html_key_value(key, value, field_filter)
-    attrs += "</TABLE>\n"
-    return attrs
+        header_html = _HEADER_CACHE.get(header)
+        if header_html is None:
+            header_html = _HEADER_CACHE[header] = _HEADER % header
+        parts.append(header_html)
+    for key in _get_sorted_keys(a_dict, field_filter):
+        parts.append(_get_html_key_value(key, a_dict[key], field_filter))
+    parts.append(_TABLE_END)
+    return "".join(parts)
 
 
 def _get_html_value(value, field_filter):
     if isinstance(value, list):
         if not value:
-            return _get_html_scalar("[]")
+            return _EMPTY_LIST
 
         # assuming that list items are scalars
         return _get_html_scalar("<BR/>".join(value))
@@ -58,9 +123,7 @@ def _get_html_value(value, field_filter):
 
 def _get_html_key_value(key, value, field_filter):
     # assuming that the key is scalar
-    return (
-        "<TR>"
-        + _get_html_scalar(key)
-        + _get_html_value(value, field_filter)
-        + "</TR>\n"
-    )
+    if isinstance(value, (list, dict)):
+        return _ROW % (key, _get_html_value(value, field_filter))
+    # most of the values are scalars so format them in one step
+    return _SCALAR_ROW % (key, value)
@@ -12,11 +12,16 @@
 
 import contextlib
 import json
+import threading
+import time
 
 import keystoneauth1.exceptions.http as ks_exceptions
+import keystoneauth1.session as ks_session
 import osc_lib.exceptions as exceptions
 import six
 
+from osc_placement_tree import profiling
+
 
 _http_error_to_exc = {
     cls.http_status: cls for cls in exceptions.ClientException.__subclasses__()
@@ -39,28 +44,138 @@ def _wrap_http_exceptions():
         six.raise_from(exc_class(exc.http_status, msg), exc)
 
 
+def version_tuple(version):
+    """Converts a microversion string like "1.18" to a comparable tuple"""
+    return tuple(int(part) for part in version.split("."))
+
+
 class SessionClient(object):
-    def __init__(self, session, ks_filter, api_version="1.0"):
+    def __init__(
+        self, session, ks_filter, api_version="1.0", compression=True
+    ):
         self.session = session
         self.ks_filter = ks_filter
         self.api_version = api_version
+        # ask for compressed responses. The placement responses are json so
+        # they compress well.
+        self.compression = compression
+        # the number of requests sent to placement by this client
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._endpoint = None
+        # microversion -> OpenStack-API-Version header value
+        self._version_headers = {}
+
+    def get_endpoint(self):
+        """Returns the URL of the placement service
+
+        The endpoint is only looked up once per client.
+        """
+        if self._endpoint is None:
+            self._endpoint = self.session.get_endpoint(**self.ks_filter)
+        return self._endpoint
+
+    def configure_connection_pool(self, size):
+        """Keeps up to size connections open to be reused by the requests
+
+        :param size: the maximum number of concurrent requests the client is
+                     used for. The requests above this limit wait for a free
+                     connection instead of opening and dropping extra ones.
+        """
+        adapter = ks_session.TCPKeepAliveAdapter(
+            pool_maxsize=max(size, 1), pool_block=True
+        )
+        for prefix in ("https://", "http://"):
+            self.session.session.mount(prefix, adapter)
+
+    def connection_stats(self):
+        """Returns the number of connections opened and reused so far
+
+        :returns: a dict with "opened" and "reused" keys
+        """
+        opened = requests = 0
+        # the same adapter can be mounted to more than one prefix
+        adapters = {
+            id(adapter): adapter
+            for adapter in self.session.session.adapters.values()
+        }
+        for adapter in adapters.values():
+            pools = getattr(adapter, "poolmanager", None)
+            pools = pools.pools if pools else {}
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool:
+                    opened += pool.num_connections
+                    requests += pool.num_requests
+        return {"opened": opened, "reused": requests - opened}
+
+    def get_max_version(self):
+        """Returns the highest microversion the placement service supports"""
+        versions = self.request("GET", "/").json()["versions"]
+        return max(
+            (version["max_version"] for version in versions),
+            key=version_tuple,
+        )
+
+    def supports_version(self, version):
+        """Returns True if the placement service supports the microversion"""
+        return version_tuple(self.get_max_version()) >= version_tuple(version)
+
+    def use_max_version(self, min_version):
+        """Switches to the highest microversion the placement service supports
+
+        :param min_version: the lowest microversion the caller can use
+        :returns: False and keeps the current microversion if the service does
+                  not support min_version, True otherwise
+        """
+        max_version = self.get_max_version()
+        if version_tuple(max_version) < version_tuple(min_version):
+            return False
+        self.api_version = max_version
+        return True
+
+    def _get_version_header(self, version):
+        header = self._version_headers.get(version)
+        if header is None:
+            header = self._version_headers[version] = (
+                self.ks_filter["service_type"] + " " + version
+            )
+        return header
 
     def request(self, method, url, **kwargs):
         version = kwargs.pop("version", None)
-        api_version = (
-            self.ks_filter["service_type"]
-            + " "
-            + (version or self.api_version)
-        )
         headers = kwargs.pop("headers", {})
-        headers.setdefault("OpenStack-API-Version", api_version)
+        headers.setdefault(
+            "OpenStack-API-Version",
+            self._get_version_header(version or self.api_version),
+        )
         headers.setdefault("Accept", "application/json")
+        headers.setdefault(
+            "Accept-Encoding",
+            "gzip, deflate" if self.compression else "identity",
+        )
+
+        relative_url = url
+        endpoint = self.get_endpoint()
+        if endpoint:
+            # the session skips the endpoint lookup for absolute urls
+            url = endpoint.rstrip("/") + url
+        else:
+            kwargs["endpoint_filter"] = self.ks_filter
 
-        with _wrap_http_exceptions():
-            return self.session.request(
-                url,
-                method,
-                headers=headers,
-                endpoint_filter=self.ks_filter,
-                **kwargs
+        with self._lock:
+            self.request_count += 1
+        start = time.time()
+        nbytes = 0
+        try:
+            with _wrap_http_exceptions():
+                response = self.session.request(
+                    url, method, headers=headers, **kwargs
+                )
+            if profiling.is_enabled():
+                nbytes = len(response.content or b"")
+            return response
+        finally:
+            profiling.record_request(
+                method, relative_url, time.time() - start, nbytes
             )
@@ -0,0 +1,202 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Collects where the time goes while building and rendering the graph
+
+The instrumented code calls the module level record_request() and phase()
+functions. These are no-ops unless a Profiler is enabled with enable().
+"""
+import collections
+import contextlib
+import re
+import threading
+import time
+
+# The upper bounds of the latency histogram buckets in seconds
+_LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, float("inf"))
+_LATENCY_BUCKET_NAMES = (
+    "<10ms",
+    "<50ms",
+    "<100ms",
+    "<250ms",
+    "<500ms",
+    "<1s",
+    ">=1s",
+)
+
+_UUID = re.compile(
+    r"[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?"
+    r"[0-9a-fA-F]{12}"
+)
+_QUERY_VALUE = re.compile(r"=[^&]*")
+
+_profiler = None
+
+
+def _get_endpoint(url):
+    """Groups the urls of the same endpoint
+
+    E.g. /resource_providers/<some uuid>/inventories becomes
+    /resource_providers/{uuid}/inventories and
+    /resource_providers?in_tree=<some uuid> becomes
+    /resource_providers?in_tree=*
+    """
+    path, _, query = url.partition("?")
+    endpoint = _UUID.sub("{uuid}", path)
+    if query:
+        endpoint += "?" + _QUERY_VALUE.sub("=*", query)
+    return endpoint
+
+
+class _RequestStats(object):
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.bytes = 0
+        self.histogram = [0] * len(_LATENCY_BUCKETS)
+
+    def add(self, seconds, nbytes):
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.bytes += nbytes
+        for i, bound in enumerate(_LATENCY_BUCKETS):
+            if seconds < bound:
+                self.histogram[i] += 1
+                break
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "seconds": self.seconds,
+            "max_seconds": self.max_seconds,
+            "bytes": self.bytes,
+            "latency_histogram": collections.OrderedDict(
+                zip(_LATENCY_BUCKET_NAMES, self.histogram)
+            ),
+        }
+
+
+class Profiler(object):
+    """Collects request and phase statistics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # endpoint -> _RequestStats
+        self._requests = collections.OrderedDict()
+        # phase name -> seconds spent in the phase
+        self._phases = collections.OrderedDict()
+
+    def record_request(self, method, url, seconds, nbytes):
+        """Records a finished request
+
+        :param method: the HTTP method of the request
+        :param url: the url relative to the placement endpoint
+        :param seconds: the time until the response arrived
+        :param nbytes: the size of the response body
+        """
+        endpoint = method + " " + _get_endpoint(url)
+        with self._lock:
+            stats = self._requests.get(endpoint)
+            if stats is None:
+                stats = self._requests[endpoint] = _RequestStats()
+            stats.add(seconds, nbytes)
+
+    def record_phase(self, name, seconds):
+        with self._lock:
+            self._phases[name] = self._phases.get(name, 0.0) + seconds
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "requests": collections.OrderedDict(
+                    (endpoint, stats.to_dict())
+                    for endpoint, stats in self._requests.items()
+                ),
+                "phases": collections.OrderedDict(self._phases),
+            }
+
+    def report(self, out):
+        """Writes a human readable summary table to the out stream"""
+        data = self.to_dict()
+        row = "%-50s %6s %9s %8s %8s %10s  %s\n"
+        out.write(
+            row
+            % (
+                "endpoint",
+                "count",
+                "total s",
+                "avg ms",
+                "max ms",
+                "KiB",
+                "/".join(_LATENCY_BUCKET_NAMES),
+            )
+        )
+        for endpoint, stats in data["requests"].items():
+            out.write(
+                row
+                % (
+                    endpoint,
+                    stats["count"],
+                    "%.3f" % stats["seconds"],
+                    "%.1f" % (stats["seconds"] * 1000 / stats["count"]),
+                    "%.1f" % (stats["max_seconds"] * 1000),
+                    "%.1f" % (stats["bytes"] / 1024.0),
+                    "/".join(
+                        str(count)
+                        for count in stats["latency_histogram"].values()
+                    ),
+                )
+            )
+        out.write("\n%-50s %9s\n" % ("phase", "total s"))
+        for name, seconds in data["phases"].items():
+            out.write("%-50s %9.3f\n" % (name, seconds))
+
+
+def enable(profiler):
+    """Starts collecting statistics into the given Profiler"""
+    global _profiler
+    _profiler = profiler
+
+
+def disable():
+    global _profiler
+    _profiler = None
+
+
+def is_enabled():
+    return _profiler is not None
+
+
+def record_request(method, url, seconds, nbytes):
+    profiler = _profiler
+    if profiler is not None:
+        profiler.record_request(method, url, seconds, nbytes)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Measures the time spent in the with block as part of a named phase
+
+    Phases with the same name are summed up. As the time is measured per
+    with block nested phases are counted in each of the enclosing phases.
+    """
+    profiler = _profiler
+    if profiler is None:
+        yield
+        return
+
+    start = time.time()
+    try:
+        yield
+    finally:
+        profiler.record_phase(name, time.time() - start)
@@ -9,12 +9,30 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 # under the License.
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
 import uuid
 
 from cliff import command
+import six
+from six.moves.urllib import parse
+
+from osc_placement_tree import cache
 from osc_placement_tree import dot
+from osc_placement_tree import export
+from osc_placement_tree import heatmap
+from osc_placement_tree import html
+from osc_placement_tree import profiling
+from osc_placement_tree import snapshot
+from osc_placement_tree import summary
 from osc_placement_tree import tree
 
+LOG = logging.getLogger(__name__)
+
 # These fields are provided by placement but after processing they are
 # represented by the model itself so these fields can be dropped from the data
 # store
@@ -36,38 +54,433 @@ DEFAULT_HIDDEN_FIELDS = [
 
 
 class ClientAdapter(object):
-    def __init__(self, client):
+    def __init__(self, client, version=None):
+        """Create a ClientAdapter
+
+        :param client: an http.SessionClient
+        :param version: the microversion of the requests. Defaults to the
+                        current microversion of the client.
+        """
         self.client = client
+        self.version = version
 
     def get(self, url):
-        return self.client.request("GET", url).json()
+        return self.client.request("GET", url, version=self.version).json()
 
 
 def _get_field_filter(parsed_args):
     if parsed_args.fields:
-        fields = parsed_args.fields.split(",")
-        return lambda name: name in fields
+        return html.FieldFilter(include=parsed_args.fields.split(","))
     else:
-        return lambda name: name not in DEFAULT_HIDDEN_FIELDS
+        return html.FieldFilter(exclude=DEFAULT_HIDDEN_FIELDS)
+
+
+def _get_rp_data_endpoints(parsed_args):
+    endpoints = tree.get_rp_data_endpoints(_get_field_filter(parsed_args))
+    # the heatmap and the summary are calculated from these even if they are
+    # not shown. Only the list command has --summary.
+    needed = []
+    if parsed_args.heatmap:
+        needed = ["inventories", "usages"]
+    if getattr(parsed_args, "summary", False):
+        needed = ["inventories", "traits", "usages"]
+    for endpoint in needed:
+        if endpoint not in endpoints:
+            endpoints.append(endpoint)
+    return endpoints
+
+
+def _get_rp_filter(parsed_args):
+    if not (
+        parsed_args.trait
+        or parsed_args.aggregate
+        or parsed_args.min_free
+        or parsed_args.resource_class
+    ):
+        return None
+
+    min_free = {}
+    for rc_amount in parsed_args.min_free:
+        rc, _, amount = rc_amount.partition("=")
+        try:
+            min_free[rc] = int(amount)
+        except ValueError:
+            raise ValueError(
+                "--min_free needs a <resource class>=<amount> value instead "
+                "of %s" % rc_amount
+            )
+    return tree.RpFilter(
+        traits=parsed_args.trait,
+        aggregates=parsed_args.aggregate,
+        min_free=min_free,
+        resource_classes=parsed_args.resource_class,
+    )
+
+
+def _add_consumer_details_argument(parser):
+    parser.add_argument(
+        "--hide_consumer_details",
+        help="Do not show the project, user and generation of the "
+        "consumers. Halves the number of requests needed by "
+        "--show_consumers as the consumers are built from the "
+        "allocations of the resource providers.",
+        action="store_true",
+    )
+
+
+def _add_parallel_argument(parser):
+    parser.add_argument(
+        "--parallel",
+        metavar="<N>",
+        help="The maximum number of concurrent requests sent to the "
+        "placement service.",
+        type=int,
+        default=1,
+    )
+
+
+def _add_bulk_argument(parser):
+    parser.add_argument(
+        "--bulk",
+        help="Use the highest placement microversion supported by the "
+        "service and collect the resource provider data with as few "
+        "requests as possible. Needs at least placement microversion "
+        "%s." % tree.BULK_MODE_MIN_VERSION,
+        action="store_true",
+    )
+
+
+def _add_snapshot_argument(parser):
+    parser.add_argument(
+        "--since_snapshot",
+        metavar="<file>",
+        help="Reuse the inventories, traits and aggregates of the "
+        "resource providers from the snapshot file of a previous run if "
+        "their generation is unchanged. The file is created if missing "
+        "and updated with the current data at the end of the run.",
+    )
+
+
+def _add_cache_arguments(parser):
+    parser.add_argument(
+        "--cache",
+        help="Store the placement responses under %s and reuse them in "
+        "later invocations. The inventories, traits and aggregates of a "
+        "resource provider are reused until its generation changes, every "
+        "other response is reused within --cache_ttl." % cache.get_cache_dir(),
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cache_ttl",
+        metavar="<seconds>",
+        help="The number of seconds a cached response is reused for. "
+        "Defaults to %d." % cache.DEFAULT_TTL,
+        type=int,
+        default=cache.DEFAULT_TTL,
+    )
+
+
+def _add_format_argument(parser):
+    parser.add_argument(
+        "--format",
+        help="The output format. The %s formats are laid out by running the "
+        "graphviz dot executable, so it needs to be installed, and the "
+        "result is cached under %s so an unchanged graph is not laid out "
+        "again. The %s formats list the nodes and edges as json records. "
+        "Defaults to dot."
+        % (
+            "/".join(dot.RENDER_FORMATS),
+            _get_render_cache_dir(),
+            "/".join(export.FORMATS),
+        ),
+        choices=("dot",) + dot.RENDER_FORMATS + export.FORMATS,
+        default="dot",
+    )
+
+
+def _add_heatmap_argument(parser):
+    parser.add_argument(
+        "--heatmap",
+        help="Fill the resource providers with a color from green to red "
+        "according to their utilization, the used amount compared to "
+        "(total - reserved) * allocation_ratio, and show the utilization of "
+        "every tree on its root. The subtrees without any usage are "
+        "collapsed into a single node.",
+        action="store_true",
+    )
+
+
+def _get_render_cache_dir():
+    return os.path.join(cache.get_cache_dir(), "renders")
+
+
+def _make_heatmap_graph(graph, parsed_args):
+    if not parsed_args.heatmap:
+        return graph
+    with profiling.phase("heatmap"):
+        return heatmap.make_heatmap_graph(graph)
+
+
+def _write_graph(graph, parsed_args, processes=1):
+    field_filter = _get_field_filter(parsed_args)
+    graph = _make_heatmap_graph(graph, parsed_args)
+    if parsed_args.format == "dot":
+        with profiling.phase("render"):
+            dot.write_dot(
+                graph,
+                sys.stdout,
+                field_filter=field_filter,
+                processes=processes,
+            )
+            # keep the trailing new line the output had when it was printed
+            sys.stdout.write("\n")
+        return
+
+    if parsed_args.format == "json":
+        with profiling.phase("render"):
+            export.write_json(graph, sys.stdout, field_filter=field_filter)
+            sys.stdout.write("\n")
+        return
 
+    if parsed_args.format == "ndjson":
+        with profiling.phase("render"):
+            export.write_ndjson(graph, sys.stdout, field_filter=field_filter)
+        return
 
-def _get_uuid_form_name_or_uuid(client, uuid_or_name):
+    with profiling.phase("render"):
+        source = six.StringIO()
+        dot.write_dot(
+            graph, source, field_filter=field_filter, processes=processes
+        )
+    with profiling.phase("layout"):
+        output = dot.render(
+            source.getvalue(),
+            parsed_args.format,
+            cache_dir=_get_render_cache_dir(),
+        )
+    # the rendered formats are binary
+    out = getattr(sys.stdout, "buffer", sys.stdout)
+    out.write(output)
+    out.flush()
+
+
+def _add_profile_arguments(parser):
+    parser.add_argument(
+        "--profile",
+        help="Print the number, latency and size of the placement requests "
+        "per endpoint and the time spent in fetching the data, building the "
+        "graph and rendering the output to stderr.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--profile_json",
+        metavar="<file>",
+        help="Write the data collected by --profile to the file as json. "
+        "Implies --profile.",
+    )
+
+
+@contextlib.contextmanager
+def _profile(parsed_args):
+    if not (parsed_args.profile or parsed_args.profile_json):
+        yield
+        return
+
+    profiler = profiling.Profiler()
+    profiling.enable(profiler)
     try:
-        uuid.UUID(uuid_or_name)
-        rp_uuid = uuid_or_name
+        yield
+    finally:
+        profiling.disable()
+        profiler.report(sys.stderr)
+        if parsed_args.profile_json:
+            with io.open(parsed_args.profile_json, "w", encoding="utf-8") as f:
+                f.write(
+                    six.text_type(json.dumps(profiler.to_dict(), indent=2))
+                )
+
+
+def _get_client(http, parsed_args):
+    client = ClientAdapter(http)
+    if parsed_args.cache:
+        # the format of the responses depends on the microversion
+        path = cache.get_cache_path(
+            "responses", http.get_endpoint(), http.api_version
+        )
+        client = cache.CachingClient(client, path, ttl=parsed_args.cache_ttl)
+    return client
+
+
+def _get_filter_client(http, client, parsed_args):
+    """Returns the client listing the RPs matching the filter options
+
+    Only this listing needs a higher microversion for --trait so the rest of
+    the requests are kept on the current microversion.
+    """
+    if not parsed_args.trait:
+        return client
+    if not http.supports_version(tree.TRAIT_FILTER_MIN_VERSION):
+        raise ValueError(
+            "--trait needs at least placement microversion %s"
+            % tree.TRAIT_FILTER_MIN_VERSION
+        )
+    return ClientAdapter(http, version=tree.TRAIT_FILTER_MIN_VERSION)
+
+
+def _save_cache(client):
+    if isinstance(client, cache.CachingClient):
+        client.save()
+
+
+def _load_snapshot(parsed_args):
+    if parsed_args.since_snapshot:
+        return snapshot.Snapshot.load(parsed_args.since_snapshot)
+    return None
+
+
+def _save_snapshot(rp_snapshot, parsed_args):
+    if rp_snapshot is not None:
+        rp_snapshot.save(parsed_args.since_snapshot)
+
+
+def _use_bulk_mode(http, parsed_args):
+    if not parsed_args.bulk:
+        return False
+    if not http.use_max_version(tree.BULK_MODE_MIN_VERSION):
+        LOG.warning(
+            "The placement service does not support microversion %s "
+            "needed by --bulk. Querying every resource provider one by one.",
+            tree.BULK_MODE_MIN_VERSION,
+        )
+        return False
+    return True
+
+
+def _report_request_count(http):
+    LOG.info(
+        "%d requests were sent to placement, connections: %s",
+        http.request_count,
+        http.connection_stats(),
+    )
+
+
+def _iter_rp_trees(client, filter_client, bulk, rp_snapshot, parsed_args):
+    trees = tree.iter_rp_trees(
+        client,
+        drop_fields=DROP_DATA_FIELDS,
+        parallel=parsed_args.parallel,
+        bulk=bulk,
+        snapshot=rp_snapshot,
+        endpoints=_get_rp_data_endpoints(parsed_args),
+        rp_filter=_get_rp_filter(parsed_args),
+        filter_client=filter_client,
+    )
+    if parsed_args.show_consumers:
+        trees = _extend_trees_with_consumers(client, trees, parsed_args)
+    if parsed_args.heatmap:
+        trees = (
+            (root_uuid, _make_heatmap_graph(graph, parsed_args))
+            for root_uuid, graph in trees
+        )
+    return trees
+
+
+def _extend_trees_with_consumers(client, trees, parsed_args):
+    for root_uuid, graph in trees:
+        tree.extend_rp_graph_with_consumers(
+            client,
+            graph,
+            parallel=parsed_args.parallel,
+            consumer_details=not parsed_args.hide_consumer_details,
+        )
+        yield root_uuid, graph
+
+
+def _is_uuid(value):
+    try:
+        uuid.UUID(value)
+        return True
     except ValueError:
-        rp_name_to_uuid = {
-            rp["name"]: rp["uuid"]
-            for rp in client.get("/resource_providers")["resource_providers"]
-        }
-        rp_uuid = rp_name_to_uuid.get(uuid_or_name)
+        return False
+
+
+def _load_name_index(http):
+    return cache.NameIndex(cache.get_cache_path("names", http.get_endpoint()))
+
+
+def _get_uuid_form_name_or_uuid(client, uuid_or_name, name_index=None):
+    """Returns the uuid of the RP
 
-    if not rp_uuid:
+    :param uuid_or_name: the uuid or the name of the RP
+    :param name_index: an optional cache.NameIndex. A name is looked up in
+                       the index first and only resolved by placement if it
+                       is not indexed. The resolved name is stored in the
+                       index.
+    """
+    if _is_uuid(uuid_or_name):
+        return uuid_or_name
+
+    if name_index is not None:
+        rp_uuid = name_index.get(uuid_or_name)
+        if rp_uuid:
+            return rp_uuid
+
+    rps = client.get(
+        "/resource_providers?%s" % parse.urlencode({"name": uuid_or_name})
+    )["resource_providers"]
+    if not rps:
         raise ValueError("%s does not exists" % uuid_or_name)
 
+    rp_uuid = rps[0]["uuid"]
+    if name_index is not None:
+        name_index.set(uuid_or_name, rp_uuid)
     return rp_uuid
 
 
+def _make_rp_tree(client, name_index, bulk, rp_snapshot, parsed_args):
+    """Builds the tree of the RP given by its uuid or name
+
+    If the uuid of the name is taken from the index but the RP turns out to
+    be deleted or renamed since then the name is removed from the index and
+    resolved again by placement.
+    """
+    uuid_or_name = parsed_args.uuid_or_name
+    indexed = (
+        not _is_uuid(uuid_or_name) and name_index.get(uuid_or_name) is not None
+    )
+    rp_uuid = _get_uuid_form_name_or_uuid(client, uuid_or_name, name_index)
+
+    try:
+        graph = tree.make_rp_tree(
+            client,
+            rp_uuid,
+            drop_fields=DROP_DATA_FIELDS,
+            parallel=parsed_args.parallel,
+            bulk=bulk,
+            snapshot=rp_snapshot,
+            endpoints=_get_rp_data_endpoints(parsed_args),
+            subtree=parsed_args.subtree,
+            depth=parsed_args.depth,
+        )
+    except ValueError:
+        if not indexed:
+            raise
+        graph = None
+
+    # with --depth the requested RP itself might be pruned from the graph
+    if indexed and (
+        graph is None
+        or graph.has_node(rp_uuid)
+        and graph.get_node_by_id(rp_uuid).data.get("name") != uuid_or_name
+    ):
+        LOG.debug("The indexed uuid of %s is stale", uuid_or_name)
+        name_index.invalidate(uuid_or_name)
+        return _make_rp_tree(
+            client, name_index, bulk, rp_snapshot, parsed_args
+        )
+    return graph
+
+
 # This inherits directly from cliff as it wants to emit other than a simple
 # table on the output
 class ShowProviderTree(command.Command):
@@ -79,13 +492,31 @@ class ShowProviderTree(command.Command):
         parser.add_argument(
             "uuid_or_name",
             metavar="<uuid_or_name>",
-            help="UUID or name of one of the provider in the tree to show",
+            help="UUID or name of one of the provider in the tree to show. "
+            "The UUID of a name is remembered under %s for later "
+            "invocations." % cache.get_cache_dir(),
+        )
+        parser.add_argument(
+            "--subtree",
+            help="Show only the given provider and its descendants instead "
+            "of the whole tree containing it.",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--depth",
+            metavar="<N>",
+            help="Show only the providers at most N levels below the root "
+            "of the tree, or below the given provider with --subtree. The "
+            "data of the pruned providers is not queried.",
+            type=int,
         )
         parser.add_argument(
             "--fields",
             metavar="<fields>",
             help="The coma separated list of field names of the resource "
-            "provider to include in the output.",
+            "provider to include in the output. The inventories, traits, "
+            "aggregates and usages of the resource providers are only queried "
+            "if they are included.",
             default="",
         )
         parser.add_argument(
@@ -95,26 +526,46 @@ class ShowProviderTree(command.Command):
             const=True,
             default=False,
         )
+        _add_consumer_details_argument(parser)
+        _add_parallel_argument(parser)
+        _add_bulk_argument(parser)
+        _add_cache_arguments(parser)
+        _add_snapshot_argument(parser)
+        _add_format_argument(parser)
+        _add_heatmap_argument(parser)
+        _add_profile_arguments(parser)
         return parser
 
     def take_action(self, parsed_args):
-        http = self.app.client_manager.placement_tree
-        client = ClientAdapter(http)
+        if parsed_args.depth is not None and parsed_args.depth < 0:
+            raise ValueError("--depth needs to be at least 0")
 
-        rp_uuid = _get_uuid_form_name_or_uuid(client, parsed_args.uuid_or_name)
+        with _profile(parsed_args):
+            http = self.app.client_manager.placement_tree
+            http.configure_connection_pool(parsed_args.parallel)
+            bulk = _use_bulk_mode(http, parsed_args)
+            client = _get_client(http, parsed_args)
 
-        graph = tree.make_rp_tree(
-            client, rp_uuid, drop_fields=DROP_DATA_FIELDS
-        )
+            name_index = _load_name_index(http)
+            rp_snapshot = _load_snapshot(parsed_args)
+            graph = _make_rp_tree(
+                client, name_index, bulk, rp_snapshot, parsed_args
+            )
+            _save_snapshot(rp_snapshot, parsed_args)
 
-        if parsed_args.show_consumers:
-            tree.extend_rp_graph_with_consumers(client, graph)
+            if parsed_args.show_consumers:
+                tree.extend_rp_graph_with_consumers(
+                    client,
+                    graph,
+                    parallel=parsed_args.parallel,
+                    consumer_details=not parsed_args.hide_consumer_details,
+                )
 
-        print(
-            dot.graph_to_dot(
-                graph, field_filter=_get_field_filter(parsed_args)
-            )
-        )
+            _write_graph(graph, parsed_args)
+            # after the output so a failure to store it cannot hide the tree
+            name_index.save()
+            _save_cache(client)
+            _report_request_count(http)
 
 
 class ListProviderTree(command.Command):
@@ -126,7 +577,9 @@ class ListProviderTree(command.Command):
             "--fields",
             metavar="<fields>",
             help="The coma separated list of field names of the resource "
-            "provider to include in the output.",
+            "provider to include in the output. The inventories, traits, "
+            "aggregates and usages of the resource providers are only queried "
+            "if they are included.",
             default="",
         )
         parser.add_argument(
@@ -136,19 +589,184 @@ class ListProviderTree(command.Command):
             const=True,
             default=False,
         )
+        _add_consumer_details_argument(parser)
+        _add_parallel_argument(parser)
+        _add_bulk_argument(parser)
+        _add_cache_arguments(parser)
+        _add_snapshot_argument(parser)
+        parser.add_argument(
+            "--render_processes",
+            metavar="<N>",
+            help="The number of processes formatting the dot output. The "
+            "node labels of large graphs are formatted in parallel chunks "
+            "and the output is the same as with a single process.",
+            type=int,
+            default=1,
+        )
+        parser.add_argument(
+            "--stream",
+            help="Query, build and write out the resource provider trees one "
+            "by one, each as a separate subgraph, instead of building the "
+            "whole graph first. The output starts after the first tree is "
+            "queried and only a single tree is kept in memory. --bulk then "
+            "works per tree.",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--output_dir",
+            metavar="<dir>",
+            help="Write every resource provider tree to a separate "
+            "<root uuid>.dot file in the directory, plus an %s file listing "
+            "the trees. The trees are queried and written one by one."
+            % dot.INDEX_FILE,
+        )
+        parser.add_argument(
+            "--trait",
+            metavar="<trait>",
+            help="Show only the trees having a resource provider with this "
+            "trait. Can be repeated to require more traits. Needs at least "
+            "placement microversion %s." % tree.TRAIT_FILTER_MIN_VERSION,
+            action="append",
+            default=[],
+        )
+        parser.add_argument(
+            "--aggregate",
+            metavar="<uuid>",
+            help="Show only the trees having a resource provider in this "
+            "aggregate. Can be repeated to accept any of the aggregates.",
+            action="append",
+            default=[],
+        )
+        parser.add_argument(
+            "--min_free",
+            metavar="<resource class>=<amount>",
+            help="Show only the trees having a resource provider that can "
+            "fit the given amount of the resource class. Can be repeated.",
+            action="append",
+            default=[],
+        )
+        parser.add_argument(
+            "--resource_class",
+            metavar="<resource class>",
+            help="Show only the trees having a resource provider with an "
+            "inventory of this resource class. Can be repeated. Placement "
+            "cannot filter on this so it is checked by querying the "
+            "inventories of the providers matching the other filters.",
+            action="append",
+            default=[],
+        )
+        parser.add_argument(
+            "--summary",
+            help="Group the structurally identical resource provider trees, "
+            "having the same child layout, traits and resource classes, and "
+            "show only one tree of every group together with the number of "
+            "trees, the consumers and the summed up capacity and usage of "
+            "the group. The consumers themselves are not shown.",
+            action="store_true",
+        )
+        _add_format_argument(parser)
+        _add_heatmap_argument(parser)
+        _add_profile_arguments(parser)
         return parser
 
     def take_action(self, parsed_args):
-        http = self.app.client_manager.placement_tree
-        client = ClientAdapter(http)
+        if parsed_args.summary and (
+            parsed_args.output_dir or parsed_args.stream or parsed_args.heatmap
+        ):
+            raise ValueError(
+                "--summary cannot be used together with --output_dir, "
+                "--stream or --heatmap"
+            )
+        if parsed_args.output_dir and parsed_args.format != "dot":
+            raise ValueError("--output_dir only supports the dot format")
+        if parsed_args.stream and parsed_args.format not in ("dot", "ndjson"):
+            raise ValueError(
+                "--stream only supports the dot and ndjson formats"
+            )
 
-        graph = tree.make_rp_trees(client, drop_fields=DROP_DATA_FIELDS)
+        with _profile(parsed_args):
+            http = self.app.client_manager.placement_tree
+            http.configure_connection_pool(parsed_args.parallel)
+            bulk = _use_bulk_mode(http, parsed_args)
+            client = _get_client(http, parsed_args)
+            filter_client = _get_filter_client(http, client, parsed_args)
 
-        if parsed_args.show_consumers:
-            tree.extend_rp_graph_with_consumers(client, graph)
+            rp_snapshot = _load_snapshot(parsed_args)
+            if parsed_args.output_dir:
+                self._write_output_dir(
+                    client, filter_client, bulk, rp_snapshot, parsed_args
+                )
+            elif parsed_args.stream:
+                self._write_stream(
+                    client, filter_client, bulk, rp_snapshot, parsed_args
+                )
+            else:
+                self._write_stdout(
+                    client, filter_client, bulk, rp_snapshot, parsed_args
+                )
+            _save_snapshot(rp_snapshot, parsed_args)
+            _save_cache(client)
+            _report_request_count(http)
 
-        print(
-            dot.graph_to_dot(
-                graph, field_filter=_get_field_filter(parsed_args)
+    def _write_stdout(
+        self, client, filter_client, bulk, rp_snapshot, parsed_args
+    ):
+        graph = tree.make_rp_trees(
+            client,
+            drop_fields=DROP_DATA_FIELDS,
+            parallel=parsed_args.parallel,
+            bulk=bulk,
+            snapshot=rp_snapshot,
+            endpoints=_get_rp_data_endpoints(parsed_args),
+            rp_filter=_get_rp_filter(parsed_args),
+            filter_client=filter_client,
+        )
+
+        if parsed_args.show_consumers:
+            tree.extend_rp_graph_with_consumers(
+                client,
+                graph,
+                parallel=parsed_args.parallel,
+                consumer_details=not parsed_args.hide_consumer_details,
             )
+
+        if parsed_args.summary:
+            with profiling.phase("summary"):
+                graph = summary.make_summary_graph(graph)
+
+        _write_graph(
+            graph, parsed_args, processes=parsed_args.render_processes
+        )
+
+    def _write_stream(
+        self, client, filter_client, bulk, rp_snapshot, parsed_args
+    ):
+        trees = _iter_rp_trees(
+            client, filter_client, bulk, rp_snapshot, parsed_args
+        )
+        field_filter = _get_field_filter(parsed_args)
+        if parsed_args.format == "ndjson":
+            for _, graph in trees:
+                with profiling.phase("render"):
+                    export.write_ndjson(
+                        graph, sys.stdout, field_filter=field_filter
+                    )
+            return
+
+        dot.write_dot_trees(trees, sys.stdout, field_filter=field_filter)
+        # keep the trailing new line the output had when it was printed
+        sys.stdout.write("\n")
+
+    def _write_output_dir(
+        self, client, filter_client, bulk, rp_snapshot, parsed_args
+    ):
+        index = dot.write_dot_files(
+            _iter_rp_trees(
+                client, filter_client, bulk, rp_snapshot, parsed_args
+            ),
+            parsed_args.output_dir,
+            field_filter=_get_field_filter(parsed_args),
+        )
+        LOG.info(
+            "%d trees were written to %s", len(index), parsed_args.output_dir
         )
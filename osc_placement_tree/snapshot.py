@@ -0,0 +1,79 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+import copy
+
+from osc_placement_tree import cache
+
+# The fields of an RP that are reused from the snapshot if the generation of
+# the RP is unchanged. The usages are always queried again as removing an
+# allocation from an RP does not change its generation.
+_REUSED_ENDPOINTS = ("inventories", "traits", "aggregates")
+
+
+class Snapshot(object):
+    """The RP data collected by a previous run"""
+
+    def __init__(self, rps=None):
+        """Create a Snapshot
+
+        :param rps: a dict of RP uuid -> RP data as extended by the tree
+                    module
+        """
+        self._rps = rps or {}
+
+    @classmethod
+    def load(cls, path):
+        """Loads the snapshot from a file, or returns an empty snapshot
+
+        :param path: the file created by save()
+        """
+        data = cache.load_json(path, {})
+        return cls(data.get("resource_providers"))
+
+    def save(self, path):
+        cache.save_json(path, {"resource_providers": self._rps})
+
+    def get_rp_data(self, rp):
+        """Returns the reusable data of the RP if its generation is unchanged
+
+        :param rp: an RP from a /resource_providers response
+        :returns: a dict of endpoint -> response of the endpoint in the same
+                  format as the tree module queries them, or None if the RP
+                  is not in the snapshot or its generation is changed.
+        """
+        known_rp = self._rps.get(rp["uuid"])
+        if not known_rp or known_rp.get("generation") != rp.get("generation"):
+            return None
+        # a run showing only some of the fields does not query every endpoint
+        if any(endpoint not in known_rp for endpoint in _REUSED_ENDPOINTS):
+            return None
+
+        # the real responses carry the generation of the RP too and it is
+        # merged into the RP data like the rest of the response
+        generation = known_rp.get(
+            "resource_provider_generation", known_rp.get("generation")
+        )
+        rp_data = {}
+        for endpoint in _REUSED_ENDPOINTS:
+            rp_data[endpoint] = {
+                endpoint: copy.deepcopy(known_rp[endpoint]),
+                "resource_provider_generation": generation,
+            }
+        return rp_data
+
+    def update(self, rps):
+        """Stores the data of the RPs in the snapshot
+
+        :param rps: a list of RPs extended by the tree module
+        """
+        for rp in rps:
+            self._rps[rp["uuid"]] = copy.deepcopy(rp)
@@ -0,0 +1,179 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Summarizes the structurally identical RP trees of the graph
+
+Two trees are identical if their RPs have the same traits and resource
+classes and the RPs have identical child subtrees. The names, uuids,
+aggregates and the amounts of the inventories are not compared so e.g. the
+computes of the same hardware model form one group.
+
+Only one representative tree of each group is kept in the summary graph. Its
+root shows the number of trees in the group and the summed up capacity and
+usage of every RP of the group.
+"""
+import collections
+
+from osc_placement_tree import graph as graph_module
+from osc_placement_tree import heatmap
+from osc_placement_tree import html
+
+
+def _format_amount(amount):
+    # the capacity is a float due to the allocation ratio
+    if amount == int(amount):
+        return "%d" % amount
+    return "%.1f" % amount
+
+
+def _get_totals_html(totals):
+    return "<BR/>".join(
+        "%s: %s / %s used"
+        % (rc, _format_amount(used), _format_amount(capacity))
+        for rc, (used, capacity) in sorted(totals.items())
+    )
+
+
+class SummaryRpNode(graph_module.RpNode):
+    """The root of the representative tree of a group of identical trees"""
+
+    __slots__ = ("tree_count", "consumer_count", "totals")
+
+    def __init__(self, data, tree_count, consumer_count, totals):
+        """Create a SummaryRpNode
+
+        :param data: the root RP of the representative tree as in the RpNode
+        :param tree_count: the number of trees in the group
+        :param consumer_count: the number of consumers allocating from the
+                               trees of the group
+        :param totals: a dict of resource class -> (used, capacity) summed up
+                       over every RP of the group
+        """
+        super(SummaryRpNode, self).__init__(data)
+        self.tree_count = tree_count
+        self.consumer_count = consumer_count
+        self.totals = totals
+
+    def add_to_dot(self, dot, field_filter):
+        header = ["%d trees like this" % self.tree_count]
+        if self.consumer_count:
+            header.append("%d consumers" % self.consumer_count)
+        if self.totals:
+            header.append(_get_totals_html(self.totals))
+        dot.node(
+            self.id(),
+            "<%s>"
+            % html._get_html_dict(
+                self.data, field_filter, header="<BR/>".join(header)
+            ),
+        )
+
+    def to_record(self, field_filter):
+        record = super(SummaryRpNode, self).to_record(field_filter)
+        record["summary"] = {
+            "trees": self.tree_count,
+            "consumers": self.consumer_count,
+            "used": {rc: used for rc, (used, _) in self.totals.items()},
+            "capacity": {
+                rc: capacity for rc, (_, capacity) in self.totals.items()
+            },
+        }
+        return record
+
+
+def make_summary_graph(graph):
+    """Returns a graph with one representative of the identical RP trees
+
+    :param graph: a graph of RP trees and optionally consumers
+    :returns: a new Graph object containing the first tree of every group of
+              identical trees in the order of their roots in the input
+              graph. The root of every kept tree is a SummaryRpNode. The
+              consumers are not included, only counted.
+    """
+    children, order, root_of = graph.get_rp_trees()
+    roots = [node for node in order if root_of[node.id()] == node.id()]
+
+    # The signatures are numbered so a parent is identified by the small
+    # numbers of its child subtrees instead of nesting their signatures
+    signature_ids = {}
+    subtree_ids = {}
+    for node in reversed(order):
+        signature = (
+            tuple(sorted(node.data.get("traits", []))),
+            tuple(sorted(node.data.get("inventories", {}))),
+            tuple(
+                sorted(
+                    subtree_ids[child.id()] for child in children[node.id()]
+                )
+            ),
+        )
+        subtree_ids[node.id()] = signature_ids.setdefault(
+            signature, len(signature_ids)
+        )
+
+    # signature id of the root -> the roots of the identical trees
+    groups = collections.OrderedDict()
+    for root in roots:
+        groups.setdefault(subtree_ids[root.id()], []).append(root)
+    group_of = {
+        root.id(): roots_in_group[0].id()
+        for roots_in_group in groups.values()
+        for root in roots_in_group
+    }
+
+    # the root of the representative -> resource class -> [used, capacity]
+    totals = collections.defaultdict(
+        lambda: collections.defaultdict(lambda: [0, 0])
+    )
+    for node in order:
+        group_totals = totals[group_of[root_of[node.id()]]]
+        for rc, inventory in node.data.get("inventories", {}).items():
+            group_totals[rc][0] += inventory.get("used", 0)
+            group_totals[rc][1] += heatmap.get_capacity(inventory)
+
+    # the root of the representative -> the consumers of the group
+    consumers = collections.defaultdict(set)
+    for edge in graph.edges:
+        if isinstance(edge, graph_module.AllocationEdge):
+            group = group_of[root_of[edge.node2.id()]]
+            consumers[group].add(edge.node1.id())
+
+    new_nodes = {}
+    for roots_in_group in groups.values():
+        root = roots_in_group[0]
+        new_nodes[root.id()] = SummaryRpNode(
+            root.data,
+            len(roots_in_group),
+            len(consumers[root.id()]),
+            {
+                rc: tuple(used_capacity)
+                for rc, used_capacity in totals[root.id()].items()
+            },
+        )
+
+    def is_kept(node):
+        return (
+            isinstance(node, graph_module.RpNode)
+            and group_of[root_of[node.id()]] == root_of[node.id()]
+        )
+
+    nodes = [
+        new_nodes.get(node.id(), node) for node in graph.nodes if is_kept(node)
+    ]
+    edges = [
+        graph_module.ParentEdge(
+            new_nodes.get(edge.node1.id(), edge.node1),
+            new_nodes.get(edge.node2.id(), edge.node2),
+        )
+        for edge in graph.edges
+        if isinstance(edge, graph_module.ParentEdge) and is_kept(edge.node1)
+    ]
+    return graph_module.Graph(nodes, edges)
@@ -0,0 +1,207 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+import os
+
+import fixtures
+import mock
+
+from osc_placement_tree import cache
+from osc_placement_tree.tests import base
+from osc_placement_tree.tests import uuids
+
+RP = str(uuids.rp1)
+LIST_URL = "/resource_providers"
+INVENTORIES_URL = "/resource_providers/%s/inventories" % RP
+USAGES_URL = "/resource_providers/%s/usages" % RP
+
+
+class TestCachingClient(base.TestBase):
+    def setUp(self):
+        super(TestCachingClient, self).setUp()
+        self.path = os.path.join(
+            self.useFixture(fixtures.TempDir()).path, "cache.json"
+        )
+        self.generation = 1
+        self.now = 1000.0
+        self.useFixture(
+            fixtures.MockPatch(
+                "osc_placement_tree.cache.time.time", side_effect=self._now
+            )
+        )
+        self.placement = mock.Mock()
+        self.placement.get.side_effect = self._get
+
+    def _now(self):
+        return self.now
+
+    def _get(self, url):
+        if url == LIST_URL:
+            return {
+                "resource_providers": [
+                    {"uuid": RP, "generation": self.generation}
+                ]
+            }
+        return {"resource_provider_generation": self.generation, "foo": {}}
+
+    def _new_client(self):
+        return cache.CachingClient(self.placement, self.path, ttl=10)
+
+    def test_responses_reused_within_ttl(self):
+        client = self._new_client()
+        client.get(LIST_URL)
+        client.get(USAGES_URL)
+
+        self.now += 5
+        client.get(LIST_URL)
+        client.get(USAGES_URL)
+        self.assertEqual(2, self.placement.get.call_count)
+
+        self.now += 10
+        client.get(LIST_URL)
+        client.get(USAGES_URL)
+        self.assertEqual(4, self.placement.get.call_count)
+
+    def test_rp_data_reused_while_generation_unchanged(self):
+        client = self._new_client()
+        client.get(LIST_URL)
+        client.get(INVENTORIES_URL)
+
+        # after the ttl the listing is refreshed but the inventories are
+        # still valid as the generation is the same
+        self.now += 60
+        client.get(LIST_URL)
+        client.get(INVENTORIES_URL)
+        self.assertEqual(
+            [
+                mock.call(LIST_URL),
+                mock.call(INVENTORIES_URL),
+                mock.call(LIST_URL),
+            ],
+            self.placement.get.mock_calls,
+        )
+
+        # the generation changed so the inventories are fetched again
+        self.now += 60
+        self.generation += 1
+        client.get(LIST_URL)
+        client.get(INVENTORIES_URL)
+        self.assertEqual(5, self.placement.get.call_count)
+        self.assertEqual(
+            mock.call(INVENTORIES_URL), self.placement.get.mock_calls[-1]
+        )
+
+    def test_cache_persisted(self):
+        client = self._new_client()
+        client.get(LIST_URL)
+        client.get(INVENTORIES_URL)
+        client.save()
+
+        client = self._new_client()
+        self.now += 5
+        result = client.get(INVENTORIES_URL)
+
+        self.assertEqual(2, self.placement.get.call_count)
+        self.assertEqual(
+            {"resource_provider_generation": 1, "foo": {}}, result
+        )
+
+    def test_cached_response_is_copied(self):
+        client = self._new_client()
+        client.get(USAGES_URL)["foo"]["bar"] = 42
+
+        self.assertEqual({}, client.get(USAGES_URL)["foo"])
+
+    def test_missing_or_broken_cache_file(self):
+        with open(self.path, "w") as f:
+            f.write("not json")
+
+        client = self._new_client()
+        client.get(USAGES_URL)
+
+        self.assertEqual(1, self.placement.get.call_count)
+
+
+class TestNameIndex(base.TestBase):
+    def setUp(self):
+        super(TestNameIndex, self).setUp()
+        self.path = os.path.join(
+            self.useFixture(fixtures.TempDir()).path, "names.json"
+        )
+
+    def test_persisted(self):
+        index = cache.NameIndex(self.path)
+        self.assertIsNone(index.get("host1"))
+        index.set("host1", RP)
+        index.save()
+
+        index = cache.NameIndex(self.path)
+
+        self.assertEqual(RP, index.get("host1"))
+
+    def test_invalidate(self):
+        index = cache.NameIndex(self.path)
+        index.set("host1", RP)
+        index.save()
+
+        index = cache.NameIndex(self.path)
+        index.invalidate("host1")
+        index.save()
+
+        self.assertIsNone(cache.NameIndex(self.path).get("host1"))
+
+    def test_unchanged_index_not_saved(self):
+        index = cache.NameIndex(self.path)
+        index.invalidate("host1")
+        index.save()
+
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_save_failure_ignored(self):
+        # the cache directory cannot be created under a regular file
+        with open(self.path, "w") as f:
+            f.write("{}")
+        index = cache.NameIndex(os.path.join(self.path, "names.json"))
+        index.set("host1", RP)
+
+        with mock.patch.object(cache.LOG, "warning") as mock_warning:
+            index.save()
+
+        self.assertTrue(mock_warning.called)
+        self.assertEqual(RP, index.get("host1"))
+
+
+class TestSaveJson(base.TestBase):
+    def setUp(self):
+        super(TestSaveJson, self).setUp()
+        self.dir = self.useFixture(fixtures.TempDir()).path
+
+    def test_directory_created_concurrently(self):
+        path = os.path.join(self.dir, "cache", "data.json")
+        real_makedirs = os.makedirs
+
+        def makedirs(directory):
+            # another run creates the directory first
+            real_makedirs(directory)
+            real_makedirs(directory)
+
+        with mock.patch("os.makedirs", side_effect=makedirs):
+            cache.save_json(path, {"a": 1})
+
+        self.assertEqual({"a": 1}, cache.load_json(path, None))
+
+    def test_tmp_file_removed_on_failure(self):
+        path = os.path.join(self.dir, "data.json")
+
+        with mock.patch("os.rename", side_effect=OSError("boom")):
+            self.assertRaises(OSError, cache.save_json, path, {"a": 1})
+
+        self.assertEqual([], os.listdir(self.dir))
@@ -0,0 +1,71 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+import threading
+import time
+
+from osc_placement_tree import concurrency
+from osc_placement_tree.tests import base
+
+
+class TestConcurrency(base.TestBase):
+    def test_serial_pool_runs_in_the_calling_thread(self):
+        threads = []
+
+        def task(item):
+            threads.append(threading.current_thread())
+            return item * 2
+
+        with concurrency.get_pool(1) as pool:
+            result = pool.map(task, [1, 2, 3])
+
+        self.assertEqual([2, 4, 6], result)
+        self.assertEqual([threading.current_thread()] * 3, threads)
+
+    def test_thread_pool_keeps_the_input_order(self):
+        def task(item):
+            # make the first items finish last
+            time.sleep(0.01 * (5 - item))
+            return item
+
+        with concurrency.get_pool(5) as pool:
+            result = pool.map(task, range(5))
+
+        self.assertEqual([0, 1, 2, 3, 4], result)
+
+    def test_thread_pool_limits_concurrency(self):
+        lock = threading.Lock()
+        running = [0]
+        max_running = [0]
+
+        def task(item):
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+        with concurrency.get_pool(3) as pool:
+            pool.map(task, range(20))
+
+        self.assertLessEqual(max_running[0], 3)
+
+    def test_thread_pool_reraises_task_failure(self):
+        def task(item):
+            if item == 2:
+                raise ValueError("task %d failed" % item)
+            return item
+
+        with concurrency.get_pool(4) as pool:
+            exc = self.assertRaises(ValueError, pool.map, task, range(5))
+
+        self.assertEqual("task 2 failed", str(exc))
@@ -9,10 +9,19 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 # under the License.
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+
+import fixtures
+import graphviz
 import mock
 
 from osc_placement_tree import dot
 from osc_placement_tree import graph
+from osc_placement_tree import html
 from osc_placement_tree.tests import base
 
 
@@ -86,3 +95,260 @@ class TestDot(base.TestBase):
             ],
             mock_get_html_key_value.mock_calls,
         )
+
+    def _make_graph(self):
+        child = graph.RpNode(
+            {
+                "uuid": "2",
+                "name": "child",
+                "inventories": {"VCPU": {"total": 8, "used": 2}},
+            }
+        )
+        root = graph.RpNode({"uuid": "1", "name": "root", "traits": ["T"]})
+        consumer = graph.ConsumerNode(
+            {
+                "consumer_uuid": "3",
+                "project_id": "p",
+                "allocations": {"2": {"resources": {"VCPU": 2}}},
+            }
+        )
+        return graph.Graph(
+            nodes=[root, child, consumer],
+            edges=[
+                graph.ParentEdge(node1=child, node2=root),
+                graph.AllocationEdge(node1=consumer, node2=child),
+            ],
+        )
+
+    def test_write_dot_same_as_graph_to_dot(self):
+        g = self._make_graph()
+        filter = lambda name: name != "traits"
+        out = io.StringIO()
+
+        dot.write_dot(g, out, field_filter=filter)
+
+        self.assertEqual(
+            dot.graph_to_dot(g, field_filter=filter), out.getvalue()
+        )
+
+    def test_write_dot_writes_every_statement_separately(self):
+        g = self._make_graph()
+        out = mock.Mock()
+
+        dot.write_dot(g, out)
+
+        written = [call[1][0] for call in out.write.mock_calls]
+        self.assertEqual(dot.graph_to_dot(g), "".join(written))
+        # header, 3 nodes, 2 edges and the tail at least
+        self.assertGreaterEqual(len(written), 1 + 3 + 2 + 1)
+
+    def test_write_dot_in_processes(self):
+        g = self._make_graph()
+        # a second, independent tree
+        other_root = graph.RpNode({"uuid": "11", "name": "other"})
+        g.add_nodes([other_root])
+        filter = html.FieldFilter(exclude=["traits"])
+        serial = io.StringIO()
+        dot.write_dot(g, serial, field_filter=filter)
+        # every node is a separate chunk
+        self.useFixture(
+            fixtures.MockPatch(
+                "osc_placement_tree.dot._MIN_NODES_PER_CHUNK", 1
+            )
+        )
+        mock_pool = self.useFixture(
+            fixtures.MockPatch(
+                "multiprocessing.Pool", wraps=multiprocessing.Pool
+            )
+        ).mock
+
+        out = io.StringIO()
+        dot.write_dot(g, out, field_filter=filter, processes=2)
+
+        mock_pool.assert_called_once()
+        self.assertEqual(serial.getvalue(), out.getvalue())
+
+    @mock.patch("multiprocessing.Pool")
+    def test_write_dot_in_processes_small_graph(self, mock_pool):
+        g = self._make_graph()
+        out = io.StringIO()
+
+        dot.write_dot(g, out, processes=2)
+
+        # a single chunk is formatted without a pool
+        mock_pool.assert_not_called()
+        self.assertEqual(dot.graph_to_dot(g), out.getvalue())
+
+    def test_write_dot_files(self):
+        out_dir = self.useFixture(fixtures.TempDir()).path
+        g1 = self._make_graph()
+        g2 = graph.Graph(
+            nodes=[graph.RpNode({"uuid": "11", "name": "other"})], edges=[]
+        )
+
+        index = dot.write_dot_files(
+            iter([("1", g1), ("11", g2)]), os.path.join(out_dir, "trees")
+        )
+
+        self.assertEqual(
+            [
+                {
+                    "root_provider_uuid": "1",
+                    "name": "root",
+                    "file": "1.dot",
+                    "resource_providers": 2,
+                    "consumers": 1,
+                },
+                {
+                    "root_provider_uuid": "11",
+                    "name": "other",
+                    "file": "11.dot",
+                    "resource_providers": 1,
+                    "consumers": 0,
+                },
+            ],
+            index,
+        )
+        with io.open(os.path.join(out_dir, "trees", "index.json")) as f:
+            self.assertEqual({"trees": index}, json.load(f))
+        for root_uuid, g in (("1", g1), ("11", g2)):
+            with io.open(
+                os.path.join(out_dir, "trees", root_uuid + ".dot")
+            ) as f:
+                self.assertEqual(dot.graph_to_dot(g), f.read())
+
+    def test_write_dot_trees(self):
+        g1 = self._make_graph()
+        g2 = graph.Graph(
+            nodes=[graph.RpNode({"uuid": "11", "name": "other"})], edges=[]
+        )
+        out = io.StringIO()
+
+        def trees():
+            yield "1", g1
+            # the first tree is written before the second is produced
+            self.assertIn("subgraph tree_1 {", out.getvalue())
+            self.assertIn("\t}\n", out.getvalue())
+            yield "11", g2
+
+        dot.write_dot_trees(trees(), out)
+
+        expected = dot._make_digraph()
+        for root_uuid, g in (("1", g1), ("11", g2)):
+            subgraph = graphviz.Digraph(name="tree_" + root_uuid)
+            g.add_to_dot(subgraph, lambda _: True)
+            expected.subgraph(subgraph)
+        self.assertEqual(expected.source, out.getvalue())
+
+
+class TestRender(base.TestBase):
+    def setUp(self):
+        super(TestRender, self).setUp()
+        self.cache_dir = os.path.join(
+            self.useFixture(fixtures.TempDir()).path, "renders"
+        )
+        self.mock_pipe = self.useFixture(
+            fixtures.MockPatch("graphviz.Source.pipe")
+        ).mock
+        self.mock_pipe.side_effect = (
+            lambda format: b"<" + format.encode() + b">"
+        )
+
+    def test_render_without_cache(self):
+        self.assertEqual(b"<svg>", dot.render("digraph {}", "svg"))
+        self.assertEqual(b"<svg>", dot.render("digraph {}", "svg"))
+
+        self.assertEqual(2, self.mock_pipe.call_count)
+
+    def test_render_reuses_the_output_of_the_same_source(self):
+        for _ in range(2):
+            self.assertEqual(
+                b"<svg>",
+                dot.render("digraph {}", "svg", cache_dir=self.cache_dir),
+            )
+        self.assertEqual(1, self.mock_pipe.call_count)
+
+        # a different source or format needs a new layout
+        dot.render("digraph { a }", "svg", cache_dir=self.cache_dir)
+        self.assertEqual(
+            b"<png>", dot.render("digraph {}", "png", cache_dir=self.cache_dir)
+        )
+        self.assertEqual(3, self.mock_pipe.call_count)
+
+    @mock.patch("osc_placement_tree.dot._RENDER_CACHE_SIZE", new=2)
+    def test_render_cache_keeps_the_recently_used_outputs(self):
+        def path(source):
+            digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+            return os.path.join(self.cache_dir, digest + ".svg")
+
+        for i in range(2):
+            dot.render("digraph { %d }" % i, "svg", cache_dir=self.cache_dir)
+            os.utime(path("digraph { %d }" % i), (i, i))
+
+        dot.render("digraph { 2 }", "svg", cache_dir=self.cache_dir)
+
+        self.assertEqual(
+            sorted([path("digraph { 1 }"), path("digraph { 2 }")]),
+            sorted(
+                os.path.join(self.cache_dir, name)
+                for name in os.listdir(self.cache_dir)
+            ),
+        )
+
+    @mock.patch("osc_placement_tree.dot._RENDER_CACHE_SIZE", new=1)
+    def test_render_cache_pruned_concurrently(self):
+        dot.render("digraph { 0 }", "svg", cache_dir=self.cache_dir)
+        real_remove = os.remove
+
+        def remove(path):
+            # another run removes the same output first
+            real_remove(path)
+            real_remove(path)
+
+        with mock.patch("os.remove", side_effect=remove):
+            self.assertEqual(
+                b"<svg>",
+                dot.render("digraph { 1 }", "svg", cache_dir=self.cache_dir),
+            )
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
+
+    def test_render_cache_output_removed_while_pruning(self):
+        dot.render("digraph { 0 }", "svg", cache_dir=self.cache_dir)
+        real_getmtime = os.path.getmtime
+
+        def getmtime(path):
+            # another run removes the output before its mtime is read
+            os.remove(path)
+            return real_getmtime(path)
+
+        with mock.patch("os.path.getmtime", side_effect=getmtime):
+            self.assertEqual(
+                b"<svg>",
+                dot.render("digraph { 1 }", "svg", cache_dir=self.cache_dir),
+            )
+
+    def test_render_output_returned_if_cache_unusable(self):
+        # the cache directory cannot be created under a regular file
+        with open(os.path.join(os.path.dirname(self.cache_dir), "f"), "w"):
+            pass
+        cache_dir = os.path.join(os.path.dirname(self.cache_dir), "f", "r")
+
+        with mock.patch.object(dot.LOG, "warning") as mock_warning:
+            self.assertEqual(
+                b"<svg>", dot.render("digraph {}", "svg", cache_dir=cache_dir)
+            )
+
+        self.assertTrue(mock_warning.called)
+
+    def test_render_cache_dir_created_concurrently(self):
+        real_makedirs = os.makedirs
+
+        def makedirs(directory):
+            # another run creates the directory first
+            real_makedirs(directory)
+            real_makedirs(directory)
+
+        with mock.patch("os.makedirs", side_effect=makedirs):
+            dot.render("digraph {}", "svg", cache_dir=self.cache_dir)
+
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
@@ -0,0 +1,121 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+import io
+import json
+
+from osc_placement_tree import export
+from osc_placement_tree import graph
+from osc_placement_tree import html
+from osc_placement_tree.tests import base
+
+
+class TestExport(base.TestBase):
+    def setUp(self):
+        super(TestExport, self).setUp()
+        root = graph.RpNode(
+            {"uuid": "1", "name": "root", "generation": 3, "traits": ["T"]}
+        )
+        child = graph.RpNode(
+            {
+                "uuid": "2",
+                "name": "child",
+                "inventories": {
+                    "VCPU": {"total": 8, "used": 2, "max_unit": 8}
+                },
+            }
+        )
+        consumer = graph.ConsumerNode(
+            {
+                "consumer_uuid": "3",
+                "generation": 1,
+                "allocations": {"2": {"resources": {"VCPU": 2}}},
+            }
+        )
+        self.graph = graph.Graph(
+            nodes=[root, child, consumer],
+            edges=[
+                graph.ParentEdge(node1=child, node2=root),
+                graph.AllocationEdge(node1=consumer, node2=child),
+            ],
+        )
+        self.field_filter = html.FieldFilter(
+            exclude=["generation", "max_unit"]
+        )
+        self.expected_records = [
+            {
+                "type": "resource_provider",
+                "id": "1",
+                "data": {"uuid": "1", "name": "root", "traits": ["T"]},
+            },
+            {
+                "type": "resource_provider",
+                "id": "2",
+                "data": {
+                    "uuid": "2",
+                    "name": "child",
+                    "inventories": {"VCPU": {"total": 8, "used": 2}},
+                },
+            },
+            # the filter only applies to the RPs like in the dot output
+            {
+                "type": "consumer",
+                "id": "3",
+                "data": {"consumer_uuid": "3", "generation": 1},
+            },
+            {"type": "parent", "parent": "1", "child": "2"},
+            {
+                "type": "allocation",
+                "consumer": "3",
+                "resource_provider": "2",
+                "resources": {"VCPU": 2},
+            },
+        ]
+
+    def test_iter_records(self):
+        self.assertEqual(
+            self.expected_records,
+            list(export.iter_records(self.graph, self.field_filter)),
+        )
+
+    def test_write_json(self):
+        out = io.StringIO()
+
+        export.write_json(self.graph, out, self.field_filter)
+
+        self.assertEqual(
+            {
+                "nodes": self.expected_records[:3],
+                "edges": self.expected_records[3:],
+            },
+            json.loads(out.getvalue()),
+        )
+
+    def test_write_json_empty_graph(self):
+        out = io.StringIO()
+
+        export.write_json(graph.Graph(nodes=[], edges=[]), out)
+
+        self.assertEqual(
+            {"nodes": [], "edges": []}, json.loads(out.getvalue())
+        )
+
+    def test_write_ndjson(self):
+        out = io.StringIO()
+
+        export.write_ndjson(self.graph, out, self.field_filter)
+
+        lines = out.getvalue().split("\n")
+        # every record is on its own line terminated by a new line
+        self.assertEqual("", lines.pop())
+        self.assertEqual(
+            self.expected_records, [json.loads(line) for line in lines]
+        )
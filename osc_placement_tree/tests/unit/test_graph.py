@@ -0,0 +1,126 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+import mock
+
+from osc_placement_tree import graph
+from osc_placement_tree.tests import base
+
+
+class TestGraph(base.TestBase):
+    def test_get_node_by_id(self):
+        rp = graph.RpNode({"uuid": "1"})
+        consumer = graph.ConsumerNode(
+            {"consumer_uuid": "2", "allocations": {"1": {}}}
+        )
+        g = graph.Graph(nodes=[rp, consumer], edges=[])
+
+        self.assertIs(rp, g.get_node_by_id("1"))
+        self.assertIs(consumer, g.get_node_by_id("2"))
+        self.assertRaises(ValueError, g.get_node_by_id, "3")
+
+    def test_add_nodes_updates_the_indexes(self):
+        root = graph.RpNode({"uuid": "1"})
+        g = graph.Graph(nodes=[root], edges=[])
+        child = graph.RpNode({"uuid": "2"})
+        consumer = graph.ConsumerNode(
+            {"consumer_uuid": "3", "allocations": {"2": {}}}
+        )
+
+        g.add_nodes([consumer, child])
+
+        self.assertEqual([root, consumer, child], g.nodes)
+        self.assertEqual([root, child], g.rp_nodes)
+        self.assertEqual([consumer], g.consumer_nodes)
+        self.assertIs(child, g.get_node_by_id("2"))
+        self.assertIs(consumer, g.get_node_by_id("3"))
+
+    def test_nodes_and_edges_have_no_instance_dict(self):
+        rp = graph.RpNode({"uuid": "1"})
+        consumer = graph.ConsumerNode(
+            {"consumer_uuid": "2", "allocations": {"1": {}}}
+        )
+
+        for obj in (
+            rp,
+            consumer,
+            graph.ParentEdge(rp, rp),
+            graph.AllocationEdge(consumer, rp),
+        ):
+            self.assertFalse(hasattr(obj, "__dict__"))
+
+    def test_get_rp_trees(self):
+        root1 = graph.RpNode({"uuid": "1"})
+        child = graph.RpNode({"uuid": "2"})
+        grandchild = graph.RpNode({"uuid": "3"})
+        root2 = graph.RpNode({"uuid": "4"})
+        consumer = graph.ConsumerNode(
+            {"consumer_uuid": "5", "allocations": {"3": {}}}
+        )
+        g = graph.Graph(
+            nodes=[grandchild, child, root1, consumer, root2],
+            edges=[
+                graph.ParentEdge(grandchild, child),
+                graph.ParentEdge(child, root1),
+                graph.AllocationEdge(consumer, grandchild),
+            ],
+        )
+
+        children, order, root_of = g.get_rp_trees()
+
+        self.assertEqual([child], children["1"])
+        self.assertEqual([grandchild], children["2"])
+        self.assertEqual([], children["4"])
+        self.assertEqual([root1, root2, child, grandchild], order)
+        self.assertEqual({"1": "1", "2": "1", "3": "1", "4": "4"}, root_of)
+
+
+class TestConsumerNode(base.TestBase):
+    def test_allocations_kept_separately(self):
+        data = {
+            "consumer_uuid": "3",
+            "project_id": "p",
+            "allocations": {
+                "1": {"generation": 3, "resources": {"VCPU": 2}},
+                "2": {"generation": 7, "resources": {"DISK_GB": 10}},
+            },
+        }
+
+        consumer = graph.ConsumerNode(data)
+
+        self.assertEqual(
+            {"consumer_uuid": "3", "project_id": "p"}, consumer.data
+        )
+        self.assertEqual(
+            {"1": {"VCPU": 2}, "2": {"DISK_GB": 10}}, consumer.allocations
+        )
+        # the input is not modified
+        self.assertIn("allocations", data)
+
+    @mock.patch("osc_placement_tree.html._get_attr_html")
+    def test_rendered_without_copying_the_data(self, mock_get_attr_html):
+        consumer = graph.ConsumerNode(
+            {
+                "consumer_uuid": "3",
+                "allocations": {
+                    str(i): {"resources": {"VCPU": 1}} for i in range(100)
+                },
+            }
+        )
+        dot = mock.Mock()
+
+        consumer.add_to_dot(dot, mock.sentinel.field_filter)
+        consumer.add_to_dot(dot, mock.sentinel.field_filter)
+
+        for call in mock_get_attr_html.mock_calls:
+            self.assertIs(consumer.data, call[1][0])
+            # the same filter object is used so html can memoize per filter
+            self.assertIs(graph._show_every_field, call[1][1])
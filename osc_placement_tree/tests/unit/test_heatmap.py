@@ -0,0 +1,178 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+from osc_placement_tree import dot
+from osc_placement_tree import export
+from osc_placement_tree import graph
+from osc_placement_tree import heatmap
+from osc_placement_tree.tests import base
+
+
+def _inventory(total, used, reserved=0, allocation_ratio=1.0):
+    return {
+        "total": total,
+        "used": used,
+        "reserved": reserved,
+        "allocation_ratio": allocation_ratio,
+    }
+
+
+class TestUtilization(base.TestBase):
+    def test_get_utilization(self):
+        self.assertIsNone(heatmap.get_utilization({}))
+        self.assertEqual(
+            0.5, heatmap.get_utilization({"VCPU": _inventory(8, 4)})
+        )
+        # (10 - 2) * 2.0 = 16 can be allocated
+        self.assertEqual(
+            0.25,
+            heatmap.get_utilization(
+                {"VCPU": _inventory(10, 4, reserved=2, allocation_ratio=2.0)}
+            ),
+        )
+        # the highest utilization of the resource classes
+        self.assertEqual(
+            0.75,
+            heatmap.get_utilization(
+                {
+                    "VCPU": _inventory(8, 2),
+                    "MEMORY_MB": _inventory(1024, 768),
+                }
+            ),
+        )
+        self.assertEqual(
+            1.0, heatmap.get_utilization({"VCPU": _inventory(4, 1, 4)})
+        )
+
+    def test_get_color(self):
+        self.assertEqual(heatmap.IDLE_COLOR, heatmap.get_color(0.0))
+        self.assertEqual("#ffff7f", heatmap.get_color(0.5))
+        self.assertEqual("#ff7f7f", heatmap.get_color(1.0))
+        self.assertEqual("#ff7f7f", heatmap.get_color(1.5))
+
+
+class TestMakeHeatmapGraph(base.TestBase):
+    def _make_graph(self):
+        #       root
+        #      /    \
+        #   numa0  numa1
+        #    |       |
+        #   pf0     pf1
+        #   / \
+        # vf0 vf1
+        def rp(uuid, **inventories):
+            return graph.RpNode(
+                {"uuid": uuid, "name": uuid, "inventories": inventories}
+            )
+
+        self.root = rp("root", VCPU=_inventory(8, 2))
+        self.numa0 = rp("numa0", PCPU=_inventory(4, 0))
+        self.numa1 = rp("numa1", PCPU=_inventory(4, 0))
+        self.pf0 = rp("pf0")
+        self.pf1 = rp("pf1")
+        self.vf0 = rp("vf0", SRIOV_NET_VF=_inventory(1, 1))
+        self.vf1 = rp("vf1", SRIOV_NET_VF=_inventory(1, 0))
+        self.consumer = graph.ConsumerNode(
+            {
+                "consumer_uuid": "c",
+                "allocations": {
+                    "root": {"resources": {"VCPU": 2}},
+                    "vf0": {"resources": {"SRIOV_NET_VF": 1}},
+                },
+            }
+        )
+        nodes = [
+            self.root,
+            self.numa0,
+            self.numa1,
+            self.pf0,
+            self.pf1,
+            self.vf0,
+            self.vf1,
+            self.consumer,
+        ]
+        edges = [
+            graph.ParentEdge(self.numa0, self.root),
+            graph.ParentEdge(self.numa1, self.root),
+            graph.ParentEdge(self.pf0, self.numa0),
+            graph.ParentEdge(self.pf1, self.numa1),
+            graph.ParentEdge(self.vf0, self.pf0),
+            graph.ParentEdge(self.vf1, self.pf0),
+            graph.AllocationEdge(self.consumer, self.root),
+            graph.AllocationEdge(self.consumer, self.vf0),
+        ]
+        return graph.Graph(nodes, edges)
+
+    def test_idle_subtrees_collapsed(self):
+        g = heatmap.make_heatmap_graph(self._make_graph())
+
+        # numa1 and pf1 are collapsed, vf1 is idle alone so it is kept
+        self.assertEqual(
+            ["root", "numa0", "numa1", "pf0", "vf0", "vf1", "c"],
+            [node.id() for node in g.nodes],
+        )
+        numa1 = g.get_node_by_id("numa1")
+        self.assertIsInstance(numa1, heatmap.IdleSubtreeNode)
+        self.assertEqual(
+            {
+                "uuid": "numa1",
+                "name": "numa1",
+                "idle providers": 2,
+                "capacity": {"PCPU": 4.0},
+            },
+            numa1.data,
+        )
+        self.assertEqual(
+            [
+                ("numa0", "root"),
+                ("numa1", "root"),
+                ("pf0", "numa0"),
+                ("vf0", "pf0"),
+                ("vf1", "pf0"),
+                ("c", "root"),
+                ("c", "vf0"),
+            ],
+            [(e.node1.id(), e.node2.id()) for e in g.edges],
+        )
+        # the edges point to the new nodes
+        self.assertIs(numa1, g.edges[1].node1)
+        self.assertIs(self.consumer, g.get_node_by_id("c"))
+
+    def test_utilization_precomputed(self):
+        g = heatmap.make_heatmap_graph(self._make_graph())
+
+        root = g.get_node_by_id("root")
+        self.assertEqual(0.25, root.utilization)
+        # VCPU 2/8, PCPU 0/8, SRIOV_NET_VF 1/2
+        self.assertEqual(0.5, root.tree_utilization)
+        self.assertEqual(1.0, g.get_node_by_id("vf0").utilization)
+        self.assertIsNone(g.get_node_by_id("pf0").utilization)
+        self.assertIsNone(g.get_node_by_id("pf0").tree_utilization)
+
+    def test_to_dot(self):
+        g = heatmap.make_heatmap_graph(self._make_graph())
+
+        source = dot.graph_to_dot(g)
+
+        self.assertIn("tree utilization 50%<BR/>utilization 25%", source)
+        self.assertIn('fillcolor="%s"' % heatmap.get_color(0.25), source)
+        self.assertIn('fillcolor="%s"' % heatmap.IDLE_COLOR, source)
+
+    def test_to_records(self):
+        g = heatmap.make_heatmap_graph(self._make_graph())
+
+        records = {
+            record.get("id"): record for record in export.iter_records(g)
+        }
+
+        self.assertEqual(0.25, records["root"]["utilization"])
+        self.assertEqual(0.5, records["root"]["tree_utilization"])
+        self.assertEqual("idle_subtree", records["numa1"]["type"])
@@ -9,6 +9,8 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 # under the License.
+import pickle
+
 import mock
 
 from osc_placement_tree import html
@@ -32,3 +34,67 @@ class TestHtml(base.TestBase):
             ],
             mock_get_html_key_value.mock_calls,
         )
+
+    def test_get_html_dict(self):
+        a_dict = {"b": ["x", "y"], "a": {"c": 1}, "hidden": 2, "e": []}
+        filter = lambda name: name != "hidden"
+
+        result = html._get_html_dict(a_dict, filter, header="head")
+
+        table_start = (
+            '<TABLE BORDER="0" CELLBORDER="1" CELLSPACING="0" '
+            'CELLPADDING="4">\n'
+        )
+        header = (
+            '<TR BORDER="0" CELLBORDER="0">'
+            '<TD ALIGN="LEFT" BALIGN="LEFT" BORDER="0">head</TD></TR>\n'
+        )
+
+        def row(key, value):
+            td = '<TD  ALIGN="LEFT" BALIGN="LEFT">'
+            return "<TR>%s%s</TD>%s%s</TD></TR>\n" % (td, key, td, value)
+
+        inner_table = table_start + row("c", 1) + "</TABLE>\n"
+        self.assertEqual(
+            table_start
+            + header
+            + row("a", inner_table)
+            + row("b", "x<BR/>y")
+            + row("e", "[]")
+            + "</TABLE>\n",
+            result,
+        )
+
+    def test_get_html_dict_filters_the_same_keys_once(self):
+        filter = mock.Mock(side_effect=lambda name: name != "hidden")
+
+        for i in range(3):
+            result = html._get_html_dict({"b": i, "hidden": i, "a": i}, filter)
+            self.assertIn(">%d<" % i, result)
+            self.assertNotIn("hidden", result)
+
+        # the filtered keys are reused for dicts with the same keys
+        self.assertEqual(3, filter.call_count)
+
+
+class TestFieldFilter(base.TestBase):
+    def test_include(self):
+        f = html.FieldFilter(include=["foo"], exclude=["foo"])
+
+        self.assertTrue(f("foo"))
+        self.assertFalse(f("bar"))
+
+    def test_exclude(self):
+        f = html.FieldFilter(exclude=["foo"])
+
+        self.assertFalse(f("foo"))
+        self.assertTrue(f("bar"))
+
+    def test_equal_after_pickling(self):
+        f = html.FieldFilter(exclude=["foo", "bar"])
+
+        unpickled = pickle.loads(pickle.dumps(f, pickle.HIGHEST_PROTOCOL))
+
+        self.assertEqual(f, unpickled)
+        self.assertEqual(hash(f), hash(unpickled))
+        self.assertNotEqual(f, html.FieldFilter(include=["foo", "bar"]))
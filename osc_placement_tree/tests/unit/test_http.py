@@ -0,0 +1,144 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+import keystoneauth1.session as ks_session
+import mock
+import requests
+
+from osc_placement_tree import http
+from osc_placement_tree import profiling
+from osc_placement_tree.tests import base
+
+
+class TestSessionClient(base.TestBase):
+    def setUp(self):
+        super(TestSessionClient, self).setUp()
+        self.session = mock.Mock()
+        self.session.get_endpoint.return_value = "http://placement/"
+        self.client = http.SessionClient(
+            self.session, {"service_type": "placement"}, api_version="1.14"
+        )
+
+    def test_request_sets_headers_and_counts(self):
+        self.client.request("GET", "/resource_providers")
+        self.client.request("GET", "/traits", version="1.6")
+
+        self.assertEqual(
+            [
+                mock.call(
+                    "http://placement/resource_providers",
+                    "GET",
+                    headers={
+                        "OpenStack-API-Version": "placement 1.14",
+                        "Accept": "application/json",
+                        "Accept-Encoding": "gzip, deflate",
+                    },
+                ),
+                mock.call(
+                    "http://placement/traits",
+                    "GET",
+                    headers={
+                        "OpenStack-API-Version": "placement 1.6",
+                        "Accept": "application/json",
+                        "Accept-Encoding": "gzip, deflate",
+                    },
+                ),
+            ],
+            self.session.request.mock_calls,
+        )
+        self.assertEqual(2, self.client.request_count)
+        # the endpoint is only looked up once
+        self.session.get_endpoint.assert_called_once_with(
+            service_type="placement"
+        )
+
+    def test_request_without_compression(self):
+        self.client.compression = False
+
+        self.client.request("GET", "/resource_providers")
+
+        self.assertEqual(
+            "identity",
+            self.session.request.call_args[1]["headers"]["Accept-Encoding"],
+        )
+
+    def test_request_without_endpoint_uses_endpoint_filter(self):
+        self.session.get_endpoint.return_value = None
+
+        self.client.request("GET", "/resource_providers")
+
+        self.session.request.assert_called_once_with(
+            "/resource_providers",
+            "GET",
+            headers=mock.ANY,
+            endpoint_filter={"service_type": "placement"},
+        )
+
+    def test_request_recorded_by_the_profiler(self):
+        profiler = profiling.Profiler()
+        profiling.enable(profiler)
+        self.addCleanup(profiling.disable)
+        self.session.request.return_value.content = b"{}"
+
+        self.client.request("GET", "/resource_providers")
+
+        stats = profiler.to_dict()["requests"]["GET /resource_providers"]
+        self.assertEqual(1, stats["count"])
+        self.assertEqual(2, stats["bytes"])
+
+    def test_configure_connection_pool(self):
+        self.session.session = requests.Session()
+
+        self.client.configure_connection_pool(20)
+
+        for prefix in ("https://", "http://"):
+            adapter = self.session.session.get_adapter(prefix + "placement")
+            self.assertIsInstance(adapter, ks_session.TCPKeepAliveAdapter)
+            self.assertEqual(20, adapter._pool_maxsize)
+            self.assertTrue(adapter._pool_block)
+
+    def test_connection_stats(self):
+        self.session.session = requests.Session()
+        self.client.configure_connection_pool(2)
+        adapter = self.session.session.get_adapter("http://placement")
+        pool = adapter.poolmanager.connection_from_url("http://placement")
+        pool.num_connections = 2
+        pool.num_requests = 10
+
+        self.assertEqual(
+            {"opened": 2, "reused": 8}, self.client.connection_stats()
+        )
+
+    def test_use_max_version(self):
+        self.session.request.return_value.json.return_value = {
+            "versions": [{"min_version": "1.0", "max_version": "1.30"}]
+        }
+
+        self.assertTrue(self.client.use_max_version("1.18"))
+        self.assertEqual("1.30", self.client.api_version)
+
+    def test_use_max_version_not_supported(self):
+        self.session.request.return_value.json.return_value = {
+            "versions": [{"min_version": "1.0", "max_version": "1.9"}]
+        }
+
+        self.assertFalse(self.client.use_max_version("1.18"))
+        self.assertEqual("1.14", self.client.api_version)
+
+    def test_supports_version(self):
+        self.session.request.return_value.json.return_value = {
+            "versions": [{"min_version": "1.0", "max_version": "1.18"}]
+        }
+
+        self.assertTrue(self.client.supports_version("1.18"))
+        self.assertFalse(self.client.supports_version("1.19"))
+        # the microversion of the client is not changed
+        self.assertEqual("1.14", self.client.api_version)
@@ -0,0 +1,102 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+import mock
+import six
+
+from osc_placement_tree import profiling
+from osc_placement_tree.tests import base
+from osc_placement_tree.tests import uuids
+
+
+class TestProfiler(base.TestBase):
+    def setUp(self):
+        super(TestProfiler, self).setUp()
+        self.profiler = profiling.Profiler()
+        profiling.enable(self.profiler)
+        self.addCleanup(profiling.disable)
+
+    def test_requests_grouped_per_endpoint(self):
+        profiling.record_request(
+            "GET", "/resource_providers/%s/inventories" % uuids.rp1, 0.002, 10
+        )
+        profiling.record_request(
+            "GET", "/resource_providers/%s/inventories" % uuids.rp2, 0.2, 30
+        )
+        profiling.record_request(
+            "GET", "/resource_providers?in_tree=%s" % uuids.rp1, 2, 100
+        )
+
+        requests = self.profiler.to_dict()["requests"]
+
+        self.assertEqual(
+            [
+                "GET /resource_providers/{uuid}/inventories",
+                "GET /resource_providers?in_tree=*",
+            ],
+            list(requests),
+        )
+        inventories = requests["GET /resource_providers/{uuid}/inventories"]
+        self.assertEqual(2, inventories["count"])
+        self.assertAlmostEqual(0.202, inventories["seconds"])
+        self.assertEqual(0.2, inventories["max_seconds"])
+        self.assertEqual(40, inventories["bytes"])
+        self.assertEqual(
+            [1, 0, 0, 1, 0, 0, 0],
+            list(inventories["latency_histogram"].values()),
+        )
+        self.assertEqual(
+            [0, 0, 0, 0, 0, 0, 1],
+            list(
+                requests["GET /resource_providers?in_tree=*"][
+                    "latency_histogram"
+                ].values()
+            ),
+        )
+
+    @mock.patch("time.time")
+    def test_phases_summed_up(self, mock_time):
+        mock_time.side_effect = [0, 1, 10, 12.5]
+
+        with profiling.phase("build graph"):
+            pass
+        with profiling.phase("build graph"):
+            pass
+
+        self.assertEqual(
+            {"build graph": 3.5}, self.profiler.to_dict()["phases"]
+        )
+
+    def test_report(self):
+        profiling.record_request("GET", "/traits", 0.5, 2048)
+        self.profiler.record_phase("render", 1.25)
+        out = six.StringIO()
+
+        self.profiler.report(out)
+
+        lines = out.getvalue().splitlines()
+        self.assertIn("GET /traits", lines[1])
+        self.assertIn("500.0", lines[1])
+        self.assertIn("2.0", lines[1])
+        self.assertIn("0/0/0/0/0/1/0", lines[1])
+        self.assertIn("render", lines[-1])
+        self.assertIn("1.250", lines[-1])
+
+    def test_disabled(self):
+        profiling.disable()
+
+        profiling.record_request("GET", "/traits", 0.5, 2048)
+        with profiling.phase("render"):
+            pass
+
+        self.assertEqual(
+            {"requests": {}, "phases": {}}, self.profiler.to_dict()
+        )
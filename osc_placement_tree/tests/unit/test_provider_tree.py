@@ -9,11 +9,20 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 # under the License.
+import os
+
+import fixtures
 import mock
 
+from osc_placement_tree import cache
+from osc_placement_tree import dot
+from osc_placement_tree import graph
 from osc_placement_tree.resources import provider_tree
 from osc_placement_tree.tests import base
 
+RP_UUID = "abdc6d98-c2a3-4364-9656-562cfbbb0f3f"
+OLD_RP_UUID = "0b3c5d4e-6c1b-4d0f-9e3a-8c7f2a1b9d00"
+
 
 class TestProviderTree(base.TestBase):
     def test_get_field_filter_no_user_input(self):
@@ -38,6 +47,179 @@ class TestProviderTree(base.TestBase):
         self.assertTrue(f("generation"))
         self.assertFalse(f("resource_provider_generation"))
 
+    def test_get_rp_data_endpoints_summary_with_restrictive_fields(self):
+        parsed_args = mock.Mock(
+            fields="name,uuid", heatmap=False, summary=True
+        )
+
+        endpoints = provider_tree._get_rp_data_endpoints(parsed_args)
+
+        self.assertEqual(
+            ["inventories", "traits", "usages"], sorted(endpoints)
+        )
+
+    @mock.patch("osc_placement_tree.resources.provider_tree._write_graph")
+    def test_list_summary_with_restrictive_fields(self, mock_write_graph):
+        rp_url = "/resource_providers/%s/" % RP_UUID
+        responses = {
+            "/resource_providers": {
+                "resource_providers": [
+                    {
+                        "uuid": RP_UUID,
+                        "name": "compute",
+                        "parent_provider_uuid": None,
+                        "root_provider_uuid": RP_UUID,
+                        "links": [],
+                    }
+                ]
+            },
+            rp_url + "inventories": {"inventories": {"VCPU": {"total": 8}}},
+            rp_url + "traits": {"traits": ["T1"]},
+            rp_url + "usages": {"usages": {"VCPU": 2}},
+        }
+        client = mock.Mock()
+        client.get.side_effect = lambda url: responses[url]
+        parsed_args = mock.Mock(
+            fields="name,uuid",
+            heatmap=False,
+            summary=True,
+            show_consumers=False,
+            parallel=1,
+            trait=[],
+            aggregate=[],
+            min_free=[],
+            resource_class=[],
+        )
+
+        provider_tree.ListProviderTree(mock.Mock(), mock.Mock())._write_stdout(
+            client, client, False, None, parsed_args
+        )
+
+        root = mock_write_graph.call_args[0][0].get_node_by_id(RP_UUID)
+        self.assertEqual({"VCPU": (2, 8.0)}, root.totals)
+        self.assertEqual(["T1"], root.data["traits"])
+
+    def test_get_rp_data_endpoints_heatmap_with_restrictive_fields(self):
+        parsed_args = mock.Mock(
+            fields="name,uuid", heatmap=True, summary=False
+        )
+
+        endpoints = provider_tree._get_rp_data_endpoints(parsed_args)
+
+        self.assertEqual(["inventories", "usages"], sorted(endpoints))
+
+    def test_get_rp_filter(self):
+        parsed_args = mock.Mock(
+            trait=["T1"],
+            aggregate=[],
+            min_free=["VGPU=2", "VCPU=1"],
+            resource_class=["VGPU"],
+        )
+
+        rp_filter = provider_tree._get_rp_filter(parsed_args)
+
+        self.assertEqual(["T1"], rp_filter.traits)
+        self.assertEqual({"VGPU": 2, "VCPU": 1}, rp_filter.min_free)
+        self.assertEqual(["VGPU"], rp_filter.resource_classes)
+
+    @mock.patch("osc_placement_tree.resources.provider_tree._write_graph")
+    @mock.patch("osc_placement_tree.resources.provider_tree._make_rp_tree")
+    def test_show_unusable_cache_dir(self, mock_make_rp_tree, mock_write):
+        # the cache directory cannot be created under a regular file
+        cache_home = os.path.join(
+            self.useFixture(fixtures.TempDir()).path, "file"
+        )
+        with open(cache_home, "w") as f:
+            f.write("")
+        self.useFixture(
+            fixtures.EnvironmentVariable("XDG_CACHE_HOME", cache_home)
+        )
+        calls = mock.Mock()
+        calls.attach_mock(mock_make_rp_tree, "make_rp_tree")
+        calls.attach_mock(mock_write, "write_graph")
+
+        def make_rp_tree(client, name_index, *args):
+            name_index.set("compute-0", RP_UUID)
+            return graph.Graph([], [])
+
+        mock_make_rp_tree.side_effect = make_rp_tree
+        app = mock.Mock()
+        app.client_manager.placement_tree.get_endpoint.return_value = (
+            "http://p"
+        )
+        parsed_args = mock.Mock(
+            depth=None,
+            parallel=1,
+            bulk=False,
+            cache=False,
+            since_snapshot=None,
+            show_consumers=False,
+            profile=False,
+            profile_json=None,
+        )
+
+        provider_tree.ShowProviderTree(app, mock.Mock()).take_action(
+            parsed_args
+        )
+
+        # the tree is still written
+        self.assertEqual(
+            ["make_rp_tree", "write_graph"],
+            [name for name, _, _ in calls.mock_calls],
+        )
+
+    def test_get_filter_client(self):
+        http = mock.Mock()
+        http.supports_version.return_value = True
+        client = mock.Mock()
+
+        self.assertIs(
+            client,
+            provider_tree._get_filter_client(
+                http, client, mock.Mock(trait=[])
+            ),
+        )
+
+        filter_client = provider_tree._get_filter_client(
+            http, client, mock.Mock(trait=["T1"])
+        )
+        filter_client.get("/resource_providers?required=T1")
+
+        http.supports_version.assert_called_once_with("1.18")
+        # only the filter query is sent with the higher microversion
+        http.request.assert_called_once_with(
+            "GET", "/resource_providers?required=T1", version="1.18"
+        )
+        self.assertFalse(http.use_max_version.called)
+
+    def test_get_filter_client_trait_not_supported(self):
+        http = mock.Mock()
+        http.supports_version.return_value = False
+
+        self.assertRaises(
+            ValueError,
+            provider_tree._get_filter_client,
+            http,
+            mock.Mock(),
+            mock.Mock(trait=["T1"]),
+        )
+
+    def test_get_rp_filter_no_filter(self):
+        parsed_args = mock.Mock(
+            trait=[], aggregate=[], min_free=[], resource_class=[]
+        )
+
+        self.assertIsNone(provider_tree._get_rp_filter(parsed_args))
+
+    def test_get_rp_filter_invalid_min_free(self):
+        parsed_args = mock.Mock(
+            trait=[], aggregate=[], min_free=["VGPU"], resource_class=[]
+        )
+
+        self.assertRaises(
+            ValueError, provider_tree._get_rp_filter, parsed_args
+        )
+
     def test_get_uuid_form_name_or_uuid_with_uuid(self):
         client = mock.Mock()
         uuid = "abdc6d98-c2a3-4364-9656-562cfbbb0f3f"
@@ -50,28 +232,119 @@ class TestProviderTree(base.TestBase):
     def test_get_uuid_form_name_or_uuid_with_name(self):
         client = mock.Mock()
         uuid = "abdc6d98-c2a3-4364-9656-562cfbbb0f3f"
-        name = "devstack"
+        name = "devstack 1"
         client.get.return_value = {
-            "resource_providers": [
-                {"name": name, "uuid": uuid},
-                {"name": "another", "uuid": "another-uuid"},
-            ]
+            "resource_providers": [{"name": name, "uuid": uuid}]
         }
 
         result = provider_tree._get_uuid_form_name_or_uuid(client, name)
 
         self.assertEqual(uuid, result)
-        client.get.assert_called_once_with("/resource_providers")
+        client.get.assert_called_once_with(
+            "/resource_providers?name=devstack+1"
+        )
 
     def test_get_uuid_form_name_or_uuid_with_name_not_exists(self):
         client = mock.Mock()
         name = "devstack"
+        client.get.return_value = {"resource_providers": []}
+
+        self.assertRaises(
+            ValueError, provider_tree._get_uuid_form_name_or_uuid, client, name
+        )
+
+        client.get.assert_called_once_with("/resource_providers?name=devstack")
+
+    def test_get_uuid_form_name_or_uuid_uses_the_name_index(self):
+        name_index = cache.NameIndex(
+            os.path.join(self.useFixture(fixtures.TempDir()).path, "n.json")
+        )
+        client = mock.Mock()
+        client.get.return_value = {
+            "resource_providers": [{"name": "devstack", "uuid": RP_UUID}]
+        }
+
+        for _ in range(2):
+            result = provider_tree._get_uuid_form_name_or_uuid(
+                client, "devstack", name_index
+            )
+            self.assertEqual(RP_UUID, result)
+
+        client.get.assert_called_once_with("/resource_providers?name=devstack")
+        self.assertEqual(RP_UUID, name_index.get("devstack"))
+
+    @mock.patch("osc_placement_tree.tree.make_rp_tree")
+    def test_make_rp_tree_stale_name_index(self, mock_make_rp_tree):
+        name_index = cache.NameIndex(
+            os.path.join(self.useFixture(fixtures.TempDir()).path, "n.json")
+        )
+        # the provider is renamed, another one took its name
+        name_index.set("devstack", OLD_RP_UUID)
+        parsed_args = mock.Mock(uuid_or_name="devstack", fields="")
+        client = mock.Mock()
         client.get.return_value = {
-            "resource_providers": [{"name": "another", "uuid": "another-uuid"}]
+            "resource_providers": [{"name": "devstack", "uuid": RP_UUID}]
         }
+        old_tree = graph.Graph(
+            nodes=[graph.RpNode({"uuid": OLD_RP_UUID, "name": "renamed"})],
+            edges=[],
+        )
+        new_tree = graph.Graph(
+            nodes=[graph.RpNode({"uuid": RP_UUID, "name": "devstack"})],
+            edges=[],
+        )
+        mock_make_rp_tree.side_effect = [old_tree, new_tree]
+
+        result = provider_tree._make_rp_tree(
+            client, name_index, False, None, parsed_args
+        )
+
+        self.assertIs(new_tree, result)
+        self.assertEqual(
+            [OLD_RP_UUID, RP_UUID],
+            [call[1][1] for call in mock_make_rp_tree.mock_calls],
+        )
+        self.assertEqual(RP_UUID, name_index.get("devstack"))
+
+    @mock.patch("osc_placement_tree.tree.make_rp_tree")
+    def test_make_rp_tree_deleted_rp_in_name_index(self, mock_make_rp_tree):
+        name_index = cache.NameIndex(
+            os.path.join(self.useFixture(fixtures.TempDir()).path, "n.json")
+        )
+        name_index.set("devstack", OLD_RP_UUID)
+        parsed_args = mock.Mock(uuid_or_name="devstack", fields="")
+        client = mock.Mock()
+        client.get.return_value = {"resource_providers": []}
+        mock_make_rp_tree.side_effect = ValueError()
 
         self.assertRaises(
-            ValueError, provider_tree._get_uuid_form_name_or_uuid, client, name
+            ValueError,
+            provider_tree._make_rp_tree,
+            client,
+            name_index,
+            False,
+            None,
+            parsed_args,
         )
 
-        client.get.assert_called_once_with("/resource_providers")
+        mock_make_rp_tree.assert_called_once()
+        self.assertIsNone(name_index.get("devstack"))
+
+    @mock.patch("osc_placement_tree.dot.render")
+    def test_write_graph_rendered(self, mock_render):
+        self.useFixture(
+            fixtures.EnvironmentVariable("XDG_CACHE_HOME", "/cache")
+        )
+        parsed_args = mock.Mock(fields="", format="svg", heatmap=False)
+        g = graph.Graph(nodes=[graph.RpNode({"uuid": "1"})], edges=[])
+        mock_render.return_value = b"<svg/>"
+        mock_stdout = self.useFixture(fixtures.MockPatch("sys.stdout")).mock
+
+        provider_tree._write_graph(g, parsed_args)
+
+        mock_render.assert_called_once_with(
+            dot.graph_to_dot(g, provider_tree._get_field_filter(parsed_args)),
+            "svg",
+            cache_dir="/cache/osc-placement-tree/renders",
+        )
+        mock_stdout.buffer.write.assert_called_once_with(b"<svg/>")
@@ -0,0 +1,77 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+import os
+
+import fixtures
+
+from osc_placement_tree import snapshot
+from osc_placement_tree.tests import base
+
+RP = {
+    "uuid": "1",
+    "generation": 2,
+    "inventories": {"rc1": {"total": 1, "used": 0}},
+    "traits": ["T"],
+    "aggregates": ["agg"],
+}
+
+
+class TestSnapshot(base.TestBase):
+    def test_get_rp_data(self):
+        s = snapshot.Snapshot()
+        s.update([RP])
+
+        self.assertEqual(
+            {
+                "inventories": {
+                    "inventories": RP["inventories"],
+                    "resource_provider_generation": 2,
+                },
+                "traits": {"traits": ["T"], "resource_provider_generation": 2},
+                "aggregates": {
+                    "aggregates": ["agg"],
+                    "resource_provider_generation": 2,
+                },
+            },
+            s.get_rp_data({"uuid": "1", "generation": 2}),
+        )
+        self.assertIsNone(s.get_rp_data({"uuid": "1", "generation": 3}))
+        self.assertIsNone(s.get_rp_data({"uuid": "2", "generation": 2}))
+
+    def test_get_rp_data_partial_data_not_reused(self):
+        # stored by a run that only showed the traits
+        s = snapshot.Snapshot()
+        s.update([{"uuid": "1", "generation": 2, "traits": ["T"]}])
+
+        self.assertIsNone(s.get_rp_data({"uuid": "1", "generation": 2}))
+
+    def test_save_and_load(self):
+        path = os.path.join(
+            self.useFixture(fixtures.TempDir()).path, "snapshot.json"
+        )
+        s = snapshot.Snapshot()
+        s.update([RP])
+        s.save(path)
+
+        loaded = snapshot.Snapshot.load(path)
+
+        self.assertEqual(
+            ["T"],
+            loaded.get_rp_data({"uuid": "1", "generation": 2})["traits"][
+                "traits"
+            ],
+        )
+
+    def test_load_missing_file(self):
+        s = snapshot.Snapshot.load("/nonexistent/snapshot.json")
+
+        self.assertIsNone(s.get_rp_data({"uuid": "1", "generation": 2}))
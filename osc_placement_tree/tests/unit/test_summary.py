@@ -0,0 +1,120 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+from osc_placement_tree import dot
+from osc_placement_tree import export
+from osc_placement_tree import graph
+from osc_placement_tree import summary
+from osc_placement_tree.tests import base
+
+
+def _rp(uuid, traits=(), **totals):
+    return graph.RpNode(
+        {
+            "uuid": uuid,
+            "name": "name-" + uuid,
+            "traits": list(traits),
+            "aggregates": [uuid],
+            "inventories": {
+                rc: {"total": total, "used": 1, "allocation_ratio": 2.0}
+                for rc, total in totals.items()
+            },
+        }
+    )
+
+
+class TestMakeSummaryGraph(base.TestBase):
+    def _add_compute(self, nodes, edges, uuid, vcpus, numa_traits):
+        compute = _rp(uuid, ["T1"], VCPU=vcpus)
+        nodes.append(compute)
+        for i, traits in enumerate(numa_traits):
+            numa = _rp("%s-numa%d" % (uuid, i), traits, PCPU=4)
+            nodes.append(numa)
+            edges.append(graph.ParentEdge(numa, compute))
+        return compute
+
+    def _make_graph(self):
+        nodes = []
+        edges = []
+        # 1 and 3 are identical even if their sizes and the order of their
+        # children are different
+        compute1 = self._add_compute(
+            nodes, edges, "1", 8, [["HW_NUMA_ROOT"], []]
+        )
+        self._add_compute(nodes, edges, "2", 8, [["HW_NUMA_ROOT"]])
+        compute3 = self._add_compute(
+            nodes, edges, "3", 16, [[], ["HW_NUMA_ROOT"]]
+        )
+        consumer1 = graph.ConsumerNode(
+            {"consumer_uuid": "c1", "allocations": {"1": {}}}
+        )
+        consumer3 = graph.ConsumerNode(
+            {"consumer_uuid": "c3", "allocations": {"3": {}}}
+        )
+        nodes.extend([consumer1, consumer3])
+        edges.extend(
+            [
+                graph.AllocationEdge(consumer1, compute1),
+                graph.AllocationEdge(consumer3, compute3),
+            ]
+        )
+        return graph.Graph(nodes, edges)
+
+    def test_identical_trees_grouped(self):
+        g = summary.make_summary_graph(self._make_graph())
+
+        self.assertEqual(
+            ["1", "1-numa0", "1-numa1", "2", "2-numa0"],
+            [node.id() for node in g.nodes],
+        )
+        self.assertEqual(
+            [("1-numa0", "1"), ("1-numa1", "1"), ("2-numa0", "2")],
+            [(e.node1.id(), e.node2.id()) for e in g.edges],
+        )
+        root1 = g.get_node_by_id("1")
+        self.assertIsInstance(root1, summary.SummaryRpNode)
+        self.assertIs(root1, g.edges[0].node2)
+        self.assertEqual(2, root1.tree_count)
+        self.assertEqual(2, root1.consumer_count)
+        # 2 computes and 4 NUMA nodes with allocation ratio 2.0
+        self.assertEqual({"VCPU": (2, 48.0), "PCPU": (4, 32.0)}, root1.totals)
+        root2 = g.get_node_by_id("2")
+        self.assertEqual(1, root2.tree_count)
+        self.assertEqual(0, root2.consumer_count)
+
+    def test_to_dot(self):
+        g = summary.make_summary_graph(self._make_graph())
+
+        source = dot.graph_to_dot(g)
+
+        self.assertIn(
+            "2 trees like this<BR/>2 consumers<BR/>"
+            "PCPU: 4 / 32 used<BR/>VCPU: 2 / 48 used",
+            source,
+        )
+        self.assertNotIn("c1", source)
+
+    def test_to_records(self):
+        g = summary.make_summary_graph(self._make_graph())
+
+        records = {
+            record.get("id"): record for record in export.iter_records(g)
+        }
+
+        self.assertEqual(
+            {
+                "trees": 2,
+                "consumers": 2,
+                "used": {"VCPU": 2, "PCPU": 4},
+                "capacity": {"VCPU": 48.0, "PCPU": 32.0},
+            },
+            records["1"]["summary"],
+        )
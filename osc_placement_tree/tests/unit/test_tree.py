@@ -11,9 +11,11 @@
 # under the License.
 
 import mock
+import osc_lib.exceptions as exceptions
 from oslotest import base
 
 from osc_placement_tree import graph
+from osc_placement_tree import snapshot
 from osc_placement_tree.tests import uuids
 from osc_placement_tree import tree
 
@@ -274,6 +276,237 @@ class TestTree(base.BaseTestCase):
             )
         self.assertEqual(1 + 6 * 4, mock_client.get.call_count)
 
+    def _get_multi_level_tree_client(self):
+        #        A
+        #       / \
+        #      C   D
+        #     /   / \
+        #    E   F   G
+        rps = [
+            (uuids.root_rp_A, None),
+            (uuids.child_rp_C, uuids.root_rp_A),
+            (uuids.child_rp_D, uuids.root_rp_A),
+            (uuids.grandchild_rp_E, uuids.child_rp_C),
+            (uuids.grandchild_rp_F, uuids.child_rp_D),
+            (uuids.grandchild_rp_G, uuids.child_rp_D),
+        ]
+        mock_client = mock.Mock()
+        mock_client.get.side_effect = lambda url: (
+            {
+                "resource_providers": [
+                    {"uuid": uuid, "parent_provider_uuid": parent}
+                    for uuid, parent in rps
+                ]
+            }
+            if "?in_tree=" in url
+            else {"traits": []}
+        )
+        return mock_client
+
+    def test_make_rp_tree_subtree(self):
+        mock_client = self._get_multi_level_tree_client()
+
+        graph = tree.make_rp_tree(
+            mock_client, uuids.child_rp_D, endpoints=["traits"], subtree=True
+        )
+
+        self.assertEqual(
+            [uuids.child_rp_D, uuids.grandchild_rp_F, uuids.grandchild_rp_G],
+            [node.id() for node in graph.nodes],
+        )
+        # the parent of D is not in the graph
+        self.assertEqual(
+            [
+                (uuids.grandchild_rp_F, uuids.child_rp_D),
+                (uuids.grandchild_rp_G, uuids.child_rp_D),
+            ],
+            [(e.node1.id(), e.node2.id()) for e in graph.edges],
+        )
+        # the in_tree query and the traits of the 3 RPs in the subtree
+        self.assertEqual(1 + 3, mock_client.get.call_count)
+
+    def test_make_rp_tree_depth(self):
+        mock_client = self._get_multi_level_tree_client()
+
+        graph = tree.make_rp_tree(
+            mock_client, uuids.grandchild_rp_E, endpoints=["traits"], depth=1
+        )
+
+        self.assertEqual(
+            [uuids.root_rp_A, uuids.child_rp_C, uuids.child_rp_D],
+            [node.id() for node in graph.nodes],
+        )
+        self.assertEqual(1 + 3, mock_client.get.call_count)
+
+    def test_make_rp_tree_subtree_with_depth(self):
+        mock_client = self._get_multi_level_tree_client()
+
+        graph = tree.make_rp_tree(
+            mock_client,
+            uuids.child_rp_C,
+            endpoints=["traits"],
+            subtree=True,
+            depth=0,
+        )
+
+        self.assertEqual(
+            [uuids.child_rp_C], [node.id() for node in graph.nodes]
+        )
+        self.assertEqual([], graph.edges)
+
+    def test_rp_filter_get_query(self):
+        self.assertEqual("", tree.RpFilter().get_query())
+        self.assertEqual(
+            "required=T1,T2&member_of=in:agg1,agg2&"
+            "resources=DISK_GB:10,VCPU:2",
+            tree.RpFilter(
+                traits=["T1", "T2"],
+                aggregates=["agg1", "agg2"],
+                min_free={"VCPU": 2, "DISK_GB": 10},
+                resource_classes=["VGPU"],
+            ).get_query(),
+        )
+
+    def test_make_rp_trees_filtered(self):
+        # A has a child C, B and D are roots
+        rp_a = {
+            "uuid": uuids.root_rp_A,
+            "root_provider_uuid": uuids.root_rp_A,
+            "parent_provider_uuid": None,
+        }
+        rp_c = {
+            "uuid": uuids.child_rp_C,
+            "root_provider_uuid": uuids.root_rp_A,
+            "parent_provider_uuid": uuids.root_rp_A,
+        }
+        rp_b = {
+            "uuid": uuids.root_rp_B,
+            "root_provider_uuid": uuids.root_rp_B,
+            "parent_provider_uuid": None,
+        }
+        rp_d = {
+            "uuid": uuids.root_rp_D,
+            "root_provider_uuid": uuids.root_rp_D,
+            "parent_provider_uuid": None,
+        }
+        responses = {
+            "/resource_providers?required=T1": {
+                "resource_providers": [rp_c, rp_a, rp_b, rp_d]
+            },
+            "/resource_providers/%s/inventories"
+            % uuids.child_rp_C: {"inventories": {"VGPU": {}}},
+            "/resource_providers/%s/inventories"
+            % uuids.root_rp_A: {"inventories": {}},
+            "/resource_providers/%s/inventories"
+            % uuids.root_rp_B: {"inventories": {}},
+            "/resource_providers/%s/inventories"
+            % uuids.root_rp_D: {"inventories": {"VGPU": {}}},
+            "/resource_providers?in_tree=%s"
+            % uuids.root_rp_A: {"resource_providers": [rp_a, rp_c]},
+            "/resource_providers?in_tree=%s"
+            % uuids.root_rp_D: {"resource_providers": [rp_d]},
+        }
+        mock_client = mock.Mock()
+        mock_client.get.side_effect = lambda url: responses[url]
+
+        graph = tree.make_rp_trees(
+            mock_client,
+            endpoints=[],
+            rp_filter=tree.RpFilter(traits=["T1"], resource_classes=["VGPU"]),
+        )
+
+        # B has no VGPU inventory, A is included as the root of C
+        self.assertEqual(
+            [uuids.root_rp_A, uuids.child_rp_C, uuids.root_rp_D],
+            [node.id() for node in graph.nodes],
+        )
+        self.assertEqual(1, len(graph.edges))
+        self.assertEqual(1 + 4 + 2, mock_client.get.call_count)
+
+        # the trees are queried the same way one by one
+        mock_client.get.reset_mock()
+        trees = list(
+            tree.iter_rp_trees(
+                mock_client,
+                endpoints=[],
+                rp_filter=tree.RpFilter(
+                    traits=["T1"], resource_classes=["VGPU"]
+                ),
+            )
+        )
+
+        self.assertEqual(
+            [uuids.root_rp_A, uuids.root_rp_D],
+            [root_uuid for root_uuid, _ in trees],
+        )
+        self.assertEqual(2, len(trees[0][1].nodes))
+        self.assertEqual(1 + 4 + 2, mock_client.get.call_count)
+
+    def test_make_rp_trees_filtered_reuses_inventories(self):
+        rp_a = {
+            "uuid": uuids.root_rp_A,
+            "root_provider_uuid": uuids.root_rp_A,
+            "parent_provider_uuid": None,
+        }
+        rp_c = {
+            "uuid": uuids.child_rp_C,
+            "root_provider_uuid": uuids.root_rp_A,
+            "parent_provider_uuid": uuids.root_rp_A,
+        }
+        responses = {
+            "/resource_providers/%s/inventories"
+            % uuids.child_rp_C: {"inventories": {"VGPU": {"total": 2}}},
+            "/resource_providers?in_tree=%s"
+            % uuids.root_rp_A: {"resource_providers": [rp_a, rp_c]},
+            "/resource_providers/%s/inventories"
+            % uuids.root_rp_A: {"inventories": {}},
+        }
+        mock_client = mock.Mock()
+        mock_client.get.side_effect = lambda url: responses[url]
+        mock_filter_client = mock.Mock()
+        mock_filter_client.get.return_value = {"resource_providers": [rp_c]}
+
+        for bulk in (False, True):
+            mock_client.get.reset_mock()
+            mock_filter_client.get.reset_mock()
+
+            graph = tree.make_rp_trees(
+                mock_client,
+                bulk=bulk,
+                endpoints=["inventories"],
+                rp_filter=tree.RpFilter(
+                    traits=["T1"], resource_classes=["VGPU"]
+                ),
+                filter_client=mock_filter_client,
+            )
+
+            self.assertEqual(
+                {"VGPU": {"total": 2}},
+                graph.get_node_by_id(uuids.child_rp_C).data["inventories"],
+            )
+            self.assertEqual(
+                {}, graph.get_node_by_id(uuids.root_rp_A).data["inventories"]
+            )
+            # only the filter query is sent via the filter client
+            mock_filter_client.get.assert_called_once_with(
+                "/resource_providers?required=T1"
+            )
+            # the inventories of C are queried once for the filtering
+            self.assertEqual(
+                [
+                    mock.call(
+                        "/resource_providers/%s/inventories" % uuids.child_rp_C
+                    ),
+                    mock.call(
+                        "/resource_providers?in_tree=%s" % uuids.root_rp_A
+                    ),
+                    mock.call(
+                        "/resource_providers/%s/inventories" % uuids.root_rp_A
+                    ),
+                ],
+                mock_client.get.mock_calls,
+            )
+
     def test_make_rp_trees_two_simple_root(self):
         mock_client = mock.Mock()
         mock_client.get.side_effect = [
@@ -330,6 +563,424 @@ class TestTree(base.BaseTestCase):
 
         self.assertEqual(9, mock_client.get.call_count)
 
+    def test_make_rp_trees_parallel(self):
+        rps = [
+            {"uuid": uuids.root_rp_A, "parent_provider_uuid": None},
+            {
+                "uuid": uuids.child_rp_C,
+                "parent_provider_uuid": uuids.root_rp_A,
+            },
+            {"uuid": uuids.root_rp_B, "parent_provider_uuid": None},
+        ]
+        responses = {"/resource_providers": {"resource_providers": rps}}
+        for rp in rps:
+            url = "/resource_providers/%s/" % rp["uuid"]
+            responses[url + "inventories"] = {
+                "inventories": {"rc1": {"total": 10}}
+            }
+            responses[url + "traits"] = {"traits": [rp["uuid"]]}
+            responses[url + "aggregates"] = {"aggregates": []}
+            responses[url + "usages"] = {"usages": {"rc1": 3}}
+        mock_client = mock.Mock()
+        mock_client.get.side_effect = lambda url: responses[url]
+
+        graph = tree.make_rp_trees(mock_client, parallel=4)
+
+        # the order of the nodes follows the order of the RP list regardless
+        # of the order the requests are finished
+        self.assertEqual(
+            [uuids.root_rp_A, uuids.child_rp_C, uuids.root_rp_B],
+            [node.id() for node in graph.nodes],
+        )
+        for node in graph.nodes:
+            # the data of different RPs are not mixed up
+            self.assertEqual([node.id()], node.data["traits"])
+            self.assertEqual(
+                {"rc1": {"total": 10, "used": 3}}, node.data["inventories"]
+            )
+        self.assertEqual(
+            [(uuids.child_rp_C, uuids.root_rp_A)],
+            [(e.node1.id(), e.node2.id()) for e in graph.edges],
+        )
+        self.assertEqual(1 + 3 * 4, mock_client.get.call_count)
+
+    def test_make_rp_trees_parallel_request_fails(self):
+        mock_client = mock.Mock()
+
+        def get(url):
+            if url == "/resource_providers":
+                return {
+                    "resource_providers": [
+                        {"uuid": uuids.root_rp_A, "parent_provider_uuid": None}
+                    ]
+                }
+            if url.endswith("/traits"):
+                raise exceptions.NotFound(404, "No resource provider")
+            return {"inventories": {}, "aggregates": [], "usages": {}}
+
+        mock_client.get.side_effect = get
+
+        self.assertRaises(
+            exceptions.NotFound, tree.make_rp_trees, mock_client, parallel=4
+        )
+
+    def _get_bulk_responses(self, traits):
+        #        A
+        #      / | \
+        #     C  D  E
+        # only the leafs have inventories
+        rps = [
+            {"uuid": uuids.root_rp_A, "parent_provider_uuid": None},
+            {
+                "uuid": uuids.child_rp_C,
+                "parent_provider_uuid": uuids.root_rp_A,
+            },
+            {
+                "uuid": uuids.child_rp_D,
+                "parent_provider_uuid": uuids.root_rp_A,
+            },
+            {
+                "uuid": uuids.child_rp_E,
+                "parent_provider_uuid": uuids.root_rp_A,
+            },
+        ]
+        responses = {
+            "/resource_providers?in_tree=%s"
+            % uuids.root_rp_A: {"resource_providers": rps},
+            "/traits?associated=true": {"traits": sorted(traits)},
+        }
+        for trait, rp_uuids in traits.items():
+            responses[
+                "/resource_providers?required=%s&in_tree=%s"
+                % (trait, uuids.root_rp_A)
+            ] = {"resource_providers": [{"uuid": uuid} for uuid in rp_uuids]}
+        for rp in rps:
+            url = "/resource_providers/%s/" % rp["uuid"]
+            has_inventory = rp["uuid"] != uuids.root_rp_A
+            responses[url + "inventories"] = {
+                "inventories": {"rc1": {"total": 10}} if has_inventory else {}
+            }
+            responses[url + "traits"] = {
+                "traits": sorted(
+                    trait
+                    for trait, rp_uuids in traits.items()
+                    if rp["uuid"] in rp_uuids
+                )
+            }
+            responses[url + "aggregates"] = {"aggregates": []}
+            responses[url + "usages"] = {
+                "usages": {"rc1": 3} if has_inventory else {}
+            }
+        return responses
+
+    def test_make_rp_tree_bulk_queries_traits_in_bulk(self):
+        responses = self._get_bulk_responses(
+            {"T1": [uuids.root_rp_A, uuids.child_rp_C, uuids.child_rp_D]}
+        )
+        mock_client = mock.Mock()
+        mock_client.get.side_effect = lambda url: responses[url]
+
+        graph = tree.make_rp_tree(mock_client, uuids.root_rp_A, bulk=True)
+
+        self.assertEqual(
+            {
+                uuids.root_rp_A: ["T1"],
+                uuids.child_rp_C: ["T1"],
+                uuids.child_rp_D: ["T1"],
+                uuids.child_rp_E: [],
+            },
+            {node.id(): node.data["traits"] for node in graph.nodes},
+        )
+        self.assertEqual({}, graph.nodes[0].data["inventories"])
+        for node in graph.nodes[1:]:
+            self.assertEqual(
+                {"rc1": {"total": 10, "used": 3}}, node.data["inventories"]
+            )
+        # in_tree, 2 trait queries, inventories and aggregates of 4 RPs and
+        # usages of the 3 RPs having inventories
+        self.assertEqual(1 + 2 + 4 * 2 + 3, mock_client.get.call_count)
+        for call in mock_client.get.mock_calls:
+            self.assertFalse(call[1][0].endswith("/traits"))
+        self.assertNotIn(
+            mock.call("/resource_providers/%s/usages" % uuids.root_rp_A),
+            mock_client.get.mock_calls,
+        )
+
+    def test_make_rp_tree_bulk_queries_traits_per_rp(self):
+        # there are more traits than RPs so the traits are queried per RP
+        responses = self._get_bulk_responses(
+            {
+                "T1": [uuids.root_rp_A],
+                "T2": [uuids.child_rp_C],
+                "T3": [uuids.child_rp_D],
+                "T4": [uuids.child_rp_E],
+            }
+        )
+        mock_client = mock.Mock()
+        mock_client.get.side_effect = lambda url: responses[url]
+
+        graph = tree.make_rp_tree(mock_client, uuids.root_rp_A, bulk=True)
+
+        self.assertEqual(
+            {
+                uuids.root_rp_A: ["T1"],
+                uuids.child_rp_C: ["T2"],
+                uuids.child_rp_D: ["T3"],
+                uuids.child_rp_E: ["T4"],
+            },
+            {node.id(): node.data["traits"] for node in graph.nodes},
+        )
+        # in_tree, the associated traits, inventories, aggregates and traits
+        # of 4 RPs and usages of the 3 RPs having inventories
+        self.assertEqual(1 + 1 + 4 * 3 + 3, mock_client.get.call_count)
+
+    def test_make_rp_tree_traits_sorted_in_every_mode(self):
+        responses = self._get_bulk_responses(
+            {
+                "T2": [uuids.root_rp_A, uuids.child_rp_C],
+                "T1": [uuids.root_rp_A, uuids.child_rp_C],
+            }
+        )
+        # neither placement listing is sorted
+        responses["/traits?associated=true"] = {"traits": ["T2", "T1"]}
+        responses["/resource_providers/%s/traits" % uuids.child_rp_C] = {
+            "traits": ["T2", "T1"]
+        }
+        mock_client = mock.Mock()
+        mock_client.get.side_effect = lambda url: responses[url]
+
+        graphs = [
+            tree.make_rp_tree(mock_client, uuids.root_rp_A, bulk=bulk)
+            for bulk in (False, True)
+        ]
+
+        for g in graphs:
+            self.assertEqual(
+                {
+                    uuids.root_rp_A: ["T1", "T2"],
+                    uuids.child_rp_C: ["T1", "T2"],
+                    uuids.child_rp_D: [],
+                    uuids.child_rp_E: [],
+                },
+                {node.id(): node.data["traits"] for node in g.nodes},
+            )
+
+    def test_get_rp_data_endpoints(self):
+        self.assertEqual(
+            ["inventories", "traits", "aggregates", "usages"],
+            tree.get_rp_data_endpoints(lambda name: True),
+        )
+        self.assertEqual(
+            ["traits"],
+            tree.get_rp_data_endpoints(
+                lambda name: name in ("name", "traits")
+            ),
+        )
+        # the used field is part of the inventories
+        self.assertEqual(
+            ["inventories", "traits", "aggregates"],
+            tree.get_rp_data_endpoints(lambda name: name != "used"),
+        )
+        self.assertEqual(
+            [], tree.get_rp_data_endpoints(lambda name: name == "used")
+        )
+
+    def test_make_rp_tree_only_queries_the_requested_endpoints(self):
+        mock_client = mock.Mock()
+        mock_client.get.side_effect = [
+            {
+                "resource_providers": [
+                    {"uuid": uuids.root_rp_A, "parent_provider_uuid": None}
+                ]
+            },
+            {"traits": ["T1"]},
+        ]
+
+        graph = tree.make_rp_tree(
+            mock_client, uuids.root_rp_A, endpoints=["traits"]
+        )
+
+        self.assertEqual(["T1"], graph.nodes[0].data["traits"])
+        self.assertNotIn("inventories", graph.nodes[0].data)
+        self.assertEqual(
+            [
+                mock.call("/resource_providers?in_tree=%s" % uuids.root_rp_A),
+                mock.call("/resource_providers/%s/traits" % uuids.root_rp_A),
+            ],
+            mock_client.get.mock_calls,
+        )
+
+    def test_make_rp_trees_without_endpoints(self):
+        mock_client = mock.Mock()
+        mock_client.get.return_value = {
+            "resource_providers": [
+                {"uuid": uuids.root_rp_A, "parent_provider_uuid": None},
+                {"uuid": uuids.root_rp_B, "parent_provider_uuid": None},
+            ]
+        }
+
+        graph = tree.make_rp_trees(mock_client, endpoints=[])
+
+        self.assertEqual(2, len(graph.nodes))
+        mock_client.get.assert_called_once_with("/resource_providers")
+
+    def test_make_rp_tree_bulk_only_queries_the_requested_endpoints(self):
+        responses = self._get_bulk_responses(
+            {"T1": [uuids.root_rp_A, uuids.child_rp_C, uuids.child_rp_D]}
+        )
+        mock_client = mock.Mock()
+        mock_client.get.side_effect = lambda url: responses[url]
+
+        graph = tree.make_rp_tree(
+            mock_client,
+            uuids.root_rp_A,
+            bulk=True,
+            endpoints=["inventories", "usages"],
+        )
+
+        for node in graph.nodes[1:]:
+            self.assertEqual(
+                {"rc1": {"total": 10, "used": 3}}, node.data["inventories"]
+            )
+            self.assertNotIn("traits", node.data)
+        # in_tree, inventories of 4 RPs and usages of the 3 RPs having
+        # inventories
+        self.assertEqual(1 + 4 + 3, mock_client.get.call_count)
+
+    def test_make_rp_trees_reuses_snapshot(self):
+        rp_snapshot = snapshot.Snapshot(
+            {
+                uuids.root_rp_A: {
+                    "uuid": uuids.root_rp_A,
+                    "generation": 3,
+                    "parent_provider_uuid": None,
+                    "inventories": {"rc1": {"total": 10, "used": 1}},
+                    "traits": ["OLD_A"],
+                    "aggregates": [],
+                },
+                uuids.root_rp_B: {
+                    "uuid": uuids.root_rp_B,
+                    "generation": 5,
+                    "parent_provider_uuid": None,
+                    "inventories": {},
+                    "traits": ["OLD_B"],
+                    "aggregates": [],
+                },
+            }
+        )
+        mock_client = mock.Mock()
+        mock_client.get.side_effect = [
+            {
+                "resource_providers": [
+                    # unchanged
+                    {
+                        "uuid": uuids.root_rp_A,
+                        "generation": 3,
+                        "parent_provider_uuid": None,
+                    },
+                    # changed
+                    {
+                        "uuid": uuids.root_rp_B,
+                        "generation": 6,
+                        "parent_provider_uuid": None,
+                    },
+                ]
+            },
+            # extending data calls for root_rp_B
+            {"inventories": {}},
+            {"traits": ["NEW_B"]},
+            {"aggregates": []},
+            {"usages": {}},
+            # usages of root_rp_A
+            {"usages": {"rc1": 7}},
+        ]
+
+        graph = tree.make_rp_trees(mock_client, snapshot=rp_snapshot)
+
+        rp_a = graph.get_node_by_id(uuids.root_rp_A)
+        self.assertEqual(["OLD_A"], rp_a.data["traits"])
+        self.assertEqual(
+            {"rc1": {"total": 10, "used": 7}}, rp_a.data["inventories"]
+        )
+        rp_b = graph.get_node_by_id(uuids.root_rp_B)
+        self.assertEqual(["NEW_B"], rp_b.data["traits"])
+
+        self.assertEqual(
+            [
+                mock.call("/resource_providers"),
+                mock.call(
+                    "/resource_providers/%s/inventories" % uuids.root_rp_B
+                ),
+                mock.call("/resource_providers/%s/traits" % uuids.root_rp_B),
+                mock.call(
+                    "/resource_providers/%s/aggregates" % uuids.root_rp_B
+                ),
+                mock.call("/resource_providers/%s/usages" % uuids.root_rp_B),
+                mock.call("/resource_providers/%s/usages" % uuids.root_rp_A),
+            ],
+            mock_client.get.mock_calls,
+        )
+        # the snapshot is updated with the new data
+        self.assertEqual(
+            {"traits": ["NEW_B"], "resource_provider_generation": 6},
+            rp_snapshot.get_rp_data(
+                {"uuid": uuids.root_rp_B, "generation": 6}
+            )["traits"],
+        )
+
+    def test_make_rp_trees_with_snapshot_same_as_fresh_run(self):
+        responses = {
+            "/resource_providers": {
+                "resource_providers": [
+                    {
+                        "uuid": uuids.root_rp_A,
+                        "generation": 3,
+                        "parent_provider_uuid": None,
+                    }
+                ]
+            },
+            "/resource_providers/%s/inventories"
+            % uuids.root_rp_A: {
+                "resource_provider_generation": 3,
+                "inventories": {"rc1": {"total": 10}},
+            },
+            "/resource_providers/%s/traits"
+            % uuids.root_rp_A: {
+                "resource_provider_generation": 3,
+                "traits": ["T"],
+            },
+            "/resource_providers/%s/aggregates"
+            % uuids.root_rp_A: {
+                "resource_provider_generation": 3,
+                "aggregates": [],
+            },
+            "/resource_providers/%s/usages"
+            % uuids.root_rp_A: {
+                "resource_provider_generation": 3,
+                "usages": {"rc1": 1},
+            },
+        }
+        mock_client = mock.Mock()
+        mock_client.get.side_effect = lambda url: responses[url]
+        rp_snapshot = snapshot.Snapshot()
+
+        fresh = tree.make_rp_trees(mock_client, snapshot=rp_snapshot)
+        mock_client.get.reset_mock()
+        reused = tree.make_rp_trees(mock_client, snapshot=rp_snapshot)
+
+        self.assertEqual(
+            fresh.get_node_by_id(uuids.root_rp_A).data,
+            reused.get_node_by_id(uuids.root_rp_A).data,
+        )
+        self.assertEqual(
+            3,
+            reused.get_node_by_id(uuids.root_rp_A).data[
+                "resource_provider_generation"
+            ],
+        )
+        # only the listing and the usages are queried again
+        self.assertEqual(2, mock_client.get.call_count)
+
     @mock.patch("osc_placement_tree.tree._add_consumers_to_the_graph")
     @mock.patch("osc_placement_tree.tree._get_consumer_nodes")
     def test_extend_rp_graph_with_consumers_uses_rps_from_the_graph(
@@ -353,7 +1004,7 @@ class TestTree(base.BaseTestCase):
         tree.extend_rp_graph_with_consumers(mock.sentinel.client, g)
 
         mock_get_consumers.assert_called_once_with(
-            mock.sentinel.client, ["4", "2", "3", "1"]
+            mock.sentinel.client, ["4", "2", "3", "1"], 1, True
         )
         mock_add_consumers.assert_called_once_with(g, mock.sentinel.consumers)
 
@@ -435,6 +1086,105 @@ class TestTree(base.BaseTestCase):
             {c.id() for c in consumers},
         )
 
+    def test_get_consumer_nodes_parallel(self):
+        rp_allocations = {
+            uuids.rp1: [uuids.consumer1, uuids.consumer2],
+            uuids.rp2: [uuids.consumer2, uuids.consumer3],
+            uuids.rp3: [],
+            uuids.rp4: [uuids.consumer4],
+        }
+        consumer_allocations = {
+            uuids.consumer1: [uuids.rp1],
+            uuids.consumer2: [uuids.rp1, uuids.rp2],
+            uuids.consumer3: [uuids.rp2],
+            uuids.consumer4: [uuids.rp4],
+        }
+
+        def get(url):
+            _, collection, uuid = url.split("/")[:3]
+            if collection == "resource_providers":
+                allocations = rp_allocations
+            else:
+                allocations = consumer_allocations
+            targets = {str(k): v for k, v in allocations.items()}[uuid]
+            return {
+                "allocations": {
+                    target: {"resources": {}} for target in targets
+                }
+            }
+
+        mock_client = mock.Mock()
+        mock_client.get.side_effect = get
+
+        consumers = tree._get_consumer_nodes(
+            mock_client,
+            [uuids.rp1, uuids.rp2, uuids.rp3, uuids.rp4],
+            parallel=2,
+        )
+
+        # every consumer is queried once and they are returned in the order
+        # of discovery
+        self.assertEqual(4 + 4, mock_client.get.call_count)
+        self.assertEqual(
+            [
+                uuids.consumer1,
+                uuids.consumer2,
+                uuids.consumer3,
+                uuids.consumer4,
+            ],
+            [c.id() for c in consumers],
+        )
+        for consumer in consumers:
+            self.assertEqual(
+                set(consumer_allocations[consumer.id()]),
+                set(consumer.allocations),
+            )
+
+    def test_get_consumer_nodes_without_consumer_details(self):
+        mock_client = mock.Mock()
+        mock_client.get.side_effect = [
+            # rp1
+            {
+                "allocations": {
+                    uuids.consumer1: {"resources": {"DISK_GB": 5}},
+                    uuids.consumer2: {"resources": {"DISK_GB": 6}},
+                },
+                "resource_provider_generation": 3,
+            },
+            # rp2, consumer2 allocates from both rp1 and rp2
+            {
+                "allocations": {uuids.consumer2: {"resources": {"VCPU": 1}}},
+                "resource_provider_generation": 7,
+            },
+        ]
+
+        consumers = tree._get_consumer_nodes(
+            mock_client, [uuids.rp1, uuids.rp2], consumer_details=False
+        )
+
+        # the consumers are not queried one by one
+        self.assertEqual(
+            [
+                mock.call("/resource_providers/%s/allocations" % uuids.rp1),
+                mock.call("/resource_providers/%s/allocations" % uuids.rp2),
+            ],
+            mock_client.get.mock_calls,
+        )
+        self.assertEqual(
+            [
+                {"consumer_uuid": uuids.consumer1},
+                {"consumer_uuid": uuids.consumer2},
+            ],
+            [c.data for c in consumers],
+        )
+        self.assertEqual(
+            [
+                {uuids.rp1: {"DISK_GB": 5}},
+                {uuids.rp1: {"DISK_GB": 6}, uuids.rp2: {"VCPU": 1}},
+            ],
+            [c.allocations for c in consumers],
+        )
+
     def test_add_consumers_to_the_graph(self):
         grandchild = graph.RpNode(
             {"uuid": uuids.grandchild_rp, "name": "grand"}
@@ -501,3 +1251,89 @@ class TestTree(base.BaseTestCase):
             ),
             g.edges,
         )
+
+    def test_add_consumers_to_the_graph_outside_rps_ignored(self):
+        root = graph.RpNode({"uuid": uuids.root_rp, "name": "root"})
+        g = graph.Graph(nodes=[root], edges=[])
+        consumer = graph.ConsumerNode(
+            {
+                "consumer_uuid": uuids.consumer1,
+                # the sharing RP is in another tree
+                "allocations": {uuids.root_rp: {}, uuids.sharing_rp: {}},
+            }
+        )
+
+        tree._add_consumers_to_the_graph(g, [consumer])
+
+        self.assertEqual([root, consumer], g.nodes)
+        self.assertEqual([graph.AllocationEdge(consumer, root)], g.edges)
+
+    def test_iter_rp_trees(self):
+        rps = [
+            {
+                "uuid": str(uuids.root_rp_A),
+                "parent_provider_uuid": None,
+                "root_provider_uuid": str(uuids.root_rp_A),
+            },
+            {
+                "uuid": str(uuids.root_rp_B),
+                "parent_provider_uuid": None,
+                "root_provider_uuid": str(uuids.root_rp_B),
+            },
+            {
+                "uuid": str(uuids.child_rp_A),
+                "parent_provider_uuid": str(uuids.root_rp_A),
+                "root_provider_uuid": str(uuids.root_rp_A),
+            },
+        ]
+
+        def get(url):
+            if url == "/resource_providers":
+                return {"resource_providers": rps}
+            endpoint = url.split("/")[-1]
+            return {endpoint: {} if endpoint == "inventories" else []}
+
+        mock_client = mock.Mock()
+        mock_client.get.side_effect = get
+
+        trees = tree.iter_rp_trees(
+            mock_client, drop_fields=["parent_provider_uuid"]
+        )
+
+        root_uuid, g = next(trees)
+        self.assertEqual(str(uuids.root_rp_A), root_uuid)
+        self.assertEqual(
+            [str(uuids.root_rp_A), str(uuids.child_rp_A)],
+            [node.id() for node in g.nodes],
+        )
+        self.assertEqual(1, len(g.edges))
+        # the second tree is not queried yet
+        self.assertEqual(
+            [
+                mock.call("/resource_providers"),
+                mock.call(
+                    "/resource_providers/%s/inventories" % uuids.root_rp_A
+                ),
+                mock.call("/resource_providers/%s/traits" % uuids.root_rp_A),
+                mock.call(
+                    "/resource_providers/%s/aggregates" % uuids.root_rp_A
+                ),
+                mock.call("/resource_providers/%s/usages" % uuids.root_rp_A),
+                mock.call(
+                    "/resource_providers/%s/inventories" % uuids.child_rp_A
+                ),
+                mock.call("/resource_providers/%s/traits" % uuids.child_rp_A),
+                mock.call(
+                    "/resource_providers/%s/aggregates" % uuids.child_rp_A
+                ),
+                mock.call("/resource_providers/%s/usages" % uuids.child_rp_A),
+            ],
+            mock_client.get.mock_calls,
+        )
+
+        root_uuid, g = next(trees)
+        self.assertEqual(str(uuids.root_rp_B), root_uuid)
+        self.assertEqual(
+            [str(uuids.root_rp_B)], [node.id() for node in g.nodes]
+        )
+        self.assertRaises(StopIteration, next, trees)
@@ -9,7 +9,71 @@
 # WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 # License for the specific language governing permissions and limitations
 # under the License.
+import collections
+import itertools
+
+from osc_placement_tree import concurrency
 from osc_placement_tree import graph
+from osc_placement_tree import profiling
+
+# The per RP endpoints queried to extend the data of the RP returned by the
+# /resource_providers query
+_RP_DATA_ENDPOINTS = ["inventories", "traits", "aggregates", "usages"]
+
+# The bulk mode queries the RPs having a given trait with the required query
+# parameter of /resource_providers so the client needs to use at least this
+# placement microversion in bulk mode
+BULK_MODE_MIN_VERSION = "1.18"
+
+# Filtering the RPs by traits needs the required query parameter of
+# /resource_providers
+TRAIT_FILTER_MIN_VERSION = "1.18"
+
+
+class RpFilter(object):
+    """Selects the RP trees having an RP that matches every criteria
+
+    As much of the filtering as possible is done by placement via the query
+    parameters of the /resource_providers call.
+    """
+
+    def __init__(
+        self, traits=(), aggregates=(), min_free=None, resource_classes=()
+    ):
+        """Create an RpFilter
+
+        :param traits: the RP needs to have every trait. Needs at least
+                       TRAIT_FILTER_MIN_VERSION microversion.
+        :param aggregates: the RP needs to be in at least one of the
+                           aggregates
+        :param min_free: a dict of resource class -> amount the RP needs to
+                         have free capacity for
+        :param resource_classes: the RP needs to have an inventory of every
+                                 resource class. Placement cannot filter on
+                                 this so the inventories of the RPs matching
+                                 the rest of the criteria are queried.
+        """
+        self.traits = list(traits)
+        self.aggregates = list(aggregates)
+        self.min_free = min_free or {}
+        self.resource_classes = list(resource_classes)
+
+    def get_query(self):
+        """Returns the /resource_providers query string of the filter"""
+        params = []
+        if self.traits:
+            params.append("required=%s" % ",".join(self.traits))
+        if self.aggregates:
+            params.append("member_of=in:%s" % ",".join(self.aggregates))
+        if self.min_free:
+            params.append(
+                "resources=%s"
+                % ",".join(
+                    "%s:%d" % (rc, amount)
+                    for rc, amount in sorted(self.min_free.items())
+                )
+            )
+        return "&".join(params)
 
 
 def _drop_fields(drop_fields, nodes):
@@ -19,108 +83,583 @@ def _drop_fields(drop_fields, nodes):
                 node.pop(field)
 
 
-def _get_node_by_id(id, nodes):
-    for node in nodes:
-        if node.id() == id:
-            return node
-    raise ValueError("Node %s not found" % id)
-
-
-def _get_parent_edges_between_rp_nodes(nodes):
+def _get_parent_edges_between_rp_nodes(g):
     edges = []
-    for node in nodes:
-        if node.data["parent_provider_uuid"]:
-            parent_node = _get_node_by_id(
-                node.data["parent_provider_uuid"], nodes
-            )
+    for node in g.rp_nodes:
+        # the parent of the root of a subtree is not part of the graph
+        if g.has_node(node.data["parent_provider_uuid"]):
+            parent_node = g.get_node_by_id(node.data["parent_provider_uuid"])
             edges.append(graph.ParentEdge(node, parent_node))
     return edges
 
 
 def _make_graph_from_rps(rps, drop_fields):
-    nodes = [graph.RpNode(rp) for rp in rps]
-    parent_edges = _get_parent_edges_between_rp_nodes(nodes)
-    # TODO(gibi) handle consumer nodes and edges here
+    with profiling.phase("build graph"):
+        g = graph.Graph(nodes=[graph.RpNode(rp) for rp in rps], edges=[])
+        g.edges.extend(_get_parent_edges_between_rp_nodes(g))
+        # TODO(gibi) handle consumer nodes and edges here
+
+        # this is done late so we can drop parent_provider_uuid as well that
+        # is still used above but not any more
+        _drop_fields(drop_fields, rps)
+    return g
 
-    # this is done late so we can drop parent_provider_uuid as well that is
-    # still used above but not any more
-    _drop_fields(drop_fields, rps)
-    return graph.Graph(nodes=nodes, edges=parent_edges)
 
+def get_rp_data_endpoints(field_filter):
+    """Returns the per RP endpoints needed to show the fields of the filter
 
-def make_rp_trees(client, drop_fields=None):
+    :param field_filter: field name -> bool function that returns True for
+                         fields that need to be kept in the output
+    :returns: a list of endpoints that can be passed to make_rp_tree(s)
+    """
+    endpoints = [
+        endpoint
+        for endpoint in ("inventories", "traits", "aggregates")
+        if field_filter(endpoint)
+    ]
+    # the usages are shown as the used field of the inventories
+    if "inventories" in endpoints and field_filter("used"):
+        endpoints.append("usages")
+    return endpoints
+
+
+def make_rp_trees(
+    client,
+    drop_fields=None,
+    parallel=1,
+    bulk=False,
+    snapshot=None,
+    endpoints=None,
+    rp_filter=None,
+    filter_client=None,
+):
     """Builds the whole RP graph
 
     :param client: a placement client providing a get(url) call that returns
                    the REST response body as a python object
     :param drop_fields: the list of field names not to include in the result
+    :param parallel: the maximum number of concurrent placement requests
+    :param bulk: if True then the data of the RPs are collected with as few
+                 requests as possible. It needs a client using at least
+                 BULK_MODE_MIN_VERSION microversion.
+    :param snapshot: a snapshot.Snapshot object from a previous run. The data
+                     of the RPs with unchanged generation is reused from it
+                     and the snapshot is updated with the current data.
+    :param endpoints: the list of per RP endpoints to query, see
+                      get_rp_data_endpoints(). Defaults to every endpoint.
+                      The usages are only queried together with the
+                      inventories.
+    :param rp_filter: an RpFilter object. If given then only the trees
+                      having a matching RP are included.
+    :param filter_client: the client listing the RPs matching the rp_filter.
+                          If the rp_filter has traits then it needs to use
+                          at least TRAIT_FILTER_MIN_VERSION microversion.
+                          Defaults to client.
     :return: a list of Node objects
     """
-    url = "/resource_providers"
-    rps = client.get(url)["resource_providers"]
-    rps = _extend_placement_rps(rps, client)
+    with profiling.phase("fetch providers"):
+        known_inventories = None
+        if rp_filter is None:
+            url = "/resource_providers"
+            rps = client.get(url)["resource_providers"]
+        else:
+            trees, known_inventories = _list_filtered_rp_trees(
+                client, filter_client or client, parallel, rp_filter
+            )
+            rps = [rp for rps_in_tree in trees.values() for rp in rps_in_tree]
+        rps = _extend_placement_rps(
+            rps,
+            client,
+            parallel,
+            bulk,
+            snapshot=snapshot,
+            endpoints=endpoints,
+            known_inventories=known_inventories,
+        )
     return _make_graph_from_rps(rps, drop_fields)
 
 
-def make_rp_tree(client, in_tree_rp_uuid, drop_fields=None):
+def iter_rp_trees(
+    client,
+    drop_fields=None,
+    parallel=1,
+    bulk=False,
+    snapshot=None,
+    endpoints=None,
+    rp_filter=None,
+    filter_client=None,
+):
+    """Builds the RP trees one by one
+
+    The RPs are listed once but the data of the RPs are only queried tree by
+    tree so a tree is available as soon as its own data is collected.
+
+    :param client: a placement client providing a get(url) call that returns
+                   the REST response body as a python object
+    :param drop_fields: the list of field names not to include in the result
+    :param parallel: the maximum number of concurrent placement requests
+    :param bulk: if True then the data of the RPs are collected with as few
+                 requests as possible. It needs a client using at least
+                 BULK_MODE_MIN_VERSION microversion.
+    :param snapshot: a snapshot.Snapshot object from a previous run. The data
+                     of the RPs with unchanged generation is reused from it
+                     and the snapshot is updated with the current data.
+    :param endpoints: the list of per RP endpoints to query, see
+                      get_rp_data_endpoints(). Defaults to every endpoint.
+                      The usages are only queried together with the
+                      inventories.
+    :param rp_filter: an RpFilter object. If given then only the trees
+                      having a matching RP are included.
+    :param filter_client: the client listing the RPs matching the rp_filter.
+                          If the rp_filter has traits then it needs to use
+                          at least TRAIT_FILTER_MIN_VERSION microversion.
+                          Defaults to client.
+    :return: a generator of (root RP uuid, Graph of the tree) pairs in the
+             order the roots are first seen in the RP list. The next tree is
+             only queried when the previous one is consumed.
+    """
+    with profiling.phase("fetch providers"):
+        known_inventories = None
+        if rp_filter is None:
+            rps = client.get("/resource_providers")["resource_providers"]
+            trees = collections.OrderedDict()
+            for rp in rps:
+                trees.setdefault(rp["root_provider_uuid"], []).append(rp)
+        else:
+            trees, known_inventories = _list_filtered_rp_trees(
+                client, filter_client or client, parallel, rp_filter
+            )
+
+    for root_uuid, rps_in_tree in trees.items():
+        with profiling.phase("fetch providers"):
+            rps_in_tree = _extend_placement_rps(
+                rps_in_tree,
+                client,
+                parallel,
+                bulk,
+                in_tree=root_uuid,
+                snapshot=snapshot,
+                endpoints=endpoints,
+                known_inventories=known_inventories,
+            )
+        yield root_uuid, _make_graph_from_rps(rps_in_tree, drop_fields)
+
+
+def make_rp_tree(
+    client,
+    in_tree_rp_uuid,
+    drop_fields=None,
+    parallel=1,
+    bulk=False,
+    snapshot=None,
+    endpoints=None,
+    subtree=False,
+    depth=None,
+):
     """Builds a tree from TreeNodes containing the RP tree
 
     :param client: a placement client providing a get(url) call that returns
                    the REST response body as a python object
     :param in_tree_rp_uuid: an RP uuid from the RP tree that is requested
     :param drop_fields: the list of field names not to include in the result
+    :param parallel: the maximum number of concurrent placement requests
+    :param bulk: if True then the data of the RPs are collected with as few
+                 requests as possible. It needs a client using at least
+                 BULK_MODE_MIN_VERSION microversion.
+    :param snapshot: a snapshot.Snapshot object from a previous run. The data
+                     of the RPs with unchanged generation is reused from it
+                     and the snapshot is updated with the current data.
+    :param endpoints: the list of per RP endpoints to query, see
+                      get_rp_data_endpoints(). Defaults to every endpoint.
+                      The usages are only queried together with the
+                      inventories.
+    :param subtree: if True then only the in_tree_rp_uuid RP and its
+                    descendants are included instead of the whole tree
+    :param depth: if not None then only the RPs at most this many levels
+                  below the root of the result are included. The RPs are
+                  pruned before their data is queried.
     :return: a Node object that is the root
     """
 
-    url = "/resource_providers?in_tree=%s" % in_tree_rp_uuid
-    rps_in_tree = client.get(url)["resource_providers"]
-    if not rps_in_tree:
-        raise ValueError("%s does not exists" % in_tree_rp_uuid)
-    rps = _extend_placement_rps(rps_in_tree, client)
+    with profiling.phase("fetch providers"):
+        url = "/resource_providers?in_tree=%s" % in_tree_rp_uuid
+        rps_in_tree = client.get(url)["resource_providers"]
+        if not rps_in_tree:
+            raise ValueError("%s does not exists" % in_tree_rp_uuid)
+        if subtree or depth is not None:
+            rps_in_tree = _prune_rps(
+                rps_in_tree, in_tree_rp_uuid, subtree, depth
+            )
+        rps = _extend_placement_rps(
+            rps_in_tree,
+            client,
+            parallel,
+            bulk,
+            in_tree=in_tree_rp_uuid,
+            snapshot=snapshot,
+            endpoints=endpoints,
+        )
     return _make_graph_from_rps(rps, drop_fields)
 
 
-def _extend_placement_rps(rps, client):
-    return [_extend_rp_data(client, rp) for rp in rps]
+def _list_filtered_rp_trees(client, filter_client, parallel, rp_filter):
+    """Lists the RPs of the trees having an RP matching the filter
+
+    :param filter_client: the client listing the RPs matching the query of
+                          the filter
+    :returns: a (trees, inventories) tuple. The trees is an OrderedDict of
+              root RP uuid -> the RPs of the tree, in the order the matching
+              RPs are listed by placement. The inventories is a dict of RP
+              uuid -> inventories response of the RPs queried to filter by
+              resource class, so they are not queried again.
+    """
+    url = "/resource_providers"
+    query = rp_filter.get_query()
+    if query:
+        url += "?" + query
+    matching_rps = filter_client.get(url)["resource_providers"]
+
+    inventories = {}
+    with concurrency.get_pool(parallel) as pool:
+        if rp_filter.resource_classes:
+            responses = pool.map(
+                client.get,
+                [
+                    "/resource_providers/%s/inventories" % rp["uuid"]
+                    for rp in matching_rps
+                ],
+            )
+            inventories = {
+                rp["uuid"]: response
+                for rp, response in zip(matching_rps, responses)
+            }
+            matching_rps = [
+                rp
+                for rp in matching_rps
+                if set(rp_filter.resource_classes)
+                <= set(inventories[rp["uuid"]]["inventories"])
+            ]
+
+        root_uuids = list(
+            collections.OrderedDict.fromkeys(
+                rp["root_provider_uuid"] for rp in matching_rps
+            )
+        )
+        responses = pool.map(
+            client.get,
+            [
+                "/resource_providers?in_tree=%s" % root_uuid
+                for root_uuid in root_uuids
+            ],
+        )
+    trees = collections.OrderedDict(
+        (root_uuid, response["resource_providers"])
+        for root_uuid, response in zip(root_uuids, responses)
+    )
+    return trees, inventories
+
+
+def _prune_rps(rps, rp_uuid, subtree, depth):
+    """Returns the RPs of the tree that are requested to be shown
+
+    :param rps: the RPs of a single tree
+    :param rp_uuid: the RP the tree is requested for
+    :param subtree: if True then the result is rooted at rp_uuid instead of
+                    the root of the tree
+    :param depth: if not None then the maximum number of levels below the
+                  root of the result
+    :returns: the kept RPs in their original order
+    """
+    children = collections.defaultdict(list)
+    root_uuid = None
+    for rp in rps:
+        if rp["parent_provider_uuid"]:
+            children[rp["parent_provider_uuid"]].append(rp["uuid"])
+        else:
+            root_uuid = rp["uuid"]
+    if subtree:
+        root_uuid = rp_uuid
+
+    kept = set()
+    level = [root_uuid]
+    level_depth = 0
+    while level and (depth is None or level_depth <= depth):
+        kept.update(level)
+        level = [child for uuid in level for child in children[uuid]]
+        level_depth += 1
+    return [rp for rp in rps if rp["uuid"] in kept]
+
+
+def _extend_placement_rps(
+    rps,
+    client,
+    parallel=1,
+    bulk=False,
+    in_tree=None,
+    snapshot=None,
+    endpoints=None,
+    known_inventories=None,
+):
+    if endpoints is None:
+        endpoints = _RP_DATA_ENDPOINTS
+
+    if snapshot is not None:
+        known_rp_data = [snapshot.get_rp_data(rp) for rp in rps]
+    else:
+        known_rp_data = [None] * len(rps)
+    changed_rps = [rp for rp, data in zip(rps, known_rp_data) if data is None]
+
+    with concurrency.get_pool(parallel) as pool:
+        if bulk:
+            changed_rp_data = _get_rp_data_in_bulk(
+                client,
+                pool,
+                changed_rps,
+                in_tree,
+                endpoints,
+                known_inventories,
+            )
+        else:
+            changed_rp_data = _get_rp_data(
+                client, pool, changed_rps, endpoints, known_inventories
+            )
+        # only the usages of the unchanged RPs need to be queried
+        if "usages" in endpoints:
+            _add_usages(
+                client,
+                pool,
+                [rp for rp, data in zip(rps, known_rp_data) if data],
+                [data for data in known_rp_data if data],
+            )
+
+    changed_rp_data = iter(changed_rp_data)
+    rps = [
+        _extend_rp_data(rp, data or next(changed_rp_data))
+        for rp, data in zip(rps, known_rp_data)
+    ]
+    if snapshot is not None:
+        snapshot.update(rps)
+    return rps
+
+
+def _get_rp_data(client, pool, rps, endpoints, known_inventories=None):
+    """Queries the given per RP endpoints of every RP
+
+    :param known_inventories: a dict of RP uuid -> inventories response. The
+                              inventories of these RPs are not queried.
+    :returns: a list containing an endpoint -> response dict for each RP
+    """
+    if not endpoints:
+        return [{} for _ in rps]
+    known_inventories = known_inventories or {}
+
+    def is_known(rp, endpoint):
+        return endpoint == "inventories" and rp["uuid"] in known_inventories
+
+    urls = [
+        "/resource_providers/%s/%s" % (rp["uuid"], endpoint)
+        for rp in rps
+        for endpoint in endpoints
+        if not is_known(rp, endpoint)
+    ]
+    # the responses are in the same order as the urls
+    responses = iter(pool.map(client.get, urls))
+
+    rp_data = []
+    for rp in rps:
+        data = {}
+        for endpoint in endpoints:
+            if is_known(rp, endpoint):
+                data[endpoint] = known_inventories[rp["uuid"]]
+            else:
+                data[endpoint] = next(responses)
+        rp_data.append(data)
+    return rp_data
 
 
-def _extend_rp_data(client, rp):
-    rp.update(client.get("/resource_providers/%s/inventories" % rp["uuid"]))
-    rp.update(client.get("/resource_providers/%s/traits" % rp["uuid"]))
-    rp.update(client.get("/resource_providers/%s/aggregates" % rp["uuid"]))
+def _get_rp_data_in_bulk(
+    client, pool, rps, in_tree, endpoints, known_inventories=None
+):
+    """Queries the data of the RPs with as few requests as possible
+
+    * The traits are queried per trait instead of per RP if there are less
+      traits in use than RPs.
+    * The usages are only queried for the RPs having inventories.
+
+    :param in_tree: if not None then every RP is in the tree of this RP
+    :param endpoints: the per RP endpoints to query the data of
+    :param known_inventories: a dict of RP uuid -> inventories response. The
+                              inventories of these RPs are not queried.
+    :returns: a list containing an endpoint -> response dict for each RP
+    """
+    rp_traits = None
+    if "traits" in endpoints:
+        rp_traits = _get_traits_in_bulk(client, pool, rps, in_tree)
+    per_rp_endpoints = [
+        endpoint
+        for endpoint in ("inventories", "aggregates")
+        if endpoint in endpoints
+    ]
+    if "traits" in endpoints and rp_traits is None:
+        per_rp_endpoints.append("traits")
+
+    rp_data = _get_rp_data(
+        client, pool, rps, per_rp_endpoints, known_inventories
+    )
+
+    if rp_traits is not None:
+        for rp, data in zip(rps, rp_data):
+            data["traits"] = {"traits": rp_traits[rp["uuid"]]}
+
+    if "usages" in endpoints:
+        _add_usages(client, pool, rps, rp_data)
+    return rp_data
+
+
+def _add_usages(client, pool, rps, rp_data):
+    """Queries the usages of the RPs having inventories
+
+    The usages are only shown per inventory so if an RP has no inventory
+    then there is no need to query its usages.
+
+    :param rp_data: a list containing an endpoint -> response dict for each
+                    RP, including the inventories. The usages are added to
+                    these dicts.
+    """
+    with_inventories = [
+        (rp, data)
+        for rp, data in zip(rps, rp_data)
+        if data["inventories"]["inventories"]
+    ]
+    usages = _get_rp_data(
+        client, pool, [rp for rp, _ in with_inventories], ["usages"]
+    )
+    for (_, data), usage in zip(with_inventories, usages):
+        data.update(usage)
 
-    usages = client.get("/resource_providers/%s/usages" % rp["uuid"])
-    for rc in rp["inventories"]:
-        rp["inventories"][rc]["used"] = usages["usages"][rc]
+
+def _get_traits_in_bulk(client, pool, rps, in_tree):
+    """Returns the traits of the RPs by querying the RPs of every trait
+
+    :param in_tree: if not None then every RP is in the tree of this RP
+    :returns: a dict of RP uuid -> list of traits, or None if querying the
+              RPs of every trait would need more requests than querying the
+              traits of every RP
+    """
+    # querying the traits in use costs a request so it only worth if there
+    # are more than two RPs
+    if len(rps) <= 2:
+        return None
+
+    traits = client.get("/traits?associated=true")["traits"]
+    if len(traits) + 1 >= len(rps):
+        return None
+
+    query = "/resource_providers?required=%s"
+    if in_tree:
+        query += "&in_tree=%s" % in_tree
+    responses = pool.map(client.get, [query % trait for trait in traits])
+
+    rp_traits = {rp["uuid"]: [] for rp in rps}
+    for trait, response in zip(traits, responses):
+        for rp in response["resource_providers"]:
+            # an RP created since the RPs are listed is ignored
+            if rp["uuid"] in rp_traits:
+                rp_traits[rp["uuid"]].append(trait)
+    return rp_traits
+
+
+def _extend_rp_data(rp, data):
+    """Extends the RP with the responses of the per RP endpoints
+
+    :param rp: the RP dict from the /resource_providers response
+    :param data: a dict of endpoint -> response of that endpoint for the RP
+    """
+    for endpoint in ("inventories", "traits", "aggregates"):
+        # the endpoints not needed for the output are not queried
+        if endpoint in data:
+            rp.update(data[endpoint])
+
+    if "traits" in data:
+        # placement does not define the order of the traits and in bulk mode
+        # they are collected in the order of the traits in use so they are
+        # sorted to get the same output in every mode
+        rp["traits"] = sorted(rp["traits"])
+
+    if "usages" in data:
+        for rc in rp["inventories"]:
+            rp["inventories"][rc]["used"] = data["usages"]["usages"][rc]
 
     return rp
 
 
-def _get_consumer_nodes(client, rp_uuids):
+def _get_consumer_nodes(client, rp_uuids, parallel=1, consumer_details=True):
     """Return every consumer that allocates from the given rp_uuids
 
-        :returns: a list of ConsumerNode objects
+    :param parallel: the maximum number of concurrent placement requests
+    :param consumer_details: if True then every consumer is queried to get
+                             its project, user and generation. Otherwise
+                             the consumers are built from the allocations
+                             of the RPs only.
+    :returns: a list of ConsumerNode objects
     """
     # need to get all the consumers from every RP and merged them as a single
     # consumer might allocate from more than one RP and placement doesn't have
     # a standalone consumer endpoint
-    consumer_uuids = set()
-    for rp_uuid in rp_uuids:
-        consumers = client.get("/resource_providers/%s/allocations" % rp_uuid)[
-            "allocations"
-        ].keys()
-        consumer_uuids = consumer_uuids.union(consumers)
-    # now get consumers one by one
-    consumers = {}
-    for consumer_uuid in consumer_uuids:
-        consumers[consumer_uuid] = client.get(
-            "/allocations/%s" % consumer_uuid
-        )
-        # extend that data with its own id
-        consumers[consumer_uuid]["consumer_uuid"] = consumer_uuid
-    return [
-        graph.ConsumerNode(data=consumer) for consumer in consumers.values()
-    ]
+    with concurrency.get_pool(parallel) as pool:
+        consumers = collections.OrderedDict()
+        for rp_uuid, rp_allocations in _get_rp_allocations(
+            client, rp_uuids, pool
+        ):
+            for consumer_uuid, allocation in rp_allocations[
+                "allocations"
+            ].items():
+                if consumer_details:
+                    # query the consumer as soon as it is discovered so that
+                    # it overlaps with querying the rest of the RPs
+                    if consumer_uuid not in consumers:
+                        consumers[consumer_uuid] = pool.apply_async(
+                            client.get, "/allocations/%s" % consumer_uuid
+                        )
+                else:
+                    consumer = consumers.setdefault(
+                        consumer_uuid, {"allocations": {}}
+                    )
+                    consumer["allocations"][rp_uuid] = {
+                        "resources": allocation["resources"]
+                    }
+
+        nodes = []
+        for consumer_uuid, consumer in consumers.items():
+            if consumer_details:
+                consumer = consumer.get()
+            # extend that data with its own id
+            consumer["consumer_uuid"] = consumer_uuid
+            nodes.append(graph.ConsumerNode(data=consumer))
+    return nodes
+
+
+def _get_rp_allocations(client, rp_uuids, pool):
+    """Generates the (rp_uuid, allocations of the RP) pairs of rp_uuids
+
+    To let the tasks scheduled by the caller between two items in front of
+    the rest of the RP queries only as many RP queries are scheduled at a
+    time as many tasks the pool can run concurrently.
+    """
+    rp_uuids = iter(rp_uuids)
+
+    def schedule(rp_uuid):
+        url = "/resource_providers/%s/allocations" % rp_uuid
+        return rp_uuid, pool.apply_async(client.get, url)
+
+    pending_rps = collections.deque(
+        schedule(rp_uuid) for rp_uuid in itertools.islice(rp_uuids, pool.size)
+    )
+    while pending_rps:
+        rp_uuid, result = pending_rps.popleft()
+        for next_rp_uuid in itertools.islice(rp_uuids, 1):
+            pending_rps.append(schedule(next_rp_uuid))
+        yield rp_uuid, result.get()
 
 
 def _add_consumers_to_the_graph(g, consumer_nodes):
@@ -129,16 +668,35 @@ def _add_consumers_to_the_graph(g, consumer_nodes):
     :param g: the current Graph object containing RPs, this will be extended
               with consumers
     :param consumer_nodes: a list of ConsumerNode objects allocating from the
-                           RPs in the graph
+                           RPs in the graph. The allocations from RPs outside
+                           of the graph, e.g. from a sharing RP in another
+                           tree, are not represented.
     """
-    g.nodes.extend(consumer_nodes)
+    g.add_nodes(consumer_nodes)
     for consumer_node in consumer_nodes:
-        for rp_uuid in consumer_node.data["allocations"].keys():
-            rp_node = g.get_node_by_id(rp_uuid)
-            g.edges.append(graph.AllocationEdge(consumer_node, rp_node))
+        for rp_uuid in consumer_node.allocations:
+            if g.has_node(rp_uuid):
+                rp_node = g.get_node_by_id(rp_uuid)
+                g.edges.append(graph.AllocationEdge(consumer_node, rp_node))
+
 
+def extend_rp_graph_with_consumers(
+    client, g, parallel=1, consumer_details=True
+):
+    """Extends the RP graph with the consumers allocating from the RPs
 
-def extend_rp_graph_with_consumers(client, g):
+    :param client: a placement client providing a get(url) call that returns
+                   the REST response body as a python object
+    :param g: the Graph object containing the RPs
+    :param parallel: the maximum number of concurrent placement requests
+    :param consumer_details: if False then the consumers are not queried one
+                             by one so their project, user and generation
+                             will be missing from the graph
+    """
     rp_uuids = [rp_node.id() for rp_node in g.rp_nodes]
-    consumers = _get_consumer_nodes(client, rp_uuids)
-    _add_consumers_to_the_graph(g, consumers)
+    with profiling.phase("fetch consumers"):
+        consumers = _get_consumer_nodes(
+            client, rp_uuids, parallel, consumer_details
+        )
+    with profiling.phase("build graph"):
+        _add_consumers_to_the_graph(g, consumers)
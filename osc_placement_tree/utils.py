@@ -10,7 +10,6 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 from io import open
-import six
 
 from osc_placement_tree import dot
 from osc_placement_tree.resources import provider_tree
@@ -86,7 +85,37 @@ def dump_placement_db_to_dot(placement_client, out_file, hidden_fields=()):
     tree.extend_rp_graph_with_consumers(placement_client, graph)
 
     with open(out_file, "w", encoding="utf-8") as f:
-        d = dot.graph_to_dot(
-            graph, field_filter=lambda name: name not in hidden_fields
+        dot.write_dot(
+            graph, f, field_filter=lambda name: name not in hidden_fields
         )
-        f.write(six.text_type(d))
+
+
+def dump_placement_db_to_dot_files(
+    placement_client, out_dir, hidden_fields=()
+):
+    """Export the placement db content to a dot file per RP tree
+
+    Every RP tree is written to <root RP uuid>.dot in out_dir together with
+    the consumers allocating from it. An index.json file lists the written
+    trees. See dump_placement_db_to_dot() about the usage.
+
+    :param placement_client: A placement client wrapper to call the placement
+        service. Use PlacementFixtureAsClientWrapper or
+        PlacementDirectAsClientWrapper depending on your environment.
+    :param out_dir: The directory to store the dot files in
+    :param hidden_fields: The list of the name of the resource provider fields
+        not to include in the output
+    """
+
+    def trees_with_consumers():
+        for root_uuid, graph in tree.iter_rp_trees(
+            placement_client, drop_fields=DROP_DATA_FIELDS
+        ):
+            tree.extend_rp_graph_with_consumers(placement_client, graph)
+            yield root_uuid, graph
+
+    dot.write_dot_files(
+        trees_with_consumers(),
+        out_dir,
+        field_filter=lambda name: name not in hidden_fields,
+    )